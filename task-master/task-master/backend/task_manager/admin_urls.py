@@ -0,0 +1,6 @@
+"""Admin URLconf, imported on the first request under admin/ (see task_manager.lazy)."""
+from django.contrib import admin
+
+admin.autodiscover()
+
+urlpatterns = admin.site.get_urls()
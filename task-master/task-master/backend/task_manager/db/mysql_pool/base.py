@@ -0,0 +1,41 @@
+"""
+MySQL backend that hands connections back to a process-wide pool instead of
+closing them at the end of each request.
+
+Pool options come from the ``POOL`` key of the database settings, e.g.::
+
+    "POOL": {"max_size": 10, "max_overflow": 5, "timeout": 30, "max_idle": 300}
+
+Without a ``POOL`` key this behaves exactly like the stock MySQL backend.
+"""
+from django.db.backends.mysql import base as mysql_base
+
+from task_manager.db.pool import get_pool
+
+
+class DatabaseWrapper(mysql_base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        options = self.settings_dict.get("POOL")
+        if not options:
+            return super().get_new_connection(conn_params)
+
+        connect = super().get_new_connection
+        pool = get_pool(self.alias, lambda: connect(conn_params), **options)
+        self._pool = pool
+        return pool.checkout()
+
+    def _close(self):
+        pool = getattr(self, "_pool", None)
+        if pool is None or self.connection is None:
+            return super()._close()
+
+        self._pool = None
+        discard = self.errors_occurred
+        if not discard and (self.in_atomic_block or not self.get_autocommit()):
+            # Never hand out a connection with an open transaction
+            try:
+                self.connection.rollback()
+            except Exception:
+                discard = True
+        with self.wrap_database_errors:
+            pool.checkin(self.connection, discard=discard)
@@ -0,0 +1,209 @@
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out before the timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of raw DB-API connections shared by every thread of a
+    worker process.
+
+    ``max_size`` connections are kept open between requests. Up to
+    ``max_overflow`` extra connections may be opened under load; they are
+    closed as soon as they are returned. Idle connections older than
+    ``max_idle`` seconds are evicted, and checked-out connections are pinged
+    first when ``health_checks`` is enabled.
+    """
+
+    def __init__(
+        self,
+        connect,
+        max_size=10,
+        max_overflow=5,
+        timeout=30,
+        max_idle=300,
+        health_checks=True,
+    ):
+        self._connect = connect
+        self.max_size = max_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.health_checks = health_checks
+
+        self._lock = threading.Condition()
+        self._idle = deque()  # (connection, returned_at), most recent last
+        self._open = 0
+
+        # Counters reported by stats()
+        self._checkouts = 0
+        self._created = 0
+        self._closed = 0
+        self._evicted = 0
+        self._health_check_failures = 0
+        self._timeouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._peak_in_use = 0
+
+    def checkout(self):
+        deadline = time.monotonic() + self.timeout
+        waited_since = None
+
+        while True:
+            with self._lock:
+                evicted = self._evict_idle()
+                if self._idle:
+                    connection, _ = self._idle.pop()
+                    create = False
+                elif self._open < self.max_size + self.max_overflow:
+                    connection = None
+                    self._open += 1
+                    create = True
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            "Could not check out a database connection within "
+                            f"{self.timeout}s ({self._open} open)."
+                        )
+                    if waited_since is None:
+                        waited_since = time.monotonic()
+                        self._waits += 1
+                    self._lock.wait(remaining)
+                    continue
+
+            # Closing, connecting and pinging happen outside the lock
+            for stale in evicted:
+                self._close_quietly(stale)
+
+            if create:
+                try:
+                    connection = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._open -= 1
+                        self._lock.notify()
+                    raise
+                with self._lock:
+                    self._created += 1
+            elif self.health_checks and not self._is_usable(connection):
+                with self._lock:
+                    self._health_check_failures += 1
+                self._discard(connection)
+                continue
+
+            with self._lock:
+                self._checkouts += 1
+                if waited_since is not None:
+                    waited = time.monotonic() - waited_since
+                    self._wait_time += waited
+                    self._max_wait_time = max(self._max_wait_time, waited)
+                self._peak_in_use = max(self._peak_in_use, self._in_use())
+            return connection
+
+    def checkin(self, connection, discard=False):
+        with self._lock:
+            overflow = self._open > self.max_size
+            if not discard and not overflow:
+                self._idle.append((connection, time.monotonic()))
+                self._lock.notify()
+                return
+        self._discard(connection)
+
+    def stats(self):
+        with self._lock:
+            in_use = self._in_use()
+            capacity = self.max_size + self.max_overflow
+            return {
+                "max_size": self.max_size,
+                "max_overflow": self.max_overflow,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": in_use,
+                "peak_in_use": self._peak_in_use,
+                "utilisation": round(in_use / capacity, 3) if capacity else 0,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_time_total": round(self._wait_time, 6),
+                "wait_time_avg": round(self._wait_time / self._waits, 6) if self._waits else 0,
+                "wait_time_max": round(self._max_wait_time, 6),
+                "timeouts": self._timeouts,
+                "created": self._created,
+                "closed": self._closed,
+                "evicted": self._evicted,
+                "health_check_failures": self._health_check_failures,
+            }
+
+    def close_all(self):
+        with self._lock:
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+        for connection in idle:
+            self._discard(connection)
+
+    def _in_use(self):
+        return self._open - len(self._idle)
+
+    def _evict_idle(self):
+        # Called with the lock held; the oldest connections sit on the left.
+        # Returns the evicted connections so they can be closed unlocked.
+        evicted = []
+        if self.max_idle is None:
+            return evicted
+        cutoff = time.monotonic() - self.max_idle
+        while self._idle and self._idle[0][1] < cutoff:
+            connection, _ = self._idle.popleft()
+            self._open -= 1
+            self._closed += 1
+            self._evicted += 1
+            evicted.append(connection)
+        return evicted
+
+    def _discard(self, connection):
+        with self._lock:
+            self._open -= 1
+            self._closed += 1
+            self._lock.notify()
+        self._close_quietly(connection)
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_usable(connection):
+        try:
+            connection.ping()
+        except Exception:
+            return False
+        return True
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, connect, **options):
+    """Return the process-wide pool for a database alias, creating it once."""
+    pool = _pools.get(alias)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(alias)
+            if pool is None:
+                pool = _pools[alias] = ConnectionPool(connect, **options)
+    return pool
+
+
+def pool_stats():
+    """Return stats for every pool opened by this process, keyed by alias."""
+    return {alias: pool.stats() for alias, pool in _pools.items()}
@@ -0,0 +1,84 @@
+"""
+Deferred loading of components that are not on the request hot path.
+
+The API docs and schema annotations need drf-spectacular's OpenAPI machinery
+and the admin needs every ``admin.py``; none of it is used by API requests,
+so it is imported on first use instead of while a worker boots. See
+``manage.py startup_profile`` for what a boot spends its time on.
+"""
+import threading
+
+from django.contrib.admin import autodiscover
+from django.contrib.admin.apps import SimpleAdminConfig
+from django.contrib.admin.checks import check_dependencies
+from django.contrib.admin.sites import all_sites
+from django.core import checks
+from django.urls import get_resolver
+from django.utils.module_loading import import_string
+from django.views.decorators.csrf import csrf_exempt
+
+_annotations = []
+_annotations_lock = threading.Lock()
+
+
+def extend_schema(**kwargs):
+    """
+    ``drf_spectacular.utils.extend_schema``, applied when a schema is generated.
+
+    The real decorator builds its schema class at import time, which imports
+    all of drf-spectacular's inspection code along with the views.
+    """
+    def decorator(view):
+        with _annotations_lock:
+            _annotations.append((view, kwargs))
+        return view
+    return decorator
+
+
+def apply_schema_annotations():
+    """Apply the deferred ``extend_schema`` annotations of every imported view."""
+    from drf_spectacular.utils import extend_schema as spectacular_extend_schema
+
+    get_resolver().url_patterns  # Imports the views, and so records their annotations
+    with _annotations_lock:
+        # In decoration order, so class annotations see their methods' ones
+        while _annotations:
+            view, kwargs = _annotations.pop(0)
+            spectacular_extend_schema(**kwargs)(view)
+
+
+def lazy_view(view_path, **initkwargs):
+    """
+    URLconf entry for the class-based view at ``view_path``, imported on the
+    first request it serves. Only for DRF views, which are CSRF exempt anyway.
+    """
+    view = None
+
+    @csrf_exempt
+    def dispatch(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = import_string(view_path).as_view(**initkwargs)
+        return view(request, *args, **kwargs)
+
+    return dispatch
+
+
+class LazyAdminConfig(SimpleAdminConfig):
+    """
+    Admin whose ``admin.py`` modules are imported when its URLconf
+    (``task_manager.admin_urls``) is first used rather than at startup.
+    """
+
+    def ready(self):
+        checks.register(check_dependencies, checks.Tags.admin)
+        checks.register(check_admin_sites, checks.Tags.admin)
+
+
+def check_admin_sites(app_configs=None, **kwargs):
+    # Like the admin's own check, after registering the ModelAdmins it checks
+    autodiscover()
+    errors = []
+    for site in all_sites:
+        errors.extend(site.check(app_configs))
+    return errors
@@ -0,0 +1,355 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Updates go to a dict owned by the calling thread, so recording a sample
+never takes a lock. Each process merges its threads' dicts when it is
+scraped, folding those of exited threads into a single total, and writes
+the merged values to ``METRICS_DIR/<pid>.json`` every
+``METRICS_FLUSH_INTERVAL`` seconds so that ``/metrics`` on any worker can
+report the sum over all of them. Counters and histograms of workers that
+have exited are kept; their gauges are dropped.
+"""
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.signals import user_login_failed
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.db import connections
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+from task_manager.db.pool import pool_stats
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self._local = threading.local()
+        self._shards = []  # (thread, values) for each live thread that has recorded anything
+        self._retired = {}  # Values of threads that have exited
+        self._shards_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._next_flush = 0
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def shard(self):
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._shards_lock:
+                self._shards.append((threading.current_thread(), values))
+            return values
+
+    def collect(self):
+        """Merge every thread's values into ``{(name, labels): value}``."""
+        with self._shards_lock:
+            # An exited thread writes no more, so its dict can be folded away
+            live = []
+            for thread, values in self._shards:
+                if thread.is_alive():
+                    live.append((thread, values))
+                else:
+                    for key, value in values.items():
+                        merge_into(self._retired, key, value)
+            self._shards = live
+            shards = [self._retired.copy(), *(values for _, values in live)]
+        merged = {}
+        for shard in shards:
+            for key, value in shard.copy().items():
+                merge_into(merged, key, value)
+        for metric in self.metrics.values():
+            if isinstance(metric, Gauge) and metric.function is not None:
+                for labels, value in metric.function():
+                    merged[(metric.name, labels)] = value
+        return merged
+
+    def maybe_flush(self):
+        if time.monotonic() < self._next_flush or not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_flush = time.monotonic() + settings.METRICS_FLUSH_INTERVAL
+            self.flush()
+        finally:
+            self._flush_lock.release()
+
+    def flush(self):
+        directory = Path(settings.METRICS_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        samples = [[name, list(labels), value] for (name, labels), value in self.collect().items()]
+        path = directory / f"{os.getpid()}.json"
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(samples))
+        tmp_path.replace(path)
+
+    def collect_all_processes(self):
+        merged = self.collect()
+        directory = Path(settings.METRICS_DIR)
+        if not directory.is_dir():
+            return merged
+        for path in directory.glob("*.json"):
+            if not path.stem.isdigit() or int(path.stem) == os.getpid():
+                continue  # Already included, and fresher
+            alive = _process_alive(int(path.stem))
+            try:
+                samples = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in samples:
+                metric = self.metrics.get(name)
+                if metric is None or (isinstance(metric, Gauge) and not alive):
+                    continue
+                merge_into(merged, (name, tuple(labels)), value)
+        return merged
+
+    def exposition(self):
+        values = self.collect_all_processes()
+        by_metric = {}
+        for (name, labels), value in values.items():
+            by_metric.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            for labels, value in sorted(by_metric.get(name, [])):
+                lines.extend(metric.format(labels, value))
+        return "\n".join(lines) + "\n"
+
+
+def merge_into(merged, key, value):
+    current = merged.get(key)
+    if current is None:
+        merged[key] = list(value) if isinstance(value, list) else value
+    elif isinstance(value, list):
+        merged[key] = [a + b for a, b in zip(current, value)]
+    else:
+        merged[key] = current + value
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, help, labelnames=(), registry=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        (registry or REGISTRY).register(self)
+        self._registry = registry or REGISTRY
+
+    def format(self, labels, value):
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_number(value)}"]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount=1):
+        values = self._registry.shard()
+        key = (self.name, labels)
+        values[key] = values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Gauge whose per-thread changes are summed, so use ``inc``/``dec`` in
+    pairs; gauges read from elsewhere are given a ``function`` returning
+    ``[(labels, value), ...]`` that is called at collection time.
+    """
+    type = "gauge"
+
+    def __init__(self, name, help, labelnames=(), registry=None, function=None):
+        super().__init__(name, help, labelnames, registry)
+        self.function = function
+
+    def inc(self, *labels, amount=1):
+        values = self._registry.shard()
+        key = (self.name, labels)
+        values[key] = values.get(key, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), registry=None, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        values = self._registry.shard()
+        key = (self.name, labels)
+        # Per-bucket (not cumulative) counts, then +Inf, then the sum
+        counts = values.get(key)
+        if counts is None:
+            counts = values[key] = [0] * (len(self.buckets) + 2)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def format(self, labels, value):
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, float("inf")), value):
+            cumulative += count
+            le = _format_labels(self.labelnames, labels, [("le", _format_number(bound))])
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        plain = _format_labels(self.labelnames, labels)
+        lines.append(f"{self.name}_sum{plain} {_format_number(value[-1])}")
+        lines.append(f"{self.name}_count{plain} {cumulative}")
+        return lines
+
+
+REGISTRY = Registry()
+
+REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route, method and status.", ["route", "method", "status"]
+)
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ["route", "method"]
+)
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests being served.")
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "Database queries per HTTP request by route.", ["route"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100),
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Database query latency by connection alias.", ["alias"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit or miss).", ["cache", "result"]
+)
+COALESCED_REQUESTS = Counter(
+    "coalesced_requests_total",
+    "Reads answered with a concurrent identical read's response (follower, shared) or not (fallback).",
+    ["view", "result"],
+)
+AUTH_FAILURES = Counter(
+    "auth_failures_total", "Failed logins and rejected credentials.", ["kind"]
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections", "Pooled database connections by state.", ["alias", "state"],
+    function=lambda: [
+        ((alias, state), stats[state])
+        for alias, stats in pool_stats().items()
+        for state in ("in_use", "idle")
+    ],
+)
+
+
+@receiver(user_login_failed)
+def _count_login_failure(sender, **kwargs):
+    AUTH_FAILURES.inc("login")
+
+
+class MetricsMiddleware:
+    """Record latency, status and database use of every request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        atexit.register(REGISTRY.flush)  # Keep what was recorded since the last flush
+
+    def __call__(self, request):
+        queries = [0]
+
+        def observe_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                DB_QUERY_DURATION.observe(time.perf_counter() - start, context["connection"].alias)
+                queries[0] += 1
+
+        REQUESTS_IN_PROGRESS.inc()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(observe_query))
+                response = self.get_response(request)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+
+        elapsed = time.perf_counter() - start
+        match = request.resolver_match
+        route = match.route if match is not None else "unmatched"  # Keeps label values bounded
+        REQUESTS.inc(route, request.method, str(response.status_code))
+        REQUEST_DURATION.observe(elapsed, route, request.method)
+        REQUEST_QUERIES.observe(queries[0], route)
+        if response.status_code == 401:
+            AUTH_FAILURES.inc("token")
+        REGISTRY.maybe_flush()
+        return response
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    ):
+        return HttpResponse(status=401)
+    return HttpResponse(REGISTRY.exposition(), content_type=CONTENT_TYPE)
+
+
+class _InstrumentedCacheMixin:
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        self.metrics_label = params.get("METRICS_LABEL", type(self).__name__)
+
+    def get(self, key, default=None, version=None):
+        missing = object()
+        value = super().get(key, missing, version)
+        CACHE_REQUESTS.inc(self.metrics_label, "miss" if value is missing else "hit")
+        return default if value is missing else value
+
+
+class InstrumentedLocMemCache(_InstrumentedCacheMixin, LocMemCache):
+    pass
+
+
+class InstrumentedRedisCache(_InstrumentedCacheMixin, RedisCache):
+    pass
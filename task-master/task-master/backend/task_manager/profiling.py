@@ -0,0 +1,176 @@
+"""
+Opt-in per-request profiling.
+
+A request is profiled when a staff user sends ``X-Profile: cpu``, ``memory``
+or ``cpu,memory``, or when it is picked by ``PROFILING_SAMPLE_RATE``. The
+profile (``.prof``) and the top allocations (``.mem.json``) are written to
+``PROFILING_DIR``, which keeps at most ``PROFILING_MAX_FILES`` dumps; see
+``manage.py profile_report``. Staff requests also get a short summary in the
+``X-Profile-*`` response headers. Requests that are not profiled only pay
+for a header lookup and, when sampling is on, one random number.
+"""
+import cProfile
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import TokenError
+
+PROFILE_MODES = {"cpu", "memory"}
+SUMMARY_SIZE = 5
+TRACEMALLOC_FRAMES = 10
+
+
+def _is_staff(request):
+    if getattr(request, "user", None) is not None and request.user.is_staff:
+        return True  # Admin session
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except (AuthenticationFailed, TokenError):  # Including InvalidToken, and inactive or deleted users
+        return False
+    return authenticated is not None and authenticated[0].is_staff
+
+
+def _header_value(text):
+    return text.encode("ascii", "replace").decode().replace("\n", " ")
+
+
+class ProfilingMiddleware:
+    # cProfile and tracemalloc are process wide, so one profiled request at a time
+    _lock = threading.Lock()
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.directory = Path(settings.PROFILING_DIR)
+
+    def __call__(self, request):
+        requested = request.headers.get("X-Profile")
+        if requested is None and not (self.sample_rate and random.random() < self.sample_rate):
+            return self.get_response(request)
+
+        if requested is not None:
+            if not _is_staff(request):
+                return self.get_response(request)
+            modes = {mode.strip() for mode in requested.lower().split(",")} & PROFILE_MODES
+            modes = modes or {"cpu"}
+        else:
+            modes = {"cpu"}
+
+        if not self._lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self._profile(request, modes, report=requested is not None)
+        finally:
+            self._lock.release()
+
+    def _profile(self, request, modes, report):
+        profiler = cProfile.Profile() if "cpu" in modes else None
+        if "memory" in modes:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            elapsed = time.perf_counter() - start
+            snapshot = peak = None
+            if "memory" in modes:
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+        profile_id = self._dump(request, profiler, snapshot, peak, elapsed)
+        if report:
+            response["X-Profile-Id"] = profile_id
+            response["X-Profile-Time"] = f"{elapsed * 1000:.1f}ms"
+            if profiler is not None:
+                response["X-Profile-Top"] = _header_value(_top_functions(profiler))
+            if snapshot is not None:
+                response["X-Profile-Memory"] = _header_value(
+                    f"peak={peak // 1024}KiB; " + _top_allocations(snapshot)
+                )
+        return response
+
+    def _dump(self, request, profiler, snapshot, peak, elapsed):
+        match = getattr(request, "resolver_match", None)
+        route = match.route if match is not None else request.path_info
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_")[:60] or "root"
+        profile_id = (
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:6]}-{request.method}-{slug}"
+        )
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if profiler is not None:
+            profiler.dump_stats(self.directory / f"{profile_id}.prof")
+        if snapshot is not None:
+            allocations = [
+                {
+                    "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    "size": stat.size,
+                    "count": stat.count,
+                }
+                for stat in _statistics(snapshot)[:50]
+            ]
+            (self.directory / f"{profile_id}.mem.json").write_text(
+                json.dumps(
+                    {
+                        "path": request.path_info,
+                        "route": route,
+                        "elapsed": elapsed,
+                        "peak": peak,
+                        "allocations": allocations,
+                    }
+                )
+            )
+        self._rotate()
+        return profile_id
+
+    def _rotate(self):
+        dumps = sorted(
+            (path for path in self.directory.iterdir() if path.suffix in (".prof", ".json")),
+            key=lambda path: path.stat().st_mtime,
+        )
+        for path in dumps[: max(0, len(dumps) - settings.PROFILING_MAX_FILES)]:
+            path.unlink(missing_ok=True)
+
+
+def _statistics(snapshot):
+    snapshot = snapshot.filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    )
+    return snapshot.statistics("lineno")
+
+
+def _top_functions(profiler):
+    # Own time, so the answer is where the time went rather than the call chain
+    stats = pstats.Stats(profiler).stats
+    entries = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)
+    return "; ".join(
+        f"{name} ({os.path.basename(filename)}:{line}) {own * 1000:.1f}ms"
+        for (filename, line, name), (_, _, own, _, _) in entries[:SUMMARY_SIZE]
+    )
+
+
+def _top_allocations(snapshot):
+    return "; ".join(
+        f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno} "
+        f"{stat.size // 1024}KiB"
+        for stat in _statistics(snapshot)[:SUMMARY_SIZE]
+    )
@@ -0,0 +1,140 @@
+"""
+OpenAPI schema served from memory.
+
+drf-spectacular introspects every view on each request to ``api/schema/``.
+Here the schema is generated once per code version: it is read from the
+artifact written by ``manage.py generate_schema`` when one matches the current
+source fingerprint, otherwise generated on first use and written out for the
+next worker. Each rendered format is kept as plain and gzipped bytes.
+"""
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+import drf_spectacular
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.middleware.gzip import re_accepts_gzip
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SpectacularAPIView
+
+# Packages whose source determines the schema
+SCHEMA_SOURCE_PACKAGES = ("tasks", "task_manager")
+
+
+@lru_cache(maxsize=None)
+def schema_fingerprint():
+    """Hash of everything the generated schema depends on."""
+    digest = hashlib.sha256()
+    digest.update(drf_spectacular.__version__.encode())
+    digest.update(json.dumps(settings.SPECTACULAR_SETTINGS, sort_keys=True, default=str).encode())
+    base_dir = Path(settings.BASE_DIR)
+    for package in SCHEMA_SOURCE_PACKAGES:
+        for path in sorted((base_dir / package).rglob("*.py")):
+            if "migrations" in path.parts:
+                continue
+            digest.update(path.relative_to(base_dir).as_posix().encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def artifact_path(fingerprint=None):
+    version = settings.SPECTACULAR_SETTINGS.get("VERSION", "0")
+    name = f"openapi-{version}-{fingerprint or schema_fingerprint()}.json"
+    return Path(settings.SCHEMA_ARTIFACT_DIR) / name
+
+
+def generate_schema():
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    return generator.get_schema(request=None, public=True)
+
+
+def write_artifact(schema):
+    path = artifact_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a file of our own then rename, so concurrent workers never
+    # read a partial file or write into each other's
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f"{path.stem}-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as tmp_file:
+            tmp_file.write(json.dumps(schema, sort_keys=False, default=str))
+        os.chmod(tmp_name, 0o644)  # mkstemp makes it readable by its owner only
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+    return path
+
+
+def load_schema():
+    path = artifact_path()
+    if path.exists():
+        return json.loads(path.read_text())
+
+    schema = generate_schema()
+    try:
+        write_artifact(schema)
+    except OSError:
+        # A read-only deploy still works, it just regenerates per process
+        pass
+    return schema
+
+
+class CachedSchemaView(SpectacularAPIView):
+    """Drop-in replacement for ``SpectacularAPIView`` backed by the cache above."""
+
+    _schema = None
+    _rendered = {}  # renderer format -> (body, gzipped body, etag)
+    _lock = threading.Lock()
+
+    @extend_schema(exclude=True)
+    def get(self, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        body, compressed, etag = self._get_rendered(renderer)
+
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponseNotModified()
+        else:
+            content_type = renderer.media_type
+            if renderer.charset:
+                content_type = f"{content_type}; charset={renderer.charset}"
+            if re_accepts_gzip.search(request.headers.get("Accept-Encoding", "")):
+                response = HttpResponse(compressed, content_type=content_type)
+                response["Content-Encoding"] = "gzip"
+            else:
+                response = HttpResponse(body, content_type=content_type)
+            response["Content-Disposition"] = (
+                f'inline; filename="{spectacular_settings.TITLE or "schema"}.{renderer.format}"'
+            )
+
+        response["ETag"] = etag
+        patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+        patch_vary_headers(response, ("Accept", "Accept-Encoding"))
+        return response
+
+    @classmethod
+    def _get_rendered(cls, renderer):
+        rendered = cls._rendered.get(renderer.format)
+        if rendered is not None:
+            return rendered
+
+        with cls._lock:
+            rendered = cls._rendered.get(renderer.format)
+            if rendered is None:
+                if cls._schema is None:
+                    cls._schema = load_schema()
+                body = renderer.render(cls._schema, renderer.media_type, {})
+                if isinstance(body, str):
+                    body = body.encode()
+                etag = f'"{schema_fingerprint()}-{renderer.format}"'
+                rendered = (body, gzip.compress(body, mtime=0), etag)
+                cls._rendered[renderer.format] = rendered
+        return rendered
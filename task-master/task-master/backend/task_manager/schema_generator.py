@@ -0,0 +1,11 @@
+from drf_spectacular.generators import SchemaGenerator
+
+from .lazy import apply_schema_annotations
+
+
+class AnnotatedSchemaGenerator(SchemaGenerator):
+    """Applies the views' deferred ``extend_schema`` annotations before generating."""
+
+    def get_schema(self, request=None, public=False):
+        apply_schema_annotations()
+        return super().get_schema(request=request, public=public)
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 import os
 from pathlib import Path
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -31,7 +32,7 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
-    "django.contrib.admin",
+    "task_manager.lazy.LazyAdminConfig",
     "django.contrib.auth",
     "django.contrib.contenttypes",
     "django.contrib.sessions",
@@ -46,7 +47,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "task_manager.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "task_manager.static_assets.PrecompressedStaticMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -54,6 +57,9 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "task_manager.profiling.ProfilingMiddleware",
+    "tasks.activity.ActivityLogMiddleware",
+    "tasks.coalescing.CoalescingMiddleware",
 ]
 
 
@@ -83,7 +89,7 @@ WSGI_APPLICATION = 'task_manager.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        'ENGINE': 'task_manager.db.mysql_pool',  # Stock MySQL backend plus an optional pool
         'NAME': 'task_master',
         'USER': 'root',
         'PASSWORD': '',
@@ -92,6 +98,62 @@ DATABASES = {
     }
 }
 
+# How connections to the default database are reused, set with DB_CONNECTION_MODE:
+#   "none"       - connect and disconnect on every request (Django's default)
+#   "persistent" - keep one connection per thread for DB_CONN_MAX_AGE seconds
+#   "pool"       - share a bounded pool of connections between the threads of a worker
+DB_CONNECTION_MODE = os.environ.get("DB_CONNECTION_MODE", "pool")
+
+if DB_CONNECTION_MODE == "persistent":
+    DATABASES["default"]["CONN_MAX_AGE"] = int(os.environ.get("DB_CONN_MAX_AGE", 60))
+    DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+elif DB_CONNECTION_MODE == "pool":
+    # Connections go back to the pool at the end of each request, so Django
+    # itself must not keep them (CONN_MAX_AGE stays 0).
+    DATABASES["default"]["POOL"] = {
+        "max_size": int(os.environ.get("DB_POOL_SIZE", 10)),
+        "max_overflow": int(os.environ.get("DB_POOL_MAX_OVERFLOW", 5)),
+        "timeout": float(os.environ.get("DB_POOL_TIMEOUT", 30)),
+        "max_idle": float(os.environ.get("DB_POOL_MAX_IDLE", 300)),
+        "health_checks": True,
+    }
+
+# DB_SQLITE_DIR puts "default" and every DB_SHARDS database in SQLite files in
+# that directory instead of MySQL, e.g. to run the tests without a server.
+DB_SQLITE_DIR = os.environ.get("DB_SQLITE_DIR")
+if DB_SQLITE_DIR:
+    DATABASES["default"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.path.join(DB_SQLITE_DIR, "task_master.sqlite3"),
+        # Test databases are files too, as the concurrency tests share them between threads
+        "TEST": {"NAME": os.path.join(DB_SQLITE_DIR, "test_task_master.sqlite3")},
+        "OPTIONS": {"timeout": 20},
+    }
+
+# Databases holding categories and tasks (see tasks.sharding). Users and auth
+# always stay in "default". DB_SHARDS is a comma-separated list of database
+# names on the same server, e.g. "task_master_0,task_master_1"; without it
+# everything lives in "default".
+TASK_SHARDS = ["default"]
+if os.environ.get("DB_SHARDS"):
+    TASK_SHARDS = []
+    for index, name in enumerate(os.environ["DB_SHARDS"].split(",")):
+        name = name.strip()
+        if DB_SQLITE_DIR:
+            DATABASES[f"shard{index}"] = {
+                **DATABASES["default"],
+                "NAME": os.path.join(DB_SQLITE_DIR, f"{name}.sqlite3"),
+                "TEST": {"NAME": os.path.join(DB_SQLITE_DIR, f"test_{name}.sqlite3")},
+            }
+        else:
+            DATABASES[f"shard{index}"] = {**DATABASES["default"], "NAME": name}
+        TASK_SHARDS.append(f"shard{index}")
+DATABASE_ROUTERS = ["tasks.sharding.ShardRouter"]
+# Ids reserved per round trip to the global id_blocks table
+ID_BLOCK_SIZE = 1000
+# The admin shows categories and tasks of one shard at a time
+ADMIN_TASK_SHARD = os.environ.get("ADMIN_TASK_SHARD", TASK_SHARDS[0])
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -131,6 +193,17 @@ USE_TZ = True
 STATIC_URL = "static/"
 STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 
+# collectstatic writes content-hashed names plus .gz variants, which
+# PrecompressedStaticMiddleware serves with far-future cache headers
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "task_manager.static_assets.CompressedManifestStaticFilesStorage",
+    },
+}
+
 MEDIA_URL = "media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
@@ -149,13 +222,79 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    # Token bucket sizes per throttle_scope (see tasks.throttling.TokenBucketThrottle)
+    "DEFAULT_THROTTLE_RATES": {
+        "login": "10/min",
+        "forgot_password": "5/hour",
+        "reset_password": "10/hour",
+        "task_search": "120/min",
+    },
+}
+
+# Redis holds the throttle buckets (see tasks.throttling) and the shared cache
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+
+# Caches
+CACHES = {
+    # The instrumented backends count hits and misses for /metrics
+    "default": {
+        "BACKEND": "task_manager.metrics.InstrumentedLocMemCache",
+        "METRICS_LABEL": "default",
+    },
+    # Shared by every worker and host, for state they must agree on
+    "shared": {
+        "BACKEND": "task_manager.metrics.InstrumentedRedisCache",
+        "LOCATION": REDIS_URL,
+        "METRICS_LABEL": "shared",
+    },
 }
 
+# Per-request profiling (see task_manager.profiling). Staff trigger it with an
+# X-Profile header; PROFILING_SAMPLE_RATE also profiles that share of all requests.
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "true").lower() == "true"
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", 0))
+PROFILING_DIR = os.environ.get("PROFILING_DIR", os.path.join(BASE_DIR, "profiles"))
+PROFILING_MAX_FILES = int(os.environ.get("PROFILING_MAX_FILES", 200))
+
+# Metrics served at /metrics (see task_manager.metrics). Each worker writes its
+# values to METRICS_DIR; when METRICS_TOKEN is set scrapers must send it as a
+# bearer token.
+METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(BASE_DIR, ".cache", "metrics"))
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 5))
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+# Task and category activity log (see tasks.activity). Entries are buffered per
+# process and written at the end of each request or at these thresholds.
+ACTIVITY_BUFFER_SIZE = int(os.environ.get("ACTIVITY_BUFFER_SIZE", 500))
+ACTIVITY_BUFFER_SECONDS = float(os.environ.get("ACTIVITY_BUFFER_SECONDS", 5))
+ACTIVITY_RETENTION_DAYS = int(os.environ.get("ACTIVITY_RETENTION_DAYS", 365))
+
+# Coalescing of identical concurrent reads (see tasks.coalescing). Followers
+# wait this long for the first request before computing their own response;
+# COALESCE_CACHE names a cache shared by the workers to coalesce across them.
+COALESCE_ENABLED = os.environ.get("COALESCE_ENABLED", "true").lower() == "true"
+COALESCE_WAIT_SECONDS = float(os.environ.get("COALESCE_WAIT_SECONDS", 5))
+COALESCE_CACHE = os.environ.get("COALESCE_CACHE") or None
+
+# Typeahead indexes of task titles (see tasks.suggestions), kept per worker up
+# to this many keys in all. SUGGEST_CACHE must be shared by every worker, as
+# it tells them when a user's tasks have changed; each worker asks it at most
+# every SUGGEST_TOKEN_CHECK_SECONDS per user.
+SUGGEST_INDEX_MAX_ENTRIES = int(os.environ.get("SUGGEST_INDEX_MAX_ENTRIES", 500000))
+SUGGEST_CACHE = os.environ.get("SUGGEST_CACHE", "shared")
+SUGGEST_TOKEN_CHECK_SECONDS = float(os.environ.get("SUGGEST_TOKEN_CHECK_SECONDS", 2))
+
+# Limits for POST /batch (see tasks.batch)
+BATCH_MAX_REQUESTS = 20
+BATCH_MAX_BODY_BYTES = 256 * 1024
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "Task Management API",
     "DESCRIPTION": "API for managing tasks and categories",
     "VERSION": "1.0.0",
     "SERVE_INCLUDE_SCHEMA": False,
+    # Applies the extend_schema annotations that task_manager.lazy defers
+    "DEFAULT_GENERATOR_CLASS": "task_manager.schema_generator.AnnotatedSchemaGenerator",
     "SWAGGER_UI_SETTINGS": {
         "deepLinking": True,
     },
@@ -164,8 +303,12 @@ SPECTACULAR_SETTINGS = {
         {"name": "Authentication", "description": "Authentication related operations"},
         {"name": "Category", "description": "Category management operations"},
         {"name": "Task", "description": "Task management operations"},
+        {"name": "System", "description": "Operational endpoints for staff"},
     ],
 }
+# Generated OpenAPI schema artifacts (see `manage.py generate_schema`)
+SCHEMA_ARTIFACT_DIR = os.path.join(BASE_DIR, "schema")
+
 # Add this at the end of settings.py
 AUTH_USER_MODEL = "tasks.User"
 
@@ -187,6 +330,9 @@ FRONTEND_URL = "http://localhost:5173"
 
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ORIGIN_ALLOW_ALL = True
+# Edits send back the ETag of what they loaded (see tasks.concurrency)
+CORS_ALLOW_HEADERS = (*default_headers, "if-match")
+CORS_EXPOSE_HEADERS = ["ETag"]
     
 # CORS_ALLOWED_ORIGINS = [
 #     "http://example.com",
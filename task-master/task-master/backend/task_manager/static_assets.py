@@ -0,0 +1,136 @@
+"""
+Static asset pipeline: content-hashed, precompressed files written at
+``collectstatic`` time and served straight from ``STATIC_ROOT``.
+"""
+import gzip
+import json
+import mimetypes
+import os
+from collections import namedtuple
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponseNotModified
+from django.middleware.gzip import re_accepts_gzip
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+# Already compressed formats gain nothing from gzip
+SKIP_COMPRESS_EXTENSIONS = {
+    ".gz", ".br", ".zip", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".ico",
+    ".woff", ".woff2", ".mp4", ".webm",
+}
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MUTABLE_CACHE_CONTROL = "public, max-age=60"
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ``ManifestStaticFilesStorage`` that also writes a ``.gz`` sibling next to
+    every compressible file once hashing is done.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() in SKIP_COMPRESS_EXTENSIONS:
+                continue
+            if self.exists(name):
+                self._write_gzip(name)
+
+    def _write_gzip(self, name):
+        path = Path(self.path(name))
+        content = path.read_bytes()
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        gzip_path = path.with_name(path.name + ".gz")
+        # Not worth serving if it barely shrinks
+        if len(compressed) < len(content) * 0.95:
+            gzip_path.write_bytes(compressed)
+        elif gzip_path.exists():
+            gzip_path.unlink()
+
+
+StaticAsset = namedtuple(
+    "StaticAsset", ["path", "gzip_path", "content_type", "mtime", "immutable"]
+)
+
+
+class PrecompressedStaticMiddleware:
+    """
+    Serve files collected into ``STATIC_ROOT`` before the rest of the stack.
+
+    The file index is built once at startup. Clients that accept gzip get the
+    ``.gz`` variant written by the storage above, and content-hashed names are
+    marked immutable so browsers never revalidate them.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = "/" + settings.STATIC_URL.lstrip("/")
+        self.root = Path(settings.STATIC_ROOT)
+        if not self.root.is_dir():
+            raise MiddlewareNotUsed
+        self.files = self._scan()
+
+    def __call__(self, request):
+        if request.method in ("GET", "HEAD") and request.path_info.startswith(self.prefix):
+            asset = self.files.get(request.path_info[len(self.prefix):])
+            if asset is not None:
+                return self._serve(request, asset)
+        return self.get_response(request)
+
+    def _scan(self):
+        hashed_names = set()
+        manifest_path = self.root / ManifestStaticFilesStorage.manifest_name
+        if manifest_path.exists():
+            hashed_names = set(json.loads(manifest_path.read_text())["paths"].values())
+
+        files = {}
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith(".gz"):
+                    continue
+                path = Path(dirpath) / filename
+                name = path.relative_to(self.root).as_posix()
+                gzip_path = path.with_name(filename + ".gz")
+                content_type, _ = mimetypes.guess_type(filename)
+                files[name] = StaticAsset(
+                    path=path,
+                    gzip_path=gzip_path if gzip_path.exists() else None,
+                    content_type=content_type or "application/octet-stream",
+                    mtime=path.stat().st_mtime,
+                    immutable=name in hashed_names,
+                )
+        return files
+
+    def _serve(self, request, asset):
+        if not asset.immutable and not was_modified_since(
+            request.headers.get("If-Modified-Since"), asset.mtime
+        ):
+            return HttpResponseNotModified()
+
+        path = asset.path
+        use_gzip = asset.gzip_path is not None and re_accepts_gzip.search(
+            request.headers.get("Accept-Encoding", "")
+        )
+        if use_gzip:
+            path = asset.gzip_path
+
+        response = FileResponse(path.open("rb"), content_type=asset.content_type)
+        if use_gzip:
+            response["Content-Encoding"] = "gzip"
+        if asset.gzip_path is not None:
+            patch_vary_headers(response, ("Accept-Encoding",))
+        response["Last-Modified"] = http_date(asset.mtime)
+        response["Cache-Control"] = (
+            IMMUTABLE_CACHE_CONTROL if asset.immutable else MUTABLE_CACHE_CONTROL
+        )
+        return response
@@ -15,26 +15,28 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
-from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularRedocView,
-    SpectacularSwaggerView,
-)
+from .lazy import lazy_view
+from .metrics import metrics_view
 
 # Wire up our API using automatic URL routing.
 urlpatterns = [
-    path("admin/", admin.site.urls),
+    # The admin and docs views are imported on first use, see task_manager.lazy
+    path("admin/", ("task_manager.admin_urls", "admin", "admin")),
     path("", include("tasks.urls")),
-    path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
-    path("api/docs/", SpectacularRedocView.as_view(url_name="schema"), name="redoc"),
+    path("api/schema/", lazy_view("task_manager.schema.CachedSchemaView"), name="schema"),
+    path("metrics", metrics_view, name="metrics"),
+    path(
+        "api/docs/",
+        lazy_view("drf_spectacular.views.SpectacularRedocView", url_name="schema"),
+        name="redoc",
+    ),
     path(
         "api/swagger/",
-        SpectacularSwaggerView.as_view(url_name="schema"),
+        lazy_view("drf_spectacular.views.SpectacularSwaggerView", url_name="schema"),
         name="swagger",
     ),
 ]
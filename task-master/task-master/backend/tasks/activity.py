@@ -0,0 +1,128 @@
+"""
+Append-only log of changes to tasks and categories.
+
+Views call ``record_create()``, ``record_update()`` or ``record_delete()``
+with the object they changed, which logs its field-level changes. Once the
+change commits, its entry joins a per-process buffer that is written with one
+``bulk_create`` per database: at the end of every request
+(``ActivityLogMiddleware``), when ``ACTIVITY_BUFFER_SIZE`` entries or
+``ACTIVITY_BUFFER_SECONDS`` of them have piled up, and at exit. Auditing so
+adds at most one INSERT per request, and changes that are rolled back are
+never logged. Entries still buffered when a process is killed are lost.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ActivityEntry
+from .sharding import reserve_ids, sharding_enabled
+
+logger = logging.getLogger(__name__)
+
+# Fields whose changes are logged, per model
+TRACKED_FIELDS = {
+    "task": ["title", "description", "due_date", "priority", "status", "category", "parent"],
+    "category": ["name", "description"],
+}
+
+
+class ActivityBuffer:
+    def __init__(self):
+        self._entries = []  # (database alias, entry)
+        self._oldest = 0
+        self._lock = threading.Lock()
+
+    def add(self, using, entry):
+        with self._lock:
+            if not self._entries:
+                self._oldest = time.monotonic()
+            self._entries.append((using, entry))
+            full = (
+                len(self._entries) >= settings.ACTIVITY_BUFFER_SIZE
+                or time.monotonic() - self._oldest >= settings.ACTIVITY_BUFFER_SECONDS
+            )
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered entries. Returns how many were written."""
+        with self._lock:
+            entries, self._entries = self._entries, []
+        by_database = {}
+        for using, entry in entries:
+            by_database.setdefault(using, []).append(entry)
+        written = 0
+        for using, batch in by_database.items():
+            try:
+                if sharding_enabled():
+                    for entry, pk in zip(batch, reserve_ids(ActivityEntry, len(batch))):
+                        entry.pk = pk
+                ActivityEntry.objects.using(using).bulk_create(batch)
+                written += len(batch)
+            except Exception:
+                # The changes themselves are committed; losing their log
+                # entries must not fail the request
+                logger.exception("Could not write %d activity entries to %s", len(batch), using)
+        return written
+
+
+buffer = ActivityBuffer()
+atexit.register(buffer.flush)
+
+
+def snapshot(instance):
+    """The tracked field values of ``instance``, foreign keys as ids."""
+    meta = instance._meta
+    return {
+        name: getattr(instance, meta.get_field(name).attname)
+        for name in TRACKED_FIELDS[meta.model_name]
+    }
+
+
+def record_create(instance):
+    _record(instance, "create", {name: [None, value] for name, value in snapshot(instance).items()})
+
+
+def record_update(instance, before):
+    """Log the changes of ``instance`` since ``before``, its ``snapshot()`` from before saving."""
+    after = snapshot(instance)
+    changes = {name: [before[name], value] for name, value in after.items() if before[name] != value}
+    if changes:
+        _record(instance, "update", changes)
+
+
+def record_delete(instance):
+    """Call before ``instance.delete()``, which clears its primary key."""
+    _record(instance, "delete", {name: [value, None] for name, value in snapshot(instance).items()})
+
+
+def _record(instance, action, changes):
+    # Buffered once the change commits, so rolled back changes are not logged
+    using = instance._state.db
+    entry = ActivityEntry(
+        object_type=instance._meta.model_name,
+        object_id=instance.pk,
+        action=action,
+        changes=changes,
+        author_id=instance.author_id,
+        created_at=timezone.now(),
+    )
+    transaction.on_commit(lambda: buffer.add(using, entry), using=using)
+
+
+class ActivityLogMiddleware:
+    """Writes the activity entries buffered during a request when it ends."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            buffer.flush()
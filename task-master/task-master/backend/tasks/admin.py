@@ -1,7 +1,170 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import Category, Task
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
-# Register your models here.
+from .activity import snapshot
+from .analytics import count_create, count_delete, count_update
+from .models import PRIORITY_RANKS, Category, Task, User
+from .sharding import is_sharded, sharding_enabled
 
-admin.site.register(Category)
-admin.site.register(Task)
\ No newline at end of file
+# Below this many rows an exact COUNT(*) is cheap and table statistics are too rough
+ESTIMATE_MIN_ROWS = 10_000
+# Filtered changelists count at most this many rows
+FILTERED_COUNT_CAP = 100_000
+
+
+def estimated_row_count(model, using="default"):
+    """Row count of ``model``'s table from the database statistics, or None."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "mysql":
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                [table],
+            )
+        elif connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
+
+
+class LargeTablePaginator(Paginator):
+    """
+    Paginator for changelists over very large tables.
+
+    ``count`` never scans the whole table: an unfiltered list uses the table
+    statistics, a filtered one counts at most ``FILTERED_COUNT_CAP`` rows.
+    Pages are loaded with a late row lookup: the page's primary keys are read
+    from the index first and only those rows are then fetched with their
+    joins, so deep pages do not materialize every skipped row.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= ESTIMATE_MIN_ROWS:
+                return estimate
+            return queryset.count()
+        return queryset.order_by().values("pk")[:FILTERED_COUNT_CAP].count()
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        ids = list(self.object_list.values_list("pk", flat=True)[bottom:bottom + self.per_page])
+        rows = self.object_list.order_by().in_bulk(ids)
+        return self._get_page([rows[pk] for pk in ids if pk in rows], number, self)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = LargeTablePaginator
+    show_full_result_count = False  # Skips a second, unfiltered COUNT(*)
+    show_facets = admin.ShowFacets.NEVER
+    ordering = ("-pk",)  # Walks the primary key, also for autocomplete lookups
+    sortable_by = ("id",)  # Other columns have no index to sort on across all users
+
+
+class ShardedAdmin(LargeTableAdmin):
+    """
+    Admin for a sharded model. It lists the rows on ``ADMIN_TASK_SHARD``;
+    saves and deletes are routed to the author's shard as usual.
+    """
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request).using(settings.ADMIN_TASK_SHARD)
+        if sharding_enabled():
+            queryset = queryset.prefetch_related("author")  # Users live in the global database
+        return queryset
+
+    def get_list_select_related(self, request):
+        related = super().get_list_select_related(request)
+        if sharding_enabled():
+            return tuple(name for name in related if name != "author")
+        return related
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if is_sharded(db_field.related_model):
+            kwargs["using"] = settings.ADMIN_TASK_SHARD
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+class PriorityFilter(admin.SimpleListFilter):
+    # Filters on the indexed priority_rank rather than the priority text
+    title = "priority"
+    parameter_name = "priority"
+
+    def lookups(self, request, model_admin):
+        return [(value, value) for value in PRIORITY_RANKS]
+
+    def queryset(self, request, queryset):
+        if self.value() in PRIORITY_RANKS:
+            return queryset.filter(priority_rank=PRIORITY_RANKS[self.value()])
+        return queryset
+
+
+@admin.register(User)
+class UserAdmin(LargeTableAdmin):
+    list_display = ("id", "email", "full_name", "status", "is_staff", "created_at")
+    list_filter = ("status", "is_staff")
+    search_fields = ("^email",)  # Prefix match can use the unique email index
+    exclude = ("password", "reset_token", "reset_token_expiry", "calendar_token")
+
+
+@admin.register(Category)
+class CategoryAdmin(ShardedAdmin):
+    list_display = ("id", "name", "author")
+    list_select_related = ("author",)
+    search_fields = ("^name",)
+    autocomplete_fields = ("author",)
+
+
+@admin.register(Task)
+class TaskAdmin(ShardedAdmin):
+    list_display = ("id", "title", "author", "category", "status", "priority", "due_date")
+    list_select_related = ("author", "category")
+    list_filter = ("status", PriorityFilter)
+    # No index covers titles across all users, so the search box only takes task ids
+    search_fields = ("=id",)
+    search_help_text = "Task id"
+    autocomplete_fields = ("author", "category")
+    # Moving a task changes its subtasks' paths too, which task/reparent does;
+    # the occurrence a task was created for never changes
+    readonly_fields = ("parent", "recurrence", "occurrence_date")
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if search_term.isdigit():
+            return queryset.filter(pk=int(search_term)), False
+        return queryset.none(), False
+
+    # Keep the analytics rollups (see tasks.analytics) in step, as the API views do
+
+    def save_model(self, request, obj, form, change):
+        before = snapshot(Task.objects.using(obj._state.db).get(pk=obj.pk)) if change else None
+        super().save_model(request, obj, form, change)
+        if change:
+            count_update(obj, before)
+        else:
+            count_create(obj)
+
+    def delete_model(self, request, obj):
+        count_delete(obj)
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        tasks = list(queryset.only("id", "path", "author_id", "category_id", "status"))
+        selected = {task.pk for task in tasks}
+        for task in tasks:
+            # count_delete() counts subtasks, so skip those of another selected task
+            if not any(int(ancestor) in selected for ancestor in task.path.split("/")[:-1]):
+                count_delete(task)
+        super().delete_queryset(request, queryset)
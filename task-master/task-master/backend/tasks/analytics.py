@@ -0,0 +1,201 @@
+"""
+Daily task counts for the analytics endpoint.
+
+``TaskDailyStat`` holds, per author, category, day and status, how many tasks
+were created in that status, entered it and left it that day. The views keep
+the rows current from each task's status and category transitions
+(``count_create()``, ``count_update()``, ``count_delete()``), a couple of
+single-row UPDATEs per change, and ``backfill_task_stats`` rebuilds them from
+the tasks tables.
+
+``task_stats()`` answers any date range from these rows alone: the status
+counts at its start are the sum of everything entered minus everything left
+before it, and each day after adds its own rows, so the ``tasks`` table is
+never scanned.
+"""
+from datetime import date, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .hierarchy import descendants
+from .models import TaskDailyStat
+from .sharding import reserve_ids, sharding_enabled
+
+STATUSES = ("pending", "inprogress", "completed")
+INTERVALS = ("day", "week", "month")
+# Buckets returned for one range
+ANALYTICS_MAX_BUCKETS = 1000
+COUNTERS = ("created", "entered", "exited")
+
+
+class AnalyticsError(ValueError):
+    pass
+
+
+def _bump(using, author_id, category_id, day, status, **counts):
+    rows = TaskDailyStat.objects.using(using).filter(
+        author_id=author_id, category_id=category_id, day=day, status=status
+    )
+    increments = {name: F(name) + value for name, value in counts.items()}
+    if rows.update(**increments):
+        return
+    try:
+        with transaction.atomic(using=using):
+            TaskDailyStat.objects.using(using).create(
+                author_id=author_id, category_id=category_id, day=day, status=status, **counts
+            )
+    except IntegrityError:
+        rows.update(**increments)  # Created concurrently
+
+
+def count_create(task):
+    _bump(
+        task._state.db, task.author_id, task.category_id, timezone.localdate(), task.status,
+        created=1, entered=1,
+    )
+
+
+def count_update(task, before):
+    """Count ``task``'s move since ``before``, its ``activity.snapshot()`` from before saving."""
+    if (before["status"], before["category"]) == (task.status, task.category_id):
+        return
+    today = timezone.localdate()
+    _bump(task._state.db, task.author_id, before["category"], today, before["status"], exited=1)
+    _bump(task._state.db, task.author_id, task.category_id, today, task.status, entered=1)
+
+
+def count_delete(task):
+    """Call before ``task.delete()``. Its subtasks, which the delete cascades to, are counted too."""
+    using, today = task._state.db, timezone.localdate()
+    _bump(using, task.author_id, task.category_id, today, task.status, exited=1)
+    subtasks = descendants(task).values_list("category_id", "status").annotate(count=Count("id")).order_by()
+    for category_id, status, count in subtasks:
+        _bump(using, task.author_id, category_id, today, status, exited=count)
+
+
+def merge_counts(using, counts):
+    """
+    Add ``counts``, ``{(author_id, category_id, day, status): {counter:
+    n}}``, to the rows in one read and two bulk writes.
+    """
+    with transaction.atomic(using=using):
+        existing = {
+            (row.author_id, row.category_id, row.day, row.status): row
+            for row in TaskDailyStat.objects.using(using).select_for_update().filter(
+                author_id__in={key[0] for key in counts},
+                category_id__in={key[1] for key in counts},
+                day__in={key[2] for key in counts},
+            )
+        }
+        changed, added = [], []
+        for key, values in counts.items():
+            row = existing.get(key)
+            if row is None:
+                author_id, category_id, day, status = key
+                added.append(TaskDailyStat(
+                    author_id=author_id, category_id=category_id, day=day, status=status, **values
+                ))
+                continue
+            for name, value in values.items():
+                setattr(row, name, getattr(row, name) + value)
+            changed.append(row)
+        TaskDailyStat.objects.using(using).bulk_update(changed, COUNTERS, batch_size=1000)
+        if added and sharding_enabled():
+            for row, pk in zip(added, reserve_ids(TaskDailyStat, len(added))):
+                row.pk = pk
+        TaskDailyStat.objects.using(using).bulk_create(added, batch_size=1000)
+
+
+def _bucket_start(day, interval):
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    if interval == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _next_bucket(day, interval):
+    if interval == "week":
+        return day + timedelta(days=7)
+    if interval == "month":
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+def _bucket_count(start, end, interval):
+    if interval == "month":
+        return (end.year - start.year) * 12 + end.month - start.month + 1
+    days = (_bucket_start(end, interval) - _bucket_start(start, interval)).days
+    return days // 7 + 1 if interval == "week" else days + 1
+
+
+def parse_range(params):
+    """The ``start`` and ``end`` query parameters, the last 30 days by default. Raises ``AnalyticsError``."""
+    try:
+        end = date.fromisoformat(params["end"]) if "end" in params else timezone.localdate()
+        start = date.fromisoformat(params["start"]) if "start" in params else end - timedelta(days=29)
+    except ValueError:
+        raise AnalyticsError("start and end must be dates in YYYY-MM-DD format")
+    return start, end
+
+
+def task_stats(user, start, end, interval="day", category_id=None):
+    """
+    Per day, week or month from ``start`` to ``end`` (inclusive): tasks
+    created, tasks completed, and the tasks in each status at the end of the
+    bucket. Two queries on the rollups.
+    """
+    if end < start:
+        raise AnalyticsError("end must not be before start")
+    if interval not in INTERVALS:
+        raise AnalyticsError(f"interval must be one of: {', '.join(INTERVALS)}")
+    if _bucket_count(start, end, interval) > ANALYTICS_MAX_BUCKETS:
+        raise AnalyticsError(f"At most {ANALYTICS_MAX_BUCKETS} {interval}s per request; use a longer interval")
+
+    rows = TaskDailyStat.objects.for_user(user)
+    if category_id is not None:
+        rows = rows.filter(category_id=category_id)
+    # Tasks in each status when the range starts
+    current = dict.fromkeys(STATUSES, 0)
+    for status, entered, exited in (
+        rows.filter(day__lt=start).values("status").annotate(entered=Sum("entered"), exited=Sum("exited"))
+        .values_list("status", "entered", "exited")
+    ):
+        current[status] += entered - exited
+    daily = (
+        rows.filter(day__range=(start, end))
+        .values("day", "status")
+        .annotate(created=Sum("created"), entered=Sum("entered"), exited=Sum("exited"))
+        .values_list("day", "status", "created", "entered", "exited")
+        .order_by("day")
+    )
+
+    buckets = {}  # By first day
+    for day, status, created, entered, exited in daily:
+        bucket = buckets.setdefault(_bucket_start(day, interval), {"created": 0, "completed": 0, "moves": []})
+        bucket["created"] += created
+        if status == "completed":
+            bucket["completed"] += entered
+        bucket["moves"].append((status, entered - exited))
+
+    results = []
+    totals = {"created": 0, "completed": 0}
+    day = _bucket_start(start, interval)
+    while day <= end:
+        bucket = buckets.get(day, {"created": 0, "completed": 0, "moves": []})
+        for status, change in bucket["moves"]:
+            current[status] += change
+        total = sum(current.values())
+        results.append({
+            "date": day,
+            "created": bucket["created"],
+            "completed": bucket["completed"],
+            "status_counts": dict(current),
+            "completion_rate": round(current["completed"] / total, 4) if total else None,
+        })
+        totals["created"] += bucket["created"]
+        totals["completed"] += bucket["completed"]
+        day = _next_bucket(day, interval)
+    return {"interval": interval, "totals": totals, "buckets": results}
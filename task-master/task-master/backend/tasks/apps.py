@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class TasksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tasks'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .suggestions import check_suggest_cache
+
+        checks.register(check_suggest_cache, checks.Tags.caches)
@@ -0,0 +1,169 @@
+import heapq
+from datetime import timedelta
+from itertools import chain, islice
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .filters import TASK_ORDERINGS
+from .hierarchy import reattach
+from .models import ArchivedTask, ArchivedTaskTag, Task, TaskTag
+from .suggestions import invalidate
+
+# Columns copied between `tasks` and `tasks_archive`
+ARCHIVED_COLUMNS = [
+    "id", "title", "description", "due_date", "priority", "priority_rank", "rank",
+    "parent_id", "path", "recurrence_id", "occurrence_date", "version",
+    "status", "category_id", "author_id", "created_at", "updated_at",
+]
+# And between `task_tags` and `task_tags_archive`, by task_id
+TAG_COLUMNS = ["id", "task_id", "tag_id", "author_id"]
+
+
+def wants_archived(request):
+    """True when the request opted in with ?include_archived=true."""
+    return request.query_params.get("include_archived", "").lower() in ("1", "true", "yes")
+
+
+def _copy_rows(using, source, target, ids, archived_at=None, columns=ARCHIVED_COLUMNS, key="id"):
+    # INSERT ... SELECT keeps the rows (and their timestamps) inside the
+    # database instead of round-tripping them through model instances
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    columns = ", ".join(quote(column) for column in columns)
+    target_columns = source_columns = columns
+    params = []
+    if archived_at is not None:
+        target_columns += f", {quote('archived_at')}"
+        source_columns += ", %s"
+        params.append(archived_at)
+    placeholders = ", ".join(["%s"] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(target)} ({target_columns}) "
+            f"SELECT {source_columns} FROM {quote(source)} WHERE {quote(key)} IN ({placeholders})",
+            [*params, *ids],
+        )
+
+
+def archive_completed_tasks(older_than_days, batch_size=1000, stdout=None):
+    """
+    Move tasks completed more than ``older_than_days`` ago (by last update)
+    into ``tasks_archive``, ``batch_size`` rows per short transaction.
+
+    The scan walks the primary key of each shard once, so the whole run is a
+    single pass over the table however many batches it takes. Tasks with
+    subtasks still in the table wait for them, so deleting a batch never
+    cascades to live rows. Returns the number moved.
+    """
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    has_subtasks = Exists(Task.objects.filter(parent=OuterRef("pk")))
+    moved = 0
+    for alias in settings.TASK_SHARDS:
+        last_id = 0
+        while True:
+            with transaction.atomic(using=alias):
+                ids = list(
+                    Task.objects.using(alias)
+                    .select_for_update()
+                    .filter(id__gt=last_id, status="completed", updated_at__lt=cutoff)
+                    .exclude(has_subtasks)
+                    .order_by("id")
+                    .values_list("id", flat=True)[:batch_size]
+                )
+                if not ids:
+                    break
+                _copy_rows(
+                    alias,
+                    Task._meta.db_table,
+                    ArchivedTask._meta.db_table,
+                    ids,
+                    archived_at=timezone.now(),
+                )
+                _copy_rows(
+                    alias, TaskTag._meta.db_table, ArchivedTaskTag._meta.db_table, ids,
+                    columns=TAG_COLUMNS, key="task_id",
+                )
+                Task.objects.using(alias).filter(id__in=ids).delete()
+            last_id = ids[-1]
+            moved += len(ids)
+            if stdout is not None:
+                stdout.write(f"{moved} tasks archived", ending="\r")
+    return moved
+
+
+def restore_tasks(archived):
+    """Move the given ``ArchivedTask`` queryset back into ``tasks``. Returns the count."""
+    restored = 0
+    alias = archived.db
+    with transaction.atomic(using=alias):
+        rows = list(archived.select_for_update().values_list("id", "author_id"))
+        ids = [task_id for task_id, _ in rows]
+        for start in range(0, len(ids), 1000):
+            chunk = ids[start:start + 1000]
+            _copy_rows(alias, ArchivedTask._meta.db_table, Task._meta.db_table, chunk)
+            _copy_rows(
+                alias, ArchivedTaskTag._meta.db_table, TaskTag._meta.db_table, chunk,
+                columns=TAG_COLUMNS, key="task_id",
+            )
+            ArchivedTask.objects.using(alias).filter(id__in=chunk).delete()
+            restored += len(chunk)
+        reattach(Task, ids, alias)
+        for author_id in {author_id for _, author_id in rows}:
+            invalidate(author_id, alias)
+    return restored
+
+
+class MergedTasks:
+    """
+    The rows of a live task queryset followed by those of an archive
+    queryset, or merged with them in ``TASK_ORDERINGS[ordering]`` order, in
+    which case both must already be sorted that way and load its columns.
+
+    Nothing is read until the rows are iterated or sliced, and a slice ending
+    at ``stop`` reads at most ``stop`` rows of each table (with ``LIMIT``), so
+    a page never loads either table in full. ``count()`` is two ``COUNT``
+    queries, as pagination expects of a queryset.
+    """
+
+    def __init__(self, tasks, archived, ordering=None):
+        self.tasks = tasks
+        self.archived = archived
+        self.columns = [column.lstrip("-") for column in TASK_ORDERINGS[ordering]] if ordering else None
+        self.descending = bool(ordering) and TASK_ORDERINGS[ordering][0].startswith("-")
+
+    def _sort_key(self, task):
+        # NULLs sort first, as they do in MySQL
+        return tuple(
+            (0, None) if getattr(task, name) is None else (1, getattr(task, name))
+            for name in self.columns
+        )
+
+    def _merge(self, tasks, archived):
+        if self.columns is None:
+            return chain(tasks, archived)
+        return heapq.merge(tasks, archived, key=self._sort_key, reverse=self.descending)
+
+    def __iter__(self):
+        return self._merge(self.tasks, self.archived)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice) and index.step is None and index.stop is not None:
+            start = index.start or 0
+            if 0 <= start <= index.stop:
+                merged = self._merge(self.tasks[:index.stop], self.archived[:index.stop])
+                return list(islice(merged, start, index.stop))
+        return list(self)[index]
+
+    def count(self):
+        return self.tasks.count() + self.archived.count()
+
+    def __len__(self):
+        return self.count()
+
+
+def with_archived(tasks, archived, ordering=None):
+    """Combine a live task queryset with the matching archive queryset (see ``MergedTasks``)."""
+    return MergedTasks(tasks, archived, ordering)
@@ -0,0 +1,139 @@
+"""
+Run several API calls from one HTTP request.
+
+Each sub-request is resolved against ``tasks.urls`` and dispatched straight
+to its view, so middleware and JWT decoding run once for the whole batch:
+``BatchAuthentication`` gives it the user and token of the batch request.
+Sub-responses are returned as data, which means ``?format=`` renderers do
+not apply to them.
+"""
+import io
+import json
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import transaction
+from django.urls import Resolver404, resolve
+from rest_framework.authentication import BaseAuthentication
+
+from .sharding import GLOBAL_DB, shard_for_user
+
+BATCH_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE"}
+
+
+class BatchError(ValueError):
+    pass
+
+
+class BatchAuthentication(BaseAuthentication):
+    """Authenticates a sub-request as the batch request it was sent in."""
+
+    def authenticate(self, request):
+        parent = getattr(request._request, "batch_parent", None)
+        if parent is None:
+            return None
+        return parent.user, parent.auth
+
+
+def parse_batch(payload):
+    """Validate the batch body and return ``(sub_requests, atomic)``. Raises ``BatchError``."""
+    if not isinstance(payload, dict) or not isinstance(payload.get("requests"), list):
+        raise BatchError("requests must be a list")
+    sub_requests = payload["requests"]
+    if not sub_requests:
+        raise BatchError("requests must not be empty")
+    if len(sub_requests) > settings.BATCH_MAX_REQUESTS:
+        raise BatchError(f"A batch can contain at most {settings.BATCH_MAX_REQUESTS} requests")
+
+    for index, sub in enumerate(sub_requests):
+        if not isinstance(sub, dict) or not isinstance(sub.get("path"), str):
+            raise BatchError(f"requests[{index}] must have a path")
+        method = sub.get("method", "GET")
+        if not isinstance(method, str) or method.upper() not in BATCH_METHODS:
+            raise BatchError(f"requests[{index}] has an unsupported method")
+    return sub_requests, bool(payload.get("atomic", False))
+
+
+def run_batch(request, sub_requests, atomic=False):
+    """
+    Dispatch ``sub_requests`` in order and return one ``{"status", "body"}``
+    dict per request.
+
+    With ``atomic`` everything runs in one transaction per database that is
+    rolled back on the first response with status 400 or above; the requests after it are not
+    run and get status 424.
+    """
+    if not atomic:
+        return [_dispatch(request, sub) for sub in sub_requests]
+
+    # The user's tasks may live on a shard other than the global database
+    aliases = {GLOBAL_DB, shard_for_user(request.user)}
+    results = []
+    with ExitStack() as stack:
+        for alias in aliases:
+            stack.enter_context(transaction.atomic(using=alias))
+        for sub in sub_requests:
+            result = _dispatch(request, sub)
+            results.append(result)
+            if result["status"] >= 400:
+                for alias in aliases:
+                    transaction.set_rollback(True, using=alias)
+                break
+    skipped = {"status": 424, "body": {"error": "Not run, an earlier request in the batch failed"}}
+    return results + [skipped] * (len(sub_requests) - len(results))
+
+
+def _environ(request, method, path, body):
+    """The WSGI environ of a sub-request: the batch's server keys and host, none of its headers."""
+    path_info, _, query_string = path.partition("?")
+    environ = {
+        key: value
+        for key, value in request.META.items()
+        if not key.startswith("HTTP_") and key not in ("CONTENT_TYPE", "CONTENT_LENGTH")
+    }
+    environ.update(
+        {
+            "HTTP_HOST": request.get_host(),
+            "REQUEST_METHOD": method,
+            "PATH_INFO": path_info,
+            "QUERY_STRING": query_string,
+            "wsgi.url_scheme": request.scheme,
+            "wsgi.input": io.BytesIO(body),
+        }
+    )
+    if body:
+        environ["CONTENT_TYPE"] = "application/json"
+        environ["CONTENT_LENGTH"] = str(len(body))
+    return environ
+
+
+def _dispatch(request, sub):
+    path = "/" + sub["path"].lstrip("/")
+    try:
+        match = resolve(path.partition("?")[0], urlconf="tasks.urls")
+    except Resolver404:
+        return {"status": 404, "body": {"error": f"No route for {path}"}}
+    view_class = match.func.view_class
+    if not getattr(view_class, "batchable", True):
+        return {"status": 400, "body": {"error": f"{path} cannot be called in a batch"}}
+
+    method = sub.get("method", "GET").upper()
+    body = b"" if method == "GET" else json.dumps(sub.get("body", {})).encode()
+    sub_request = WSGIRequest(_environ(request, method, path, body))
+    # Read by BatchAuthentication, reusing what DRF already did for the batch itself
+    sub_request.batch_parent = request
+    view = view_class.as_view(
+        **{**match.func.view_initkwargs, "authentication_classes": [BatchAuthentication]}
+    )
+
+    response = view(sub_request, *match.args, **match.kwargs)
+    if hasattr(response, "data"):
+        body = response.data  # DRF response, no need to render and parse it back
+    else:
+        content = response.content.decode(response.charset)
+        try:
+            body = json.loads(content) if content else None
+        except ValueError:
+            body = content
+    return {"status": response.status_code, "body": body}
@@ -0,0 +1,186 @@
+"""
+Single-flight coalescing of identical concurrent reads.
+
+Several tabs, or a retrying frontend, often send the same GET at the same
+time. A view method decorated with ``@coalesced`` lets the first of those
+requests (the leader) compute and render the response, and every identical
+request arriving while it runs (the followers) gets a copy of the rendered
+body instead of querying and serializing it again. Requests are identical
+when they have the same user, path, query parameters (in any order) and
+negotiated media type.
+
+Within a process the followers wait on the leader's flight. When
+``COALESCE_CACHE`` names a cache shared by the workers, the leaders of each
+worker also coalesce through it: the first takes a lock, and the others poll
+for the body it publishes. Nothing is cached beyond the flight itself.
+
+A follower waits at most ``COALESCE_WAIT_SECONDS``, and computes the response
+itself if the leader fails or has not finished by then; the cache lock
+expires after the same time, so a stuck leader never blocks anyone for
+longer. Any write request by a user ends the flights of that user's reads,
+so a read sent after a write's response never joins a read started before it.
+"""
+import functools
+import hashlib
+import math
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.http import HttpResponse
+from rest_framework.permissions import SAFE_METHODS
+
+from task_manager.metrics import COALESCED_REQUESTS
+
+# How often followers in other workers check for the leader's body
+COALESCE_POLL_SECONDS = 0.02
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.payload = None  # (status, headers, content) once the leader has succeeded
+
+
+_flights = {}  # {user_id: {key: Flight}}
+_lock = threading.Lock()
+
+
+def request_key(request):
+    params = sorted((name, values) for name, values in request.query_params.lists())
+    return hashlib.sha1(repr((request.path, params, request.accepted_media_type)).encode()).hexdigest()
+
+
+def forget(user_id):
+    """End the user's flights, so that later reads compute afresh."""
+    with _lock:
+        _flights.pop(user_id, None)
+    if settings.COALESCE_CACHE:
+        cache = caches[settings.COALESCE_CACHE]
+        generation_key = f"coalesce:{user_id}:generation"
+        if not cache.add(generation_key, 1, None):
+            try:
+                cache.incr(generation_key)
+            except ValueError:  # Evicted meanwhile
+                cache.add(generation_key, 1, None)
+
+
+def _in_transaction():
+    # Inside an atomic /batch the reads see its uncommitted writes
+    return any(connection.in_atomic_block for connection in connections.all(initialized_only=True))
+
+
+def _payload(response):
+    if response.streaming or response.status_code >= 500:
+        return None
+    return response.status_code, list(response.items()), response.content
+
+
+def _response(payload):
+    status, headers, content = payload
+    response = HttpResponse(content, status=status)
+    for name, value in headers:
+        response[name] = value
+    return response
+
+
+def _run(view, request, compute):
+    # The body is shared, so it is rendered here rather than by the handler
+    response = view.finalize_response(request, compute())
+    if hasattr(response, "render"):
+        response.render()
+    return response
+
+
+def _shared_run(view, request, user_id, key, compute):
+    """Run as this process's leader, coalescing with the other workers' leaders."""
+    cache = caches[settings.COALESCE_CACHE]
+    generation = cache.get(f"coalesce:{user_id}:generation", 0)
+    lock_key = f"coalesce:{user_id}:{generation}:{key}"
+    timeout = math.ceil(settings.COALESCE_WAIT_SECONDS)
+    token = uuid.uuid4().hex
+    if cache.add(lock_key, token, timeout):
+        try:
+            response = _run(view, request, compute)
+            payload = _payload(response)
+            if payload is not None:
+                cache.set(f"{lock_key}:{token}", payload, timeout)
+            return response
+        finally:
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
+
+    leader = cache.get(lock_key)
+    deadline = time.monotonic() + settings.COALESCE_WAIT_SECONDS
+    while leader is not None and time.monotonic() < deadline:
+        payload = cache.get(f"{lock_key}:{leader}")
+        if payload is not None:
+            COALESCED_REQUESTS.inc(type(view).__name__, "shared")
+            return _response(payload)
+        if cache.get(lock_key) != leader:
+            break  # Finished without a body to share, or expired
+        time.sleep(COALESCE_POLL_SECONDS)
+    if leader is not None:
+        COALESCED_REQUESTS.inc(type(view).__name__, "fallback")
+    return _run(view, request, compute)
+
+
+def coalesced(handler):
+    """Coalesce concurrent identical calls of a view's GET handler."""
+
+    @functools.wraps(handler)
+    def wrapper(view, request, *args, **kwargs):
+        def compute():
+            return handler(view, request, *args, **kwargs)
+
+        if not settings.COALESCE_ENABLED or not request.user.is_authenticated or _in_transaction():
+            return compute()
+        user_id, key = request.user.pk, request_key(request)
+        with _lock:
+            flights = _flights.setdefault(user_id, {})
+            flight = flights.get(key)
+            leading = flight is None
+            if leading:
+                flight = flights[key] = Flight()
+
+        if not leading:
+            if flight.done.wait(settings.COALESCE_WAIT_SECONDS) and flight.payload is not None:
+                COALESCED_REQUESTS.inc(type(view).__name__, "follower")
+                return _response(flight.payload)
+            COALESCED_REQUESTS.inc(type(view).__name__, "fallback")
+            return _run(view, request, compute)
+
+        try:
+            if settings.COALESCE_CACHE:
+                response = _shared_run(view, request, user_id, key, compute)
+            else:
+                response = _run(view, request, compute)
+            flight.payload = _payload(response)
+            return response
+        finally:
+            flight.done.set()
+            with _lock:
+                flights = _flights.get(user_id)
+                if flights is not None and flights.get(key) is flight:
+                    del flights[key]
+                    if not flights:
+                        del _flights[user_id]
+
+    return wrapper
+
+
+class CoalescingMiddleware:
+    """Ends a user's read flights once a write request of theirs has been handled."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        user = getattr(request, "user", None)  # Set by DRF's authentication
+        if request.method not in SAFE_METHODS and user is not None and user.is_authenticated:
+            forget(user.pk)
+        return response
@@ -0,0 +1,92 @@
+"""
+Optimistic concurrency control for edits.
+
+Rows of a ``VersionedModel`` carry a ``version`` that every save of an
+existing row increments, and the save's UPDATE only matches the row while it
+is still at the version the instance was read at:
+
+    UPDATE tasks SET ..., version = 4 WHERE id = 12 AND version = 3
+
+A save that matches nothing raises ``VersionConflict`` instead of silently
+overwriting a concurrent edit. Nothing is locked, so readers and writers of
+other rows are never blocked. Edit endpoints take the version the client
+last saw from ``If-Match`` (the ``ETag`` of an earlier response) or a
+``version`` in the body, and answer a conflict with 409 and the current row.
+"""
+from django.db import models
+from django.utils.http import parse_etags
+
+
+class VersionConflict(Exception):
+    """The row was changed (or deleted) since it was read."""
+
+
+class VersionedModel(models.Model):
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "version"}
+        if "version" in self.get_deferred_fields():
+            # Read without its version, so nothing to check, but editors
+            # holding the old version must still see the change
+            self.version = models.F("version") + 1
+            try:
+                return super().save(*args, **kwargs)
+            finally:
+                del self.version  # Deferred again; reading it fetches the new value
+        self._read_version = self.version
+        self.version += 1
+        try:
+            super().save(*args, **kwargs)
+        except VersionConflict:
+            self.version = self._read_version
+            raise
+        finally:
+            del self._read_version
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        # Model._save_table's UPDATE, narrowed to the version that was read.
+        # Without this, an UPDATE matching no row would fall back to an INSERT
+        read_version = getattr(self, "_read_version", None)
+        if read_version is None:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        if not super()._do_update(
+            base_qs.filter(version=read_version), using, pk_val, values, update_fields, forced_update
+        ):
+            raise VersionConflict(f"{self._meta.verbose_name} {pk_val} is no longer at version {read_version}")
+        return True
+
+
+def etag(instance):
+    return f'"{instance.version}"'
+
+
+def requested_version(request):
+    """
+    The version the client is editing: from ``If-Match`` or else the body's
+    ``version``, None when it sent neither. Raises ``ValueError`` if malformed.
+    """
+    header = request.headers.get("If-Match")
+    if header is not None:
+        tags = parse_etags(header)
+        if tags == ["*"]:
+            return None
+        if len(tags) != 1:
+            raise ValueError("If-Match must be one ETag from an earlier response")
+        value = tags[0].removeprefix("W/").strip('"')
+        if not value.isdigit():
+            raise ValueError("If-Match must be one ETag from an earlier response")
+        return int(value)
+    value = request.data.get("version")
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise ValueError("version must be a positive integer")
+    return value
@@ -0,0 +1,151 @@
+"""
+iCalendar feed of a user's due dates.
+
+Calendar apps subscribe to ``/calendar/<token>.ics`` and poll it, so the feed
+is authenticated by the secret in its URL (``User.calendar_token``) rather
+than a JWT. Each task due in the window is an all-day VEVENT, or a VTODO
+with ``?component=VTODO`` for apps that list tasks. The window is
+``CALENDAR_PAST_DAYS`` before today to ``CALENDAR_FUTURE_DAYS`` after unless
+``start``/``end`` are given, and at most ``CALENDAR_MAX_WINDOW_DAYS`` long,
+so a feed stays bounded however many tasks a user has had.
+
+A poll costs one aggregate over the window's rows in the (author, due_date)
+index, which gives the ETag and Last-Modified; when they match what the app
+already has it gets a 304. Otherwise the tasks are read with ``iterator()``
+and written out as they arrive, so a large feed is never held in memory.
+Last-Modified does not move when a task is deleted, but the ETag does.
+"""
+import hashlib
+from datetime import date, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .models import Task
+
+CALENDAR_PAST_DAYS = 90
+CALENDAR_FUTURE_DAYS = 365
+CALENDAR_MAX_WINDOW_DAYS = 731
+# Rows fetched per round trip, and events written per chunk of the response
+CALENDAR_CHUNK_SIZE = 500
+COMPONENTS = ("VEVENT", "VTODO")
+# Bump when the output changes, so that cached feeds are fetched again
+FEED_FORMAT = 1
+
+PRIORITIES = {"high": 1, "medium": 5, "low": 9}
+TODO_STATUSES = {"pending": "NEEDS-ACTION", "inprogress": "IN-PROCESS", "completed": "COMPLETED"}
+COLUMNS = ("id", "title", "description", "due_date", "priority", "status", "version", "updated_at")
+
+
+class FeedError(ValueError):
+    pass
+
+
+def parse_window(params):
+    """The ``start`` and ``end`` query parameters, around today by default. Raises ``FeedError``."""
+    today = timezone.localdate()
+    start = today - timedelta(days=CALENDAR_PAST_DAYS)
+    end = today + timedelta(days=CALENDAR_FUTURE_DAYS)
+    try:
+        start = date.fromisoformat(params["start"]) if "start" in params else start
+        end = date.fromisoformat(params["end"]) if "end" in params else end
+    except ValueError:
+        raise FeedError("start and end must be dates in YYYY-MM-DD format")
+    if end < start:
+        raise FeedError("end must not be before start")
+    if (end - start).days >= CALENDAR_MAX_WINDOW_DAYS:
+        raise FeedError(f"Feeds can span at most {CALENDAR_MAX_WINDOW_DAYS} days")
+    return start, end
+
+
+def feed_tasks(user, start, end):
+    return Task.objects.for_user(user).filter(due_date__range=(start, end))
+
+
+def validators(tasks, *key):
+    """
+    ``(etag, last_modified)`` of the feed of ``tasks``, the latter a timestamp
+    or None, from one aggregate. ``key`` holds whatever else shapes the output.
+    """
+    summary = tasks.aggregate(count=Count("id"), latest=Max("updated_at"))
+    latest = summary["latest"]
+    digest = hashlib.sha1(repr((FEED_FORMAT, *key, summary["count"], latest)).encode()).hexdigest()
+    return f'"{digest}"', int(latest.timestamp()) if latest is not None else None
+
+
+def _escape(text):
+    return (
+        text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+        .replace("\r\n", "\\n").replace("\n", "\\n").replace("\r", "\\n")
+    )
+
+
+def _fold(line):
+    # Content lines are at most 75 octets; longer ones continue after CRLF and a space
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return encoded + b"\r\n"
+    parts, start, limit = [], 0, 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        while end < len(encoded) and encoded[end] & 0xC0 == 0x80:
+            end -= 1  # Never split a UTF-8 sequence
+        parts.append(encoded[start:end])
+        start, limit = end, 74
+    return b"\r\n ".join(parts) + b"\r\n"
+
+
+def _timestamp(moment):
+    return moment.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _component(row, component, host):
+    task_id, title, description, due_date, priority, status, version, updated_at = row
+    lines = [
+        f"BEGIN:{component}",
+        f"UID:task-{task_id}@{host}",
+        f"DTSTAMP:{_timestamp(updated_at)}",
+        f"LAST-MODIFIED:{_timestamp(updated_at)}",
+        f"SEQUENCE:{version - 1}",
+        f"SUMMARY:{_escape(title)}",
+    ]
+    if component == "VTODO":
+        lines += [f"DUE;VALUE=DATE:{due_date:%Y%m%d}", f"STATUS:{TODO_STATUSES[status]}"]
+    else:
+        lines += [
+            f"DTSTART;VALUE=DATE:{due_date:%Y%m%d}",
+            f"DTEND;VALUE=DATE:{due_date + timedelta(days=1):%Y%m%d}",
+            "TRANSP:TRANSPARENT",
+        ]
+    if description:
+        lines.append(f"DESCRIPTION:{_escape(description)}")
+    lines += [
+        f"PRIORITY:{PRIORITIES.get(priority, 0)}",
+        f"URL:{settings.FRONTEND_URL}/edit-task/{task_id}",
+        f"END:{component}",
+    ]
+    return b"".join(_fold(line) for line in lines)
+
+
+def stream_feed(tasks, component, host):
+    """Yield the feed of ``tasks`` in chunks of ``CALENDAR_CHUNK_SIZE`` components."""
+    yield b"".join(_fold(line) for line in (
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//Task Master//Due dates//EN",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        "X-WR-CALNAME:Task Master",
+        "REFRESH-INTERVAL;VALUE=DURATION:PT1H",
+        "X-PUBLISHED-TTL:PT1H",
+    ))
+    chunk = []
+    rows = tasks.order_by("due_date", "id").values_list(*COLUMNS).iterator(chunk_size=CALENDAR_CHUNK_SIZE)
+    for row in rows:
+        chunk.append(_component(row, component, host))
+        if len(chunk) == CALENDAR_CHUNK_SIZE:
+            yield b"".join(chunk)
+            chunk = []
+    chunk.append(b"END:VCALENDAR\r\n")
+    yield b"".join(chunk)
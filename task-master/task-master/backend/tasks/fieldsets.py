@@ -0,0 +1,67 @@
+from rest_framework import status
+from rest_framework.response import Response
+
+from .sharding import is_sharded, sharding_enabled
+
+
+def sparse_fields(request, allowed):
+    """
+    Read the ``?fields=a,b,c`` query parameter.
+
+    Returns ``(fields, error)``: ``fields`` is None when the parameter is
+    absent, and ``error`` is a 400 response when it names a field that is not
+    in ``allowed``.
+    """
+    raw = request.query_params.get("fields")
+    if raw is None:
+        return None, None
+
+    fields = [name.strip() for name in raw.split(",") if name.strip()]
+    unknown = [name for name in fields if name not in allowed]
+    if not fields:
+        return None, Response(
+            {"error": "The fields parameter must name at least one field"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if unknown:
+        return None, Response(
+            {
+                "error": f"Unknown field(s): {', '.join(unknown)}",
+                "available_fields": list(allowed),
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    return fields, None
+
+
+def only_fields(queryset, fields, related=(), extra=()):
+    """
+    Restrict ``queryset`` to the columns needed for ``fields``.
+
+    ``related`` names relations that are serialized as nested objects; they
+    are loaded only when requested. ``extra`` lists columns the view itself
+    needs (e.g. for permission checks).
+    """
+    if fields is None:
+        return _load_related(queryset, related)
+
+    queryset = _load_related(queryset, [name for name in related if name in fields])
+    columns = [name for name in (*fields, *extra) if not queryset.model._meta.get_field(name).many_to_many]
+    return queryset.only(queryset.model._meta.pk.name, *columns)
+
+
+def _load_related(queryset, names):
+    # Many-to-many relations, and relations from a shard to the global
+    # database, cannot be joined
+    model = queryset.model
+    prefetched = [
+        name for name in names
+        if model._meta.get_field(name).many_to_many
+        or (sharding_enabled() and is_sharded(model) != is_sharded(model._meta.get_field(name).related_model))
+    ]
+    joined = [name for name in names if name not in prefetched]
+    if joined:
+        queryset = queryset.select_related(*joined)
+    if prefetched:
+        queryset = queryset.prefetch_related(*prefetched)
+    return queryset
@@ -0,0 +1,152 @@
+"""
+Subtasks stored as a materialized path.
+
+``Task.path`` holds the ids of a task's ancestors, root first, each followed
+by "/" ("" for a top-level task), so the whole subtree of a task is the range
+of paths starting with ``subtree_prefix(task)``. With the (author, path)
+index, listing a subtree or counting its completed tasks is one range scan
+whatever the depth, and ``Task.parent`` keeps the direct link for children
+lists and cascading deletes.
+
+The range is written as ``path >= prefix AND path < prefix-with-"/"-bumped``
+rather than a LIKE, which the index serves on every backend.
+"""
+from django.db import router, transaction
+from django.db.models import Count, Max, Q, Value
+from django.db.models.functions import Concat, Length, Replace, Substr
+
+# Ancestors a task may have; with ids of up to 20 digits the path always
+# fits in Task.path
+SUBTASK_MAX_DEPTH = 10
+MOVE_BATCH_SIZE = 1000
+
+
+class HierarchyError(ValueError):
+    pass
+
+
+def subtree_prefix(task):
+    """Path prefix shared by all subtasks of ``task``."""
+    return f"{task.path}{task.pk}/"
+
+
+def child_path(parent):
+    """``path`` of a direct subtask of ``parent`` (None for a top-level task)."""
+    return "" if parent is None else subtree_prefix(parent)
+
+
+def depth(path):
+    return path.count("/")
+
+
+def in_subtree(queryset, prefix):
+    """Rows of ``queryset`` whose path starts with ``prefix`` (which ends with "/")."""
+    # "0" is the character right after "/"
+    return queryset.filter(path__gte=prefix, path__lt=prefix[:-1] + "0")
+
+
+def descendants(task, using=None):
+    """All subtasks of ``task``, at any depth, read from its shard."""
+    using = using or task._state.db
+    tasks = type(task).objects.using(using).filter(author_id=task.author_id)
+    return in_subtree(tasks, subtree_prefix(task))
+
+
+def subtree_progress(task):
+    """Subtask counts per status below ``task``, from one aggregate query."""
+    counts = descendants(task).aggregate(
+        total=Count("id"),
+        pending=Count("id", filter=Q(status="pending")),
+        inprogress=Count("id", filter=Q(status="inprogress")),
+        completed=Count("id", filter=Q(status="completed")),
+    )
+    counts["percent_complete"] = round(100 * counts["completed"] / counts["total"], 1) if counts["total"] else None
+    return counts
+
+
+def check_parent(task, parent):
+    """Raise ``HierarchyError`` if ``parent`` cannot take ``task`` (a saved task) as a subtask."""
+    if parent is None:
+        return
+    if parent.pk == task.pk or parent.path.startswith(subtree_prefix(task)):
+        raise HierarchyError("A task cannot be moved under itself or one of its subtasks")
+    if parent.category_id != task.category_id:
+        raise HierarchyError("A subtask must be in the same category as its parent")
+
+
+def move_subtree(task, parent, batch_size=MOVE_BATCH_SIZE):
+    """
+    Make ``task`` a subtask of ``parent`` (top-level when None), taking its
+    subtasks along. The descendants' paths are rewritten in SQL, ``batch_size``
+    rows per UPDATE, in one transaction so readers never see a half-moved
+    tree. Returns the number of tasks moved.
+    """
+    Task = type(task)
+    using = router.db_for_write(Task, instance=task)
+    with transaction.atomic(using=using):
+        # Moves within a category are serialized on the category row, which
+        # also rules out two concurrent moves that would form a cycle
+        Category = Task._meta.get_field("category").related_model
+        Category.objects.using(using).select_for_update().filter(pk=task.category_id).exists()
+        task.refresh_from_db(using=using, fields=["parent", "path", "category"])
+        if parent is not None:
+            parent.refresh_from_db(using=using, fields=["path", "category"])
+        check_parent(task, parent)
+
+        old_prefix = subtree_prefix(task)
+        new_path = child_path(parent)
+        tasks = descendants(task, using)
+        deepest = tasks.aggregate(
+            depth=Max(Length("path") - Length(Replace("path", Value("/"), Value(""))))
+        )["depth"]
+        height = deepest - depth(task.path) if deepest is not None else 0
+        if depth(new_path) + height > SUBTASK_MAX_DEPTH:
+            raise HierarchyError(f"Subtasks can be nested at most {SUBTASK_MAX_DEPTH} levels deep")
+
+        task.parent = parent
+        task.path = new_path
+        task.save(update_fields=["parent", "path"])
+        new_prefix = subtree_prefix(task)
+        moved = 1
+        last_id = 0
+        while True:
+            ids = list(tasks.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[:batch_size])
+            if not ids:
+                break
+            Task.objects.using(using).filter(id__in=ids).update(
+                path=Concat(Value(new_prefix), Substr("path", len(old_prefix) + 1))
+            )
+            last_id = ids[-1]
+            moved += len(ids)
+    return moved
+
+
+def reattach(Task, ids, using):
+    """
+    Recompute ``parent`` and ``path`` of the tasks ``ids`` after they were
+    copied back from the archive. Their ancestors may have moved since, or
+    still be archived, in which case the task becomes top-level.
+    """
+    tasks = {task.id: task for task in Task.objects.using(using).filter(id__in=ids).only("id", "parent_id", "path")}
+    outside = {task.parent_id for task in tasks.values()} - set(tasks) - {None}
+    paths = dict(Task.objects.using(using).filter(id__in=outside).values_list("id", "path"))
+    changed = []
+
+    def resolve(task):
+        if task.id in paths:
+            return
+        parent_id = task.parent_id
+        if parent_id in tasks:
+            resolve(tasks[parent_id])  # Restored parents first
+        if parent_id in paths and depth(paths[parent_id]) < SUBTASK_MAX_DEPTH:
+            path = f"{paths[parent_id]}{parent_id}/"
+        else:
+            parent_id, path = None, ""
+        paths[task.id] = path
+        if (parent_id, path) != (task.parent_id, task.path):
+            task.parent_id, task.path = parent_id, path
+            changed.append(task)
+
+    for task in tasks.values():
+        resolve(task)
+    Task.objects.using(using).bulk_update(changed, ["parent", "path"], batch_size=MOVE_BATCH_SIZE)
@@ -0,0 +1,88 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from tasks.archive import archive_completed_tasks, restore_tasks
+from tasks.filters import filter_tasks
+from tasks.models import ArchivedTask, Task
+
+
+class Command(BaseCommand):
+    help = "Move completed tasks older than N days into the archive table, or restore them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than", type=int, default=90,
+            help="Archive tasks completed (last updated) more than this many days ago",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--restore", type=int, nargs="+", metavar="ID",
+            help="Move these archived task ids back instead of archiving",
+        )
+        parser.add_argument(
+            "--measure", action="store_true",
+            help="Time author-scoped task queries before and after archiving",
+        )
+
+    def handle(self, *args, **options):
+        if options["restore"]:
+            restored = sum(
+                restore_tasks(ArchivedTask.objects.using(alias).filter(id__in=options["restore"]))
+                for alias in settings.TASK_SHARDS
+            )
+            self.stdout.write(self.style.SUCCESS(f"{restored} tasks restored"))
+            return
+
+        if options["older_than"] < 0:
+            raise CommandError("--older-than must be zero or more days")
+
+        busiest = self._busiest_author() if options["measure"] else None
+        if busiest is not None:
+            before = self._measure(*busiest)
+
+        moved = archive_completed_tasks(
+            options["older_than"], batch_size=options["batch_size"], stdout=self.stdout
+        )
+        self.stdout.write(self.style.SUCCESS(f"\n{moved} tasks archived"))
+
+        if busiest is not None:
+            after = self._measure(*busiest)
+            self.stdout.write(self.style.MIGRATE_HEADING(f"Queries for author {busiest[1]} (best of 5)"))
+            for label in before:
+                self.stdout.write(
+                    f"{label:>28}: {before[label] * 1000:8.2f} ms -> {after[label] * 1000:8.2f} ms"
+                )
+
+    def _busiest_author(self):
+        """``(shard, author_id)`` of the author with the most tasks, or None."""
+        candidates = []
+        for alias in settings.TASK_SHARDS:
+            top = (
+                Task.objects.using(alias)
+                .values("author_id").annotate(n=Count("id")).order_by("-n").first()
+            )
+            if top is not None:
+                candidates.append((top["n"], alias, top["author_id"]))
+        return max(candidates)[1:] if candidates else None
+
+    def _measure(self, alias, author_id, repeat=5):
+        tasks = Task.objects.using(alias).filter(author_id=author_id)
+        queries = {
+            "count": lambda: tasks.count(),
+            "task/list": lambda: list(filter_tasks(tasks, {})[:50]),
+            "task/list?ordering=-priority": lambda: list(filter_tasks(tasks, {"ordering": "-priority"})[:50]),
+            "task/list?status=pending": lambda: list(filter_tasks(tasks, {"status": "pending"})),
+        }
+        timings = {}
+        for label, query in queries.items():
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                query()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            timings[label] = best
+        return timings
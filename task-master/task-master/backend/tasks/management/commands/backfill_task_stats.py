@@ -0,0 +1,70 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from tasks.analytics import merge_counts
+from tasks.models import ArchivedTask, Task, TaskDailyStat
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily task counts behind /analytics/tasks from the tasks and archive tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Tasks read per batch")
+        parser.add_argument("--user-id", type=int, help="Only rebuild this user's counts")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        scanned = 0
+        for alias in settings.TASK_SHARDS:
+            stats = TaskDailyStat.objects.using(alias)
+            if options["user_id"] is not None:
+                stats = stats.filter(author_id=options["user_id"])
+            self._delete(stats, options["batch_size"])
+            for model in (Task, ArchivedTask):
+                tasks = model.objects.using(alias)
+                if options["user_id"] is not None:
+                    tasks = tasks.filter(author_id=options["user_id"])
+                # Walks the primary key, one read and one merge per batch
+                last_id = 0
+                while True:
+                    batch = list(
+                        tasks.filter(id__gt=last_id).order_by("id")
+                        .values_list("id", "author_id", "category_id", "status", "created_at", "updated_at")
+                        [: options["batch_size"]]
+                    )
+                    if not batch:
+                        break
+                    merge_counts(alias, self._counts(batch))
+                    last_id = batch[-1][0]
+                    scanned += len(batch)
+                    self.stdout.write(f"{scanned} tasks counted", ending="\r")
+
+        self.stdout.write(self.style.SUCCESS(f"\nRebuilt the daily counts of {scanned} tasks"))
+
+    def _delete(self, stats, batch_size):
+        while True:
+            ids = list(stats.values_list("id", flat=True)[:batch_size])
+            if not ids:
+                return
+            TaskDailyStat.objects.using(stats.db).filter(id__in=ids).delete()
+
+    def _counts(self, batch):
+        # Only the current status is known: a task is counted as created
+        # pending, and as moved to its status on its last update
+        counts = defaultdict(lambda: dict.fromkeys(("created", "entered", "exited"), 0))
+        for _, author_id, category_id, status, created_at, updated_at in batch:
+            created, updated = timezone.localdate(created_at), timezone.localdate(updated_at)
+            if status == "pending" or created == updated:
+                counts[author_id, category_id, created, status]["created"] += 1
+                counts[author_id, category_id, created, status]["entered"] += 1
+                continue
+            counts[author_id, category_id, created, "pending"]["created"] += 1
+            counts[author_id, category_id, created, "pending"]["entered"] += 1
+            counts[author_id, category_id, updated, "pending"]["exited"] += 1
+            counts[author_id, category_id, updated, status]["entered"] += 1
+        return counts
@@ -0,0 +1,71 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from tasks.models import Category, Task, User
+
+
+class Command(BaseCommand):
+    help = "Render admin changelist pages and report the queries and time each one takes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--email", help="Superuser to render as (defaults to the first one)")
+        parser.add_argument("--max-queries", type=int, default=10)
+        parser.add_argument("--max-ms", type=float, default=500)
+
+    def handle(self, *args, **options):
+        admin.autodiscover()  # Normally done by the first admin request
+        user = self._get_superuser(options["email"])
+        task = (
+            Task.objects.using(settings.ADMIN_TASK_SHARD).only("id", "title").order_by("-id").first()
+        )
+        pages = [
+            (Task, {}),
+            (Task, {"p": "500"}),
+            (Task, {"status": "pending"}),
+            (Task, {"status": "completed", "priority": "high"}),
+            (Task, {"q": task.title[:4] if task else "Task"}),
+            (Category, {}),
+            (User, {}),
+        ]
+
+        over_budget = 0
+        for model, params in pages:
+            request = RequestFactory().get("/admin/", params)
+            request.user = user
+            model_admin = admin.site._registry[model]
+            with ExitStack() as stack:
+                captured = [
+                    stack.enter_context(CaptureQueriesContext(connections[alias]))
+                    for alias in {"default", settings.ADMIN_TASK_SHARD}
+                ]
+                start = time.perf_counter()
+                response = model_admin.changelist_view(request)
+                if hasattr(response, "render"):
+                    response.render()  # Not a redirect, e.g. for a page past the end
+                elapsed = (time.perf_counter() - start) * 1000
+            queries = [query for capture in captured for query in capture]
+
+            ok = len(queries) <= options["max_queries"] and elapsed <= options["max_ms"]
+            over_budget += not ok
+            label = f"{model._meta.model_name} {params or ''}"
+            style = self.style.SUCCESS if ok else self.style.ERROR
+            self.stdout.write(style(f"{label:<50} {len(queries):>3} queries {elapsed:9.1f} ms"))
+
+        if over_budget:
+            raise CommandError(f"{over_budget} page(s) over budget")
+
+    def _get_superuser(self, email):
+        users = User.objects.filter(is_superuser=True)
+        if email:
+            users = users.filter(email=email)
+        user = users.first()
+        if user is None:
+            raise CommandError("No superuser found; create one with createsuperuser")
+        return user
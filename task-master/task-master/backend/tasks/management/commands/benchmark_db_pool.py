@@ -0,0 +1,63 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connections
+
+from task_manager.db.pool import get_pool
+
+DEFAULT_POOL = {"max_size": 10, "max_overflow": 5, "timeout": 30, "max_idle": 300}
+
+
+class Command(BaseCommand):
+    help = "Compare requests/sec against the database with and without connection pooling"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument("--threads", type=int, default=4)
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        alias = options["database"]
+        settings_dict = connections[alias].settings_dict
+        original_pool = settings_dict.get("POOL")
+        original_max_age = settings_dict["CONN_MAX_AGE"]
+        # Django closes (or, when pooled, checks in) the connection at the end of
+        # every request only when CONN_MAX_AGE is 0.
+        settings_dict["CONN_MAX_AGE"] = 0
+
+        try:
+            for label, pool in (("no pooling", None), ("pooled", original_pool or DEFAULT_POOL)):
+                settings_dict["POOL"] = pool
+                elapsed = self._run(alias, options["requests"], options["threads"])
+                self.stdout.write(
+                    f"{label:>10}: {options['requests']} requests in {elapsed:.3f}s "
+                    f"({options['requests'] / elapsed:.1f} req/s)"
+                )
+                if pool:
+                    stats = get_pool(alias, None).stats()
+                    self.stdout.write(
+                        f"{'':>10}  created={stats['created']} checkouts={stats['checkouts']} "
+                        f"waits={stats['waits']} wait_time_total={stats['wait_time_total']}s"
+                    )
+        finally:
+            settings_dict["POOL"] = original_pool
+            settings_dict["CONN_MAX_AGE"] = original_max_age
+
+    def _run(self, alias, total, threads):
+        def simulate_request(_):
+            # Same lifecycle as a real request: Django opens the connection
+            # lazily and releases it from the request_finished handler.
+            request_started.send(sender=self.__class__)
+            try:
+                with connections[alias].cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                    cursor.fetchone()
+            finally:
+                request_finished.send(sender=self.__class__)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(simulate_request, range(total)))
+        return time.perf_counter() - start
@@ -0,0 +1,47 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from tasks.renderers import ColumnarJSONRenderer
+
+
+class Command(BaseCommand):
+    help = "Compare payload size and encode time of the default JSON and columnar renderers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=5000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows = self._task_rows(options["rows"])
+
+        for label, renderer in (("json", JSONRenderer()), ("columnar", ColumnarJSONRenderer())):
+            timings = []
+            for _ in range(options["repeat"]):
+                start = time.perf_counter()
+                body = renderer.render(rows)
+                timings.append(time.perf_counter() - start)
+            self.stdout.write(
+                f"{label:>8}: {len(body):>10} bytes  {min(timings) * 1000:8.2f} ms (best of {options['repeat']})"
+            )
+
+    def _task_rows(self, count):
+        # Shaped like TaskSerializer(many=True).data for one user
+        rng = random.Random(42)
+        today = date.today()
+        return [
+            {
+                "id": i,
+                "title": f"Task {i}",
+                "description": rng.choice(["", "Follow up with the team", "Review and merge"]),
+                "due_date": (today + timedelta(days=rng.randint(-30, 60))).isoformat(),
+                "priority": rng.choice(["low", "medium", "high"]),
+                "status": rng.choice(["pending", "inprogress", "completed"]),
+                "category": rng.randint(1, 8),
+                "author": 1,
+            }
+            for i in range(1, count + 1)
+        ]
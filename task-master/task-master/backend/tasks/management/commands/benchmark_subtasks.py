@@ -0,0 +1,108 @@
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+from tasks.hierarchy import SUBTASK_MAX_DEPTH, descendants, move_subtree, subtree_progress
+from tasks.models import PRIORITY_RANKS, Category, Task, User
+from tasks.ranking import rank_at
+from tasks.sharding import reserve_ids, shard_for_user, sharding_enabled
+
+BENCHMARK_EMAIL = "benchmark-subtasks@example.com"
+STATUSES = ["pending", "inprogress", "completed"]
+
+
+class Command(BaseCommand):
+    help = "Time subtree reads, progress counts and subtree moves on deep and wide task trees"
+
+    def add_arguments(self, parser):
+        # The deep tree leaves one level free so its subtrees can be moved down
+        parser.add_argument("--deep-fanout", type=int, default=2, help="Children per task in the deep tree")
+        parser.add_argument("--wide-fanout", type=int, default=100, help="Children per task in the wide tree")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows per UPDATE when moving")
+
+    def handle(self, *args, **options):
+        User.objects.filter(email=BENCHMARK_EMAIL).delete()  # Leftovers of an interrupted run
+        user = User.objects.create(email=BENCHMARK_EMAIL, password=make_password(None))
+        try:
+            shapes = (
+                ("deep", SUBTASK_MAX_DEPTH - 1, options["deep_fanout"]),
+                ("wide", 2, options["wide_fanout"]),
+            )
+            for name, depth, fanout in shapes:
+                root = self._build_tree(user, name, depth, fanout)
+                size = descendants(root).count()
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    f"{name}: {depth} levels, {fanout} children per task, {size} subtasks"
+                ))
+                self._report("subtree (path range)", options["repeat"], root, lambda: list(descendants(root)))
+                self._report("subtree (level walk)", options["repeat"], root, lambda: self._walk(root))
+                self._report("progress", options["repeat"], root, lambda: subtree_progress(root))
+                first, second = root.subtasks.order_by("id")[:2]
+                moved = descendants(first).count() + 1
+
+                def move():
+                    move_subtree(first, second, batch_size=options["batch_size"])
+                    move_subtree(first, root, batch_size=options["batch_size"])
+
+                self._report(f"move {moved} tasks there and back", options["repeat"], root, move)
+        finally:
+            user.delete()  # tasks.signals removes the rows from the user's shard
+
+    def _report(self, label, repeat, root, operation):
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connections[root._state.db]) as queries:
+                start = time.perf_counter()
+                operation()
+                timings.append(time.perf_counter() - start)
+        self.stdout.write(
+            f"  {label:<34} {min(timings) * 1000:9.2f} ms  {len(queries):>5} queries (best of {repeat})"
+        )
+
+    def _walk(self, root):
+        # What the path replaces: one query per level of the tree
+        found, frontier = [], [root.pk]
+        while frontier:
+            level = list(Task.objects.using(root._state.db).filter(parent_id__in=frontier))
+            found += level
+            frontier = [task.pk for task in level]
+        return found
+
+    def _build_tree(self, user, name, depth, fanout):
+        shard = shard_for_user(user)
+        category = Category.objects.create(name=f"benchmark-subtasks-{name}-{user.pk}", author=user)
+        root = Task.objects.create(title=f"{name} root", priority="low", category=category, author=user)
+        position = 1
+        level = [root]
+        for _ in range(depth):
+            children = []
+            for parent in level:
+                for _ in range(fanout):
+                    children.append(Task(
+                        title=f"{name} subtask",
+                        priority="low",
+                        priority_rank=PRIORITY_RANKS["low"],
+                        # bulk_create skips save(), so set the rank and path here
+                        rank=rank_at(position),
+                        parent_id=parent.pk,
+                        path=f"{parent.path}{parent.pk}/",
+                        status=STATUSES[position % len(STATUSES)],
+                        category=category,
+                        author=user,
+                    ))
+                    position += 1
+            if sharding_enabled():
+                for task, pk in zip(children, reserve_ids(Task, len(children))):
+                    task.pk = pk
+            Task.objects.using(shard).bulk_create(children, batch_size=5000)
+            # bulk_create only returns primary keys on some backends
+            level = list(
+                Task.objects.using(shard)
+                .filter(category=category, path__in={task.path for task in children})
+                .only("id", "path")
+            )
+        return Task.objects.using(shard).get(pk=root.pk)
@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.utils import timezone
+
+from tasks.filters import filter_tasks
+from tasks.models import Task, User
+
+
+class Command(BaseCommand):
+    help = "Print the query plan of task/list for common filter and sort combinations"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--email", help="User to plan for (defaults to the user with most tasks)")
+        parser.add_argument("--limit", type=int, default=50)
+
+    def handle(self, *args, **options):
+        user = self._get_user(options["email"])
+        today = timezone.now().date()
+        category_id = (
+            Task.objects.for_user(user).values_list("category_id", flat=True).first()
+        )
+        scenarios = [
+            {},
+            {"status": "pending,inprogress"},
+            {"priority": "high", "ordering": "-due_date"},
+            {"ordering": "-priority"},
+            {"ordering": "-created_at"},
+            {"due_after": today.isoformat(), "due_before": (today + timedelta(days=7)).isoformat()},
+            {"category": str(category_id), "status": "pending"},
+        ]
+
+        for params in scenarios:
+            queryset = filter_tasks(Task.objects.for_user(user), params)
+            self.stdout.write(self.style.MIGRATE_HEADING(f"task/list?{_query_string(params)}"))
+            self.stdout.write(queryset[: options["limit"]].explain())
+            self.stdout.write("")
+
+    def _get_user(self, email):
+        if email:
+            try:
+                return User.objects.get(email=email)
+            except User.DoesNotExist:
+                raise CommandError(f"No user with email {email}")
+        candidates = []
+        for alias in settings.TASK_SHARDS:
+            busiest = (
+                Task.objects.using(alias)
+                .values("author_id")
+                .annotate(n=Count("id"))
+                .order_by("-n")
+                .first()
+            )
+            if busiest is not None:
+                candidates.append((busiest["n"], busiest["author_id"]))
+        if not candidates:
+            raise CommandError("There are no tasks; run seed_tasks first")
+        return User.objects.get(id=max(candidates)[1])
+
+
+def _query_string(params):
+    return "&".join(f"{key}={value}" for key, value in params.items()) or "(defaults)"
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from task_manager.schema import artifact_path, generate_schema, write_artifact
+
+
+class Command(BaseCommand):
+    help = "Generate the OpenAPI schema artifact served by api/schema/ for the current code"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Regenerate even if an artifact for the current code already exists",
+        )
+        parser.add_argument(
+            "--prune",
+            action="store_true",
+            help="Delete artifacts generated for previous versions of the code",
+        )
+
+    def handle(self, *args, **options):
+        path = artifact_path()
+        if path.exists() and not options["force"]:
+            self.stdout.write(f"Schema is up to date: {path}")
+        else:
+            path = write_artifact(generate_schema())
+            self.stdout.write(self.style.SUCCESS(f"Wrote {path}"))
+
+        if options["prune"]:
+            for stale in path.parent.glob("openapi-*.json"):
+                if stale != path:
+                    stale.unlink()
+                    self.stdout.write(f"Removed {stale}")
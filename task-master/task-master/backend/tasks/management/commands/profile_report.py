@@ -0,0 +1,65 @@
+import io
+import json
+import pstats
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Aggregate the request profiles written by ProfilingMiddleware"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dir", default=settings.PROFILING_DIR)
+        parser.add_argument("--route", help="Only include dumps whose name contains this text, e.g. task_list")
+        parser.add_argument("--sort", default="cumulative", choices=["cumulative", "tottime", "ncalls"])
+        parser.add_argument("--limit", type=int, default=25)
+
+    def handle(self, *args, **options):
+        directory = Path(options["dir"])
+        if not directory.is_dir():
+            raise CommandError(f"{directory} does not exist; no requests have been profiled yet")
+
+        def selected(pattern):
+            paths = sorted(directory.glob(pattern))
+            if options["route"]:
+                paths = [path for path in paths if options["route"] in path.name]
+            return paths
+
+        profiles = selected("*.prof")
+        memory_dumps = selected("*.mem.json")
+        if not profiles and not memory_dumps:
+            raise CommandError("No matching dumps found")
+
+        if profiles:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"CPU: {len(profiles)} profiles"))
+            output = io.StringIO()  # pstats prints piecemeal, which OutputWrapper splits into lines
+            stats = pstats.Stats(str(profiles[0]), stream=output)
+            for path in profiles[1:]:
+                stats.add(str(path))
+            stats.strip_dirs().sort_stats(options["sort"]).print_stats(options["limit"])
+            self.stdout.write(output.getvalue())
+
+        if memory_dumps:
+            self._memory_report(memory_dumps, options["limit"])
+
+    def _memory_report(self, paths, limit):
+        sizes = defaultdict(int)
+        counts = defaultdict(int)
+        peaks = []
+        for path in paths:
+            dump = json.loads(path.read_text())
+            peaks.append(dump["peak"])
+            for allocation in dump["allocations"]:
+                sizes[allocation["location"]] += allocation["size"]
+                counts[allocation["location"]] += allocation["count"]
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Memory: {len(paths)} snapshots"))
+        self.stdout.write(
+            f"Peak traced memory: max {max(peaks) // 1024} KiB, mean {sum(peaks) // len(peaks) // 1024} KiB"
+        )
+        self.stdout.write("Allocations still held at the end of the request, summed over all snapshots:")
+        for location, size in sorted(sizes.items(), key=lambda item: item[1], reverse=True)[:limit]:
+            self.stdout.write(f"{size // 1024:>10} KiB {counts[location]:>8} blocks  {location}")
@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from tasks.models import ActivityEntry
+
+
+class Command(BaseCommand):
+    help = "Delete activity log entries older than the retention period"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than", type=int, default=settings.ACTIVITY_RETENTION_DAYS,
+            help="Age in days (defaults to ACTIVITY_RETENTION_DAYS)",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per DELETE")
+
+    def handle(self, *args, **options):
+        if options["older_than"] < 1:
+            raise CommandError("--older-than must be at least 1 day")
+        cutoff = timezone.now() - timedelta(days=options["older_than"])
+
+        deleted = 0
+        for alias in settings.TASK_SHARDS:
+            # Short transactions over the created_at index, so writers are not held up
+            old = ActivityEntry.objects.using(alias).filter(created_at__lt=cutoff)
+            while True:
+                ids = list(old.values_list("id", flat=True)[: options["batch_size"]])
+                if not ids:
+                    break
+                with transaction.atomic(using=alias):
+                    deleted += ActivityEntry.objects.using(alias).filter(id__in=ids).delete()[0]
+                self.stdout.write(f"{deleted} entries deleted", ending="\r")
+
+        self.stdout.write(self.style.SUCCESS(f"\nDeleted {deleted} activity entries older than {cutoff:%Y-%m-%d}"))
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import Length
+
+from tasks.models import Task
+from tasks.ranking import RANK_REBALANCE_LENGTH, rebalance_category
+
+
+class Command(BaseCommand):
+    help = "Rewrite the manual-order keys of categories whose keys have grown long"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-length", type=int, default=RANK_REBALANCE_LENGTH,
+            help="Rebalance categories with a task key longer than this",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows per UPDATE")
+        parser.add_argument("--category", type=int, nargs="+", metavar="ID", help="Rebalance these categories")
+
+    def handle(self, *args, **options):
+        if options["max_length"] < 1:
+            raise CommandError("--max-length must be at least 1")
+
+        categories = updated = 0
+        for alias in settings.TASK_SHARDS:
+            if options["category"]:
+                category_ids = options["category"]
+            else:
+                # A scan of the rank index; this job runs rarely
+                category_ids = (
+                    Task.objects.using(alias)
+                    .annotate(rank_length=Length("rank"))
+                    .filter(rank_length__gt=options["max_length"])
+                    .values_list("category_id", flat=True)
+                    .distinct()
+                )
+            for category_id in category_ids:
+                # One short transaction per category
+                updated += rebalance_category(Task, category_id, alias, batch_size=options["batch_size"])
+                categories += 1
+                self.stdout.write(f"{categories} categories rebalanced", ending="\r")
+
+        self.stdout.write(self.style.SUCCESS(f"\n{categories} categories rebalanced, {updated} tasks updated"))
@@ -0,0 +1,100 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from tasks.models import (
+    ActivityEntry, ArchivedTask, ArchivedTaskTag, Category, RecurrenceRule, Tag, Task, TaskDailyStat, TaskTag,
+    User,
+)
+from tasks.sharding import shard_for_user
+
+# Parents first, so the foreign keys hold on the destination
+MOVED_MODELS = (
+    Category, Tag, RecurrenceRule, Task, ArchivedTask, TaskTag, ArchivedTaskTag, ActivityEntry, TaskDailyStat,
+)
+
+
+class Command(BaseCommand):
+    help = "Move one user's categories and tasks to another shard"
+
+    def add_arguments(self, parser):
+        user = parser.add_mutually_exclusive_group(required=True)
+        user.add_argument("--email")
+        user.add_argument("--user-id", type=int)
+        parser.add_argument("--to", required=True, help="Destination shard alias, e.g. shard1")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--grace", type=float, default=5,
+            help="Seconds to wait after blocking writes, for requests already past the check",
+        )
+
+    def handle(self, *args, **options):
+        destination = options["to"]
+        if destination not in settings.TASK_SHARDS:
+            raise CommandError(f"{destination} is not one of {', '.join(settings.TASK_SHARDS)}")
+        lookup = {"email": options["email"]} if options["email"] else {"pk": options["user_id"]}
+        try:
+            user = User.objects.get(**lookup)
+        except User.DoesNotExist:
+            raise CommandError("User not found")
+
+        source = shard_for_user(user)
+        if source == destination:
+            self.stdout.write(f"{user.email} is already on {destination}")
+            return
+
+        # Writes now fail with 503 until the move is over; reads keep using the source
+        User.objects.filter(pk=user.pk).update(task_shard_moving=True)
+        try:
+            time.sleep(options["grace"])
+            # Leftovers of an interrupted move
+            for model in reversed(MOVED_MODELS):
+                model.objects.using(destination).filter(author=user).delete()
+            for model in MOVED_MODELS:
+                copied = self._copy(model, user, source, destination, options["batch_size"])
+                self.stdout.write(f"{model._meta.db_table}: {copied} rows copied")
+            User.objects.filter(pk=user.pk).update(task_shard=destination, task_shard_moving=False)
+        except BaseException:
+            User.objects.filter(pk=user.pk).update(task_shard_moving=False)
+            raise
+
+        for model in reversed(MOVED_MODELS):
+            self._delete(model, user, source, options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Moved {user.email} from {source} to {destination}"))
+
+    def _copy(self, model, user, source, destination, batch_size):
+        # Raw inserts keep ids and the auto_now timestamps as they are
+        fields = model._meta.concrete_fields
+        connection = connections[destination]
+        quote = connection.ops.quote_name
+        sql = "INSERT INTO {} ({}) VALUES ({})".format(
+            quote(model._meta.db_table),
+            ", ".join(quote(field.column) for field in fields),
+            ", ".join(["%s"] * len(fields)),
+        )
+        rows = model.objects.using(source).filter(author=user).order_by("pk")
+        attnames = [field.attname for field in fields]
+        copied = last_id = 0
+        while True:
+            batch = list(rows.filter(pk__gt=last_id).values_list(*attnames)[:batch_size])
+            if not batch:
+                return copied
+            params = [
+                [field.get_db_prep_save(value, connection) for field, value in zip(fields, row)]
+                for row in batch
+            ]
+            with transaction.atomic(using=destination), connection.cursor() as cursor:
+                cursor.executemany(sql, params)
+            last_id = batch[-1][0]
+            copied += len(batch)
+
+    def _delete(self, model, user, source, batch_size):
+        rows = model.objects.using(source).filter(author=user)
+        while True:
+            ids = list(rows.values_list("pk", flat=True)[:batch_size])
+            if not ids:
+                return
+            with transaction.atomic(using=source):
+                model.objects.using(source).filter(pk__in=ids).delete()
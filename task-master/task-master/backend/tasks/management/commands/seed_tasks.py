@@ -0,0 +1,105 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from tasks.models import PRIORITY_RANKS, Category, Task, User
+from tasks.ranking import rank_at
+from tasks.sharding import reserve_ids, shard_for_user, sharding_enabled
+
+
+class Command(BaseCommand):
+    help = "Bulk-create users, categories and tasks for load tests and query plan checks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--categories", type=int, default=5, help="Categories per user")
+        parser.add_argument("--tasks", type=int, default=100000, help="Total tasks")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--prefix", default="seed")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        prefix = options["prefix"]
+        batch_size = options["batch_size"]
+
+        unusable_password = make_password(None)
+        users = User.objects.bulk_create(
+            [
+                User(email=f"{prefix}-{i}@example.com", password=unusable_password)
+                for i in range(options["users"])
+            ],
+            batch_size=batch_size,
+        )
+        # bulk_create only returns primary keys on some backends
+        users = list(User.objects.filter(email__startswith=f"{prefix}-").order_by("id"))
+
+        shards = {}
+        for user in users:
+            shards.setdefault(shard_for_user(user), []).append(user)
+
+        categories = {}
+        for shard, shard_users in shards.items():
+            new_categories = [
+                Category(name=f"{prefix}-{user.id}-{k}", author=user)
+                for user in shard_users
+                for k in range(options["categories"])
+            ]
+            self._assign_ids(Category, new_categories)
+            Category.objects.using(shard).bulk_create(new_categories, batch_size=batch_size)
+            for category_id, author_id in Category.objects.using(shard).filter(
+                author__in=shard_users
+            ).values_list("id", "author_id"):
+                categories.setdefault(author_id, []).append(category_id)
+
+        today = timezone.now().date()
+        priorities = list(PRIORITY_RANKS)
+        statuses = ["pending", "inprogress", "completed"]
+        created = 0
+        positions = {}  # Tasks seeded so far per category
+        while created < options["tasks"]:
+            batch = []
+            for i in range(created, min(created + batch_size, options["tasks"])):
+                user = rng.choice(users)
+                priority = rng.choice(priorities)
+                category_id = rng.choice(categories[user.id])
+                positions[category_id] = positions.get(category_id, -1) + 1
+                batch.append(
+                    Task(
+                        title=f"Task {i}",
+                        description="Seeded task",
+                        due_date=None if rng.random() < 0.1 else today + timedelta(days=rng.randint(-180, 180)),
+                        priority=priority,
+                        # bulk_create skips save(), so set the sort keys here
+                        priority_rank=PRIORITY_RANKS[priority],
+                        rank=rank_at(positions[category_id]),
+                        status=rng.choice(statuses),
+                        category_id=category_id,
+                        author=user,
+                    )
+                )
+            self._assign_ids(Task, batch)
+            by_shard = {}
+            for task in batch:
+                by_shard.setdefault(shard_for_user(task.author), []).append(task)
+            for shard, tasks in by_shard.items():
+                with transaction.atomic(using=shard):
+                    Task.objects.using(shard).bulk_create(tasks)
+            created += len(batch)
+            self.stdout.write(f"{created}/{options['tasks']} tasks", ending="\r")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\nSeeded {len(users)} users, {sum(map(len, categories.values()))} categories, {created} tasks"
+            )
+        )
+
+    def _assign_ids(self, model, objs):
+        # bulk_create skips the pre_save signal that hands out ids across shards
+        if sharding_enabled():
+            for obj, pk in zip(objs, reserve_ids(model, len(objs))):
+                obj.pk = pk
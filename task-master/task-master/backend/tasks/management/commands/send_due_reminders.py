@@ -0,0 +1,34 @@
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tasks.reminders import queue_due_reminders
+
+
+class Command(BaseCommand):
+    help = "Queue one digest email per user for open tasks due within the next N days"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=1, help="Window length, today included")
+        parser.add_argument("--date", type=date.fromisoformat, help="Window start (defaults to today)")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        start = options["date"] or timezone.now().date()
+        end = start + timedelta(days=options["days"] - 1)
+
+        scanned = queued = 0
+        for alias in settings.TASK_SHARDS:
+            run, shard_scanned = queue_due_reminders(
+                start, end, batch_size=options["batch_size"], stdout=self.stdout, using=alias
+            )
+            scanned += shard_scanned
+            queued += run.outboundemail_set.count()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\nWindow {start}..{end}: scanned {scanned} tasks, {queued} digests queued"
+            )
+        )
+        self.stdout.write("Run send_queued_emails to deliver them.")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from tasks.reminders import send_queued_emails
+
+
+class Command(BaseCommand):
+    help = "Send emails queued in the outbound_emails table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=500)
+        parser.add_argument("--batch-size", type=int, default=50)
+
+    def handle(self, *args, **options):
+        sent, failed = send_queued_emails(limit=options["limit"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} emails, {failed} failed"))
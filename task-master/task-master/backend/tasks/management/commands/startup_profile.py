@@ -0,0 +1,174 @@
+import json
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Boots Django in a fresh interpreter the way a WSGI worker does, serves one
+# request and prints the time of each phase as JSON. Phase markers go to
+# stderr so that -X importtime lines can be attributed to a phase.
+PROBE = r"""
+import json, sys, time
+from wsgiref.util import setup_testing_defaults
+
+timings = {"phases": [], "apps": {}}
+start = last = time.perf_counter()
+
+def phase(name):
+    global last
+    now = time.perf_counter()
+    timings["phases"].append([name, now - last])
+    last = now
+    sys.stderr.write(f"startup_profile phase: {name}\n")
+    sys.stderr.flush()
+
+def timed(app_label, step, method):
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            times = timings["apps"].setdefault(app_label, {})
+            times[step] = time.perf_counter() - started
+    return wrapper
+
+from django.conf import settings
+settings.INSTALLED_APPS
+phase("settings")
+
+import django
+from django.apps.config import AppConfig
+create = AppConfig.create.__func__
+
+def create_timed(cls, entry):
+    started = time.perf_counter()
+    config = create(cls, entry)
+    timings["apps"][config.label] = {"import": time.perf_counter() - started}
+    config.import_models = timed(config.label, "models", config.import_models)
+    config.ready = timed(config.label, "ready", config.ready)
+    return config
+
+AppConfig.create = classmethod(create_timed)
+django.setup(set_prefix=False)
+phase("apps")
+
+from django.core.handlers.wsgi import WSGIHandler
+application = WSGIHandler()
+phase("middleware")
+
+from django.urls import get_resolver
+get_resolver().url_patterns
+phase("urlconf")
+
+def request():
+    environ = {"PATH_INFO": sys.argv[1], "HTTP_HOST": sys.argv[2]}
+    setup_testing_defaults(environ)
+    status = []
+    body = application(environ, lambda code, headers, exc_info=None: status.append(code))
+    b"".join(body)
+    body.close()
+    return status[0]
+
+timings["status"] = request()
+phase("first request")
+timings["modules"] = len(sys.modules)
+request()
+phase("second request")
+timings["total"] = time.perf_counter() - start
+print(json.dumps(timings))
+"""
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+PHASE_LINE = re.compile(r"startup_profile phase: (.+)")
+
+
+class Command(BaseCommand):
+    help = "Measure process startup: time per boot phase, per app and per imported module"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="/task/list", help="Path of the first request")
+        parser.add_argument("--host", help="Host header (defaults to the first ALLOWED_HOSTS entry)")
+        parser.add_argument("--runs", type=int, default=5, help="Timed boots; the fastest is reported")
+        parser.add_argument("--limit", type=int, default=15)
+
+    def handle(self, *args, **options):
+        host = options["host"] or next(
+            (host.lstrip(".") for host in settings.ALLOWED_HOSTS if host != "*"), "localhost"
+        )
+        # Timings come from boots without -X importtime, which slows imports down
+        runs = [self._boot(options["path"], host)[0] for _ in range(max(1, options["runs"]))]
+        timings = min(runs, key=lambda run: run["total"])
+        _, imports = self._boot(options["path"], host, importtime=True)
+
+        heading = self.style.MIGRATE_HEADING
+        self.stdout.write(heading(f"Boot phases, fastest of {len(runs)} (first request status {timings['status']})"))
+        self.stdout.write(f"{'phase':<16} {'time':>10} {'imports':>10}")
+        elapsed = 0
+        for name, seconds in timings["phases"]:
+            self.stdout.write(f"{name:<16} {seconds * 1000:8.1f} ms {imports['phases'].get(name, 0) / 1000:7.1f} ms")
+            if name == "first request":
+                elapsed = sum(seconds for _, seconds in timings["phases"][:-1])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Time to first request: {elapsed * 1000:.1f} ms, {timings['modules']} modules loaded"
+            )
+        )
+        self.stdout.write("(imports are measured in a separate boot with -X importtime, which inflates them)")
+
+        self.stdout.write(heading("\nApps (import / models / ready)"))
+        apps = sorted(timings["apps"].items(), key=lambda item: sum(item[1].values()), reverse=True)
+        for label, times in apps[: options["limit"]]:
+            parts = " ".join(f"{times.get(step, 0) * 1000:7.1f}" for step in ("import", "models", "ready"))
+            self.stdout.write(f"{label:<28} {parts} ms")
+
+        self.stdout.write(heading("\nPackages by own import time"))
+        for package, micros in imports["packages"][: options["limit"]]:
+            self.stdout.write(f"{package:<40} {micros / 1000:7.1f} ms")
+
+        self.stdout.write(heading("\nSlowest imports (cumulative, first imported by phase)"))
+        for micros, module, phase in imports["modules"][: options["limit"]]:
+            self.stdout.write(f"{module:<56} {micros / 1000:7.1f} ms  {phase}")
+
+    def _boot(self, path, host, importtime=False):
+        command = [sys.executable]
+        if importtime:
+            command += ["-X", "importtime"]
+        result = subprocess.run(
+            [*command, "-c", PROBE, path, host],
+            cwd=settings.BASE_DIR,  # Inherits DJANGO_SETTINGS_MODULE from manage.py
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f"The startup probe failed:\n{result.stderr[-2000:]}")
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+        return timings, self._parse_importtime(result.stderr) if importtime else None
+
+    def _parse_importtime(self, output):
+        # Lines are written when an import finishes, so a phase's imports come before its marker
+        phases = defaultdict(int)
+        packages = defaultdict(int)
+        modules = []
+        pending = []
+        for line in output.splitlines():
+            marker = PHASE_LINE.match(line)
+            if marker:
+                for cumulative, depth, module in pending:
+                    if depth == 0:
+                        phases[marker.group(1)] += cumulative
+                    modules.append((cumulative, module, marker.group(1)))
+                pending = []
+                continue
+            match = IMPORTTIME_LINE.match(line)
+            if match:
+                own, cumulative, indent, module = match.groups()
+                packages[module.split(".")[0]] += int(own)
+                pending.append((int(cumulative), (len(indent) - 1) // 2, module))
+        return {
+            "phases": phases,
+            "packages": sorted(packages.items(), key=lambda item: item[1], reverse=True),
+            "modules": sorted(modules, reverse=True),
+        }
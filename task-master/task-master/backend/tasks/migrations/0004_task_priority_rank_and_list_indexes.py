@@ -0,0 +1,46 @@
+# Generated by Django 5.1.3 on 2026-10-19 17:21
+
+from django.db import migrations, models
+
+
+def backfill_priority_rank(apps, schema_editor):
+    Task = apps.get_model("tasks", "Task")
+    db_alias = schema_editor.connection.alias
+    # One UPDATE per priority value rather than a save() per row
+    for priority, rank in (("medium", 1), ("high", 2)):
+        Task.objects.using(db_alias).filter(priority=priority).update(priority_rank=rank)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0003_alter_task_description'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='priority_rank',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        # The hint runs the backfill on every database holding tasks
+        migrations.RunPython(
+            backfill_priority_rank, migrations.RunPython.noop, hints={"model_name": "task"}
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['author', 'due_date'], name='tasks_author_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['author', 'created_at'], name='tasks_author_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['author', 'status', 'due_date'], name='tasks_author_status_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['author', 'priority_rank', 'due_date'], name='tasks_author_prio_due_idx'),
+        ),
+    ]
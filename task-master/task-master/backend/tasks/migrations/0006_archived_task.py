@@ -0,0 +1,36 @@
+# Generated by Django 5.1.3 on 2026-10-19 17:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0005_due_reminders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTask',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=1024)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('due_date', models.DateField(blank=True, null=True)),
+                ('priority', models.CharField(max_length=6)),
+                ('priority_rank', models.PositiveSmallIntegerField(default=0)),
+                ('status', models.CharField(max_length=10)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tasks.category')),
+            ],
+            options={
+                'db_table': 'tasks_archive',
+                'indexes': [models.Index(fields=['author', 'due_date'], name='archive_author_due_idx')],
+            },
+        ),
+    ]
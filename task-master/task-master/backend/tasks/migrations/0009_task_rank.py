@@ -0,0 +1,48 @@
+# Generated by Django 5.1.3 on 2026-10-19 17:53
+
+from django.db import migrations, models
+
+from tasks.ranking import rank_at
+
+
+def backfill_rank(apps, schema_editor):
+    Category = apps.get_model("tasks", "Category")
+    Task = apps.get_model("tasks", "Task")
+    ArchivedTask = apps.get_model("tasks", "ArchivedTask")
+    db_alias = schema_editor.connection.alias
+    # Each category keeps its current (creation) order; archived tasks follow the live ones
+    for category_id in Category.objects.using(db_alias).values_list("id", flat=True).iterator():
+        index = 0
+        for model in (Task, ArchivedTask):
+            ids = model.objects.using(db_alias).filter(category_id=category_id).order_by("id")
+            rows = []
+            for pk in ids.values_list("id", flat=True):
+                rows.append(model(id=pk, rank=rank_at(index)))
+                index += 1
+            model.objects.using(db_alias).bulk_update(rows, ["rank"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0008_sharding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedtask',
+            name='rank',
+            field=models.CharField(default='', max_length=128),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='rank',
+            field=models.CharField(default='', editable=False, max_length=128),
+        ),
+        # The hint runs the backfill on every database holding tasks
+        migrations.RunPython(backfill_rank, migrations.RunPython.noop, hints={"model_name": "task"}),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['category', 'rank'], name='tasks_category_rank_idx'),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.1.3 on 2026-10-19 18:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0010_task_subtasks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('author', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'tags',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedTaskTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('author', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tasks.archivedtask')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tasks.tag')),
+            ],
+            options={
+                'db_table': 'task_tags_archive',
+            },
+        ),
+        migrations.AddField(
+            model_name='archivedtask',
+            name='tags',
+            field=models.ManyToManyField(blank=True, related_name='archived_tasks', through='tasks.ArchivedTaskTag', to='tasks.tag'),
+        ),
+        migrations.CreateModel(
+            name='TaskTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('author', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL)),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tasks.tag')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tasks.task')),
+            ],
+            options={
+                'db_table': 'task_tags',
+            },
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='tags',
+            field=models.ManyToManyField(blank=True, related_name='tasks', through='tasks.TaskTag', to='tasks.tag'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('author', 'name'), name='tags_author_name_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='archivedtasktag',
+            constraint=models.UniqueConstraint(fields=('tag', 'task'), name='archive_tags_tag_task_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='tasktag',
+            constraint=models.UniqueConstraint(fields=('tag', 'task'), name='task_tags_tag_task_uniq'),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.1.3 on 2026-10-19 18:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0012_activity_log'),
+    ]
+
+    operations = [
+        # archivedtask.parent_id becomes a foreign key on the same bigint
+        # column, without constraint or index: nothing changes in the database
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveField(
+                    model_name='archivedtask',
+                    name='parent_id',
+                ),
+                migrations.AddField(
+                    model_name='archivedtask',
+                    name='parent',
+                    field=models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='tasks.task'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='archivedtask',
+            name='occurrence_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='occurrence_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='RecurrenceRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=1024)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('priority', models.CharField(choices=[('low', 'low'), ('medium', 'medium'), ('high', 'high')], max_length=6)),
+                ('frequency', models.CharField(choices=[('daily', 'daily'), ('weekly', 'weekly'), ('monthly', 'monthly')], max_length=7)),
+                ('interval', models.PositiveSmallIntegerField(default=1)),
+                ('start_date', models.DateField()),
+                ('until', models.DateField(blank=True, null=True)),
+                ('count', models.PositiveIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('author', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tasks.category')),
+            ],
+            options={
+                'db_table': 'recurrence_rules',
+            },
+        ),
+        migrations.AddField(
+            model_name='archivedtask',
+            name='recurrence',
+            field=models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='tasks.recurrencerule'),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='recurrence',
+            field=models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tasks', to='tasks.recurrencerule'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtask',
+            index=models.Index(fields=['recurrence', 'occurrence_date'], name='archive_recurrence_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='task',
+            constraint=models.UniqueConstraint(fields=('recurrence', 'occurrence_date'), name='tasks_recurrence_occurrence_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='recurrencerule',
+            index=models.Index(fields=['author', 'start_date'], name='recurrence_author_start_idx'),
+        ),
+    ]
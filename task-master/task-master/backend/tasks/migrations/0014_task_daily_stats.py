@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-19 18:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0013_recurrence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(max_length=10)),
+                ('created', models.PositiveIntegerField(default=0)),
+                ('entered', models.PositiveIntegerField(default=0)),
+                ('exited', models.PositiveIntegerField(default=0)),
+                ('author', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tasks.category')),
+            ],
+            options={
+                'db_table': 'task_daily_stats',
+                'indexes': [models.Index(fields=['author', 'day'], name='task_stats_author_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('author', 'category', 'day', 'status'), name='task_stats_uniq')],
+            },
+        ),
+    ]
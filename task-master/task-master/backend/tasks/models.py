@@ -1,5 +1,12 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
+
+from .concurrency import VersionedModel
+from .hierarchy import child_path
+from .ranking import RANK_MAX_LENGTH, next_rank
+from .sharding import ShardedQuerySet
 
 
 # tasks/models.py
@@ -34,6 +41,11 @@ class User(AbstractUser):
     )
     reset_token = models.CharField(max_length=255, blank=True, null=True)
     reset_token_expiry = models.DateTimeField(null=True)
+    # Secret in the URL of the user's calendar feed (see tasks.feeds)
+    calendar_token = models.CharField(max_length=64, unique=True, blank=True, null=True)
+    # Shard directory entry (see tasks.sharding); empty means the hashed shard
+    task_shard = models.CharField(max_length=32, blank=True, default="")
+    task_shard_moving = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -46,18 +58,47 @@ class User(AbstractUser):
         db_table = "users"
 
 
-class Category(models.Model):
+class Category(VersionedModel):
     name = models.CharField(max_length=255, unique=True)
     description = models.TextField(blank=True, null=True)
-    author = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Users live in the global database, so sharded rows reference them without
+    # a constraint; tasks.signals deletes a user's rows from their shard instead
+    author = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ShardedQuerySet.as_manager()
+
     class Meta:
         db_table = "categories"
 
+    def __str__(self):
+        return self.name
+
+
+class Tag(models.Model):
+    """A label from its author's own namespace; a task can have any number of them."""
+    name = models.CharField(max_length=64)
+    author = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        db_table = "tags"
+        constraints = [
+            models.UniqueConstraint(fields=["author", "name"], name="tags_author_name_uniq"),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+# Sortable encoding of Task.priority, stored in Task.priority_rank
+PRIORITY_RANKS = {"low": 0, "medium": 1, "high": 2}
 
-class Task(models.Model):
+
+class Task(VersionedModel):
     title = models.CharField(max_length=1024)
     description = models.TextField(null=True,blank=True)
     due_date = models.DateField(null=True, blank=True)
@@ -73,10 +114,281 @@ class Task(models.Model):
         ],
         default="pending",
     )
+    # Kept in sync with `priority` by save() so lists can sort by it in SQL
+    priority_rank = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Position within the category set by task/move, a fractional key (see tasks.ranking)
+    rank = models.CharField(max_length=RANK_MAX_LENGTH, default="", editable=False)
+    # Subtasks (see tasks.hierarchy). Rows are copied to the archive and between
+    # shards in id order, which a parent may not precede, hence no constraint
+    parent = models.ForeignKey(
+        "self", null=True, blank=True, on_delete=models.CASCADE, db_constraint=False, related_name="subtasks"
+    )
+    # Ids of the ancestors, root first, each followed by "/"
+    path = models.CharField(max_length=255, default="", editable=False)
+    # Set on tasks created for an occurrence of a recurring task (see tasks.recurrence)
+    recurrence = models.ForeignKey(
+        "RecurrenceRule", null=True, blank=True, on_delete=models.SET_NULL, db_constraint=False,
+        db_index=False, related_name="tasks",  # Indexed by the unique constraint below
+    )
+    occurrence_date = models.DateField(null=True, blank=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
-    author = models.ForeignKey(User, on_delete=models.CASCADE)
+    tags = models.ManyToManyField(Tag, through="TaskTag", related_name="tasks", blank=True)
+    author = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ShardedQuerySet.as_manager()
+
     class Meta:
         db_table = "tasks"
+        indexes = [
+            # Every list is scoped to one author, so author_id leads each index
+            models.Index(fields=["author", "due_date"], name="tasks_author_due_idx"),
+            models.Index(fields=["author", "created_at"], name="tasks_author_created_idx"),
+            models.Index(fields=["author", "status", "due_date"], name="tasks_author_status_due_idx"),
+            models.Index(fields=["author", "priority_rank", "due_date"], name="tasks_author_prio_due_idx"),
+            # Cross-user scan for due date reminders (send_due_reminders)
+            models.Index(fields=["due_date", "status"], name="tasks_due_status_idx"),
+            # Admin changelist filters, which list all users' tasks newest first
+            models.Index(fields=["status"], name="tasks_status_idx"),
+            models.Index(fields=["priority_rank"], name="tasks_priority_rank_idx"),
+            # Tasks of a category in their manual order
+            models.Index(fields=["category", "rank"], name="tasks_category_rank_idx"),
+            # Subtree reads are a range of paths
+            models.Index(fields=["author", "path"], name="tasks_author_path_idx"),
+        ]
+        constraints = [
+            # One task per occurrence, which also indexes the occurrence lookups
+            models.UniqueConstraint(
+                fields=["recurrence", "occurrence_date"], name="tasks_recurrence_occurrence_uniq"
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.priority_rank = PRIORITY_RANKS.get(self.priority, 0)
+        if self._state.adding and not self.rank:
+            self.rank = next_rank(self, kwargs.get("using"))  # New tasks go to the end
+        if self._state.adding and self.parent_id is not None and not self.path:
+            self.path = child_path(self.parent)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "priority" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "priority_rank"}
+        super().save(*args, **kwargs)
+
+
+class RecurrenceRule(models.Model):
+    """
+    A task template repeated on a schedule. Its occurrences are computed when
+    listed (see tasks.recurrence) and only become tasks once acted on.
+    """
+    title = models.CharField(max_length=1024)
+    description = models.TextField(null=True, blank=True)
+    priority = models.CharField(
+        max_length=6, choices=[("low", "low"), ("medium", "medium"), ("high", "high")]
+    )
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    frequency = models.CharField(
+        max_length=7, choices=[("daily", "daily"), ("weekly", "weekly"), ("monthly", "monthly")]
+    )
+    interval = models.PositiveSmallIntegerField(default=1)  # Every `interval` days, weeks or months
+    start_date = models.DateField()  # The first occurrence
+    until = models.DateField(null=True, blank=True)
+    count = models.PositiveIntegerField(null=True, blank=True)  # Occurrences in all
+    author = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        db_table = "recurrence_rules"
+        indexes = [
+            models.Index(fields=["author", "start_date"], name="recurrence_author_start_idx"),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class ArchivedTask(models.Model):
+    """
+    Completed tasks moved out of the hot `tasks` table by archive_tasks.
+    Rows keep their original id, so they can be restored unchanged.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=1024)
+    description = models.TextField(null=True, blank=True)
+    due_date = models.DateField(null=True, blank=True)
+    priority = models.CharField(max_length=6)
+    priority_rank = models.PositiveSmallIntegerField(default=0)
+    rank = models.CharField(max_length=RANK_MAX_LENGTH, default="")
+    # Hierarchy as it was when archived; restore_tasks recomputes it. The
+    # parent and the rule may be gone, so these only keep the ids
+    parent = models.ForeignKey(
+        Task, null=True, blank=True, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+        related_name="+",
+    )
+    path = models.CharField(max_length=255, default="")
+    recurrence = models.ForeignKey(
+        RecurrenceRule, null=True, blank=True, on_delete=models.DO_NOTHING, db_constraint=False,
+        db_index=False, related_name="+",
+    )
+    occurrence_date = models.DateField(null=True, blank=True)
+    version = models.PositiveIntegerField(default=1)  # Carried on when restored
+    status = models.CharField(max_length=10)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    tags = models.ManyToManyField(Tag, through="ArchivedTaskTag", related_name="archived_tasks", blank=True)
+    author = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        db_table = "tasks_archive"
+        indexes = [
+            models.Index(fields=["author", "due_date"], name="archive_author_due_idx"),
+            models.Index(fields=["recurrence", "occurrence_date"], name="archive_recurrence_idx"),
+        ]
+
+
+class TaskTag(models.Model):
+    """
+    A tag on a task. Multi-tag filters read task ids off the (tag, task)
+    index (see tasks.tagging); ``author`` is the task's, for resharding.
+    """
+    task = models.ForeignKey(Task, on_delete=models.CASCADE)
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
+    author = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False)
+
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        db_table = "task_tags"
+        constraints = [
+            models.UniqueConstraint(fields=["tag", "task"], name="task_tags_tag_task_uniq"),
+        ]
+
+
+class ArchivedTaskTag(models.Model):
+    """Tags of archived tasks, moved along with them by archive_tasks."""
+    task = models.ForeignKey(ArchivedTask, on_delete=models.CASCADE)
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
+    author = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False)
+
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        db_table = "task_tags_archive"
+        constraints = [
+            models.UniqueConstraint(fields=["tag", "task"], name="archive_tags_tag_task_uniq"),
+        ]
+
+
+class ActivityEntry(models.Model):
+    """
+    One change to a task or category, with ``changes`` as ``{field: [old,
+    new]}``. Written in batches by tasks.activity and never updated.
+    """
+    object_type = models.CharField(max_length=16)  # Model name: "task" or "category"
+    object_id = models.BigIntegerField()
+    action = models.CharField(
+        max_length=8, choices=[("create", "create"), ("update", "update"), ("delete", "delete")]
+    )
+    changes = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    author = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False)
+    created_at = models.DateTimeField(default=timezone.now)  # Time of the change, not of the write
+
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        db_table = "activity_log"
+        indexes = [
+            # History of one object, newest first
+            models.Index(fields=["author", "object_type", "object_id", "id"], name="activity_object_idx"),
+            # Pruning by age (prune_activity)
+            models.Index(fields=["created_at"], name="activity_created_idx"),
+        ]
+
+
+class TaskDailyStat(models.Model):
+    """
+    Tasks of one author and category that were created in, moved into or
+    moved out of ``status`` on ``day``. Kept up to date by tasks.analytics.
+    """
+    author = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    day = models.DateField()
+    status = models.CharField(max_length=10)
+    created = models.PositiveIntegerField(default=0)
+    entered = models.PositiveIntegerField(default=0)
+    exited = models.PositiveIntegerField(default=0)
+
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        db_table = "task_daily_stats"
+        constraints = [
+            # Also serves the per-category ranges
+            models.UniqueConstraint(fields=["author", "category", "day", "status"], name="task_stats_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["author", "day"], name="task_stats_author_day_idx"),
+        ]
+
+
+class ReminderRun(models.Model):
+    """
+    Checkpoint of one send_due_reminders window. The scan position is saved
+    after every batch, so a rerun resumes where the last one stopped.
+    """
+    run_key = models.CharField(max_length=64, unique=True)
+    last_due_date = models.DateField(null=True, blank=True)
+    last_status = models.CharField(max_length=10, blank=True, default="")
+    last_task_id = models.BigIntegerField(default=0)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "reminder_runs"
+
+
+class OutboundEmail(models.Model):
+    """Email queued for send_queued_emails instead of being sent inline."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=32)
+    # One email per user per run, however many batches touched it
+    dedupe_key = models.CharField(max_length=255, unique=True)
+    run = models.ForeignKey(ReminderRun, null=True, blank=True, on_delete=models.SET_NULL)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=8,
+        choices=[
+            ("building", "building"),  # Run still in progress, not sendable yet
+            ("pending", "pending"),
+            ("sent", "sent"),
+            ("failed", "failed"),
+        ],
+        default="pending",
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "outbound_emails"
+        indexes = [
+            models.Index(fields=["status", "id"], name="outbound_status_idx"),
+        ]
+
+
+class IdBlock(models.Model):
+    """High-water mark of the ids handed out for one sharded model (tasks.sharding.next_id)."""
+    name = models.CharField(max_length=100, primary_key=True)
+    next_id = models.BigIntegerField()
+
+    class Meta:
+        db_table = "id_blocks"
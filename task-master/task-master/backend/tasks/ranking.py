@@ -0,0 +1,182 @@
+"""
+Manual ordering of tasks within a category with fractional keys.
+
+``Task.rank`` is a string that sorts in the task's position, so moving a task
+between two others only gives it a key between theirs: one row is updated
+however long the list is. Keys use the digits 0-9a-z, which sort the same
+way under MySQL's case-insensitive collations as in Python.
+
+A key is an integer part followed by an optional fraction. The first
+character gives the number of integer digits ("a" for one, "b" for two, ...)
+so longer integers sort after shorter ones; appending and prepending step
+the integer, which keeps keys short. Only inserting repeatedly into the same
+gap makes the fraction grow, and ``rebalance_category`` (run by
+``manage.py rebalance_ranks``) rewrites a category's keys when it does.
+"""
+from django.db import router, transaction
+from django.db.models import Q
+
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+# Rebalanced and seeded keys start at "ci00" and are spaced one digit apart,
+# which leaves room for thousands of prepends and for inserts between neighbours
+FIRST_RANK_VALUE = 18 * BASE ** 2
+RANK_STEP = BASE
+RANK_MAX_LENGTH = 128
+# rebalance_ranks rewrites categories with keys longer than this
+RANK_REBALANCE_LENGTH = 24
+
+
+class RankError(ValueError):
+    pass
+
+
+def encode_integer(value):
+    digits = ""
+    while True:
+        value, digit = divmod(value, BASE)
+        digits = DIGITS[digit] + digits
+        if value == 0:
+            break
+    if len(digits) > 26:
+        raise RankError("Rank integer out of range")
+    return chr(ord("a") + len(digits) - 1) + digits
+
+
+def _split(key):
+    length = ord(key[0]) - ord("a") + 1 if key else 0
+    if not 1 <= length <= 26 or len(key) <= length:
+        raise RankError(f"Invalid rank: {key!r}")
+    integer, fraction = key[: length + 1], key[length + 1:]
+    if fraction.endswith("0"):
+        raise RankError(f"Invalid rank: {key!r}")
+    return integer, fraction
+
+
+def _integer_value(integer):
+    value = 0
+    for digit in integer[1:]:
+        value = value * BASE + DIGITS.index(digit)
+    return value
+
+
+def _midpoint(low, high):
+    """Fraction digits strictly between ``low`` and ``high`` (None is the top)."""
+    if high is not None:
+        prefix = 0
+        while prefix < len(high) and (low[prefix] if prefix < len(low) else "0") == high[prefix]:
+            prefix += 1
+        if prefix:
+            return high[:prefix] + _midpoint(low[prefix:], high[prefix:])
+    low_digit = DIGITS.index(low[0]) if low else 0
+    high_digit = DIGITS.index(high[0]) if high is not None else BASE
+    if high_digit - low_digit > 1:
+        return DIGITS[(low_digit + high_digit) // 2]
+    if high is not None and len(high) > 1:
+        return high[0]
+    return DIGITS[low_digit] + _midpoint(low[1:], None)
+
+
+def rank_at(index):
+    """Key of the ``index``-th task of an evenly spaced list."""
+    return encode_integer(FIRST_RANK_VALUE + index * RANK_STEP)
+
+
+def rank_between(before, after):
+    """
+    A key that sorts after ``before`` and before ``after``. Either may be
+    None for the start or the end of the list. Raises ``RankError``.
+    """
+    if before is not None and after is not None and before >= after:
+        raise RankError(f"{before!r} does not sort before {after!r}")
+    if before is None and after is None:
+        return rank_at(0)
+    if before is None:
+        integer, fraction = _split(after)
+        if fraction:
+            return integer
+        value = _integer_value(integer)
+        if value == 0:
+            raise RankError("No key sorts before the smallest one")
+        return encode_integer(value - 1)
+    integer, fraction = _split(before)
+    if after is None:
+        return encode_integer(_integer_value(integer) + 1)
+    after_integer, after_fraction = _split(after)
+    if integer == after_integer:
+        return integer + _midpoint(fraction, after_fraction)
+    following = encode_integer(_integer_value(integer) + 1)
+    if following < after:
+        return following
+    return integer + _midpoint(fraction, None)
+
+
+def last_rank(tasks):
+    """The highest key in ``tasks`` (a queryset), or None."""
+    return tasks.order_by("-rank").values_list("rank", flat=True).first()
+
+
+def next_rank(task, using=None):
+    """Key that appends ``task`` to the end of its category."""
+    using = using or router.db_for_write(type(task), instance=task)
+    tasks = type(task).objects.using(using).filter(category_id=task.category_id)
+    return rank_between(last_rank(tasks), None)
+
+
+def move_task(task, after=None):
+    """
+    Give ``task`` the key that places it right after ``after`` (a task of the
+    same category), or first when ``after`` is None. Only ``task`` is written,
+    unless the neighbours' keys leave no room and the category is rebalanced.
+    """
+    Task = type(task)
+    using = router.db_for_write(Task, instance=task)
+    with transaction.atomic(using=using):
+        # Moves within a category are serialized on the category row
+        Category = Task._meta.get_field("category").related_model
+        Category.objects.using(using).select_for_update().filter(pk=task.category_id).exists()
+        for attempt in range(2):
+            before, following = _neighbours(Task, using, task, after)
+            try:
+                rank = rank_between(before, following)
+            except RankError:
+                rank = None  # Equal neighbour keys, or nothing sorts before the first
+            if rank is not None and len(rank) <= RANK_MAX_LENGTH:
+                break
+            if attempt:
+                raise RankError("No room for the task after rebalancing")
+            rebalance_category(Task, task.category_id, using)
+            if after is not None:
+                after.refresh_from_db(using=using, fields=["rank"])
+        task.rank = rank
+        task.save(update_fields=["rank"])
+    return rank
+
+
+def _neighbours(Task, using, task, after):
+    others = Task.objects.using(using).filter(category_id=task.category_id).exclude(pk=task.pk)
+    ordered = others.order_by("rank", "id").values_list("rank", flat=True)
+    if after is None:
+        return None, ordered.first()
+    following = ordered.filter(Q(rank__gt=after.rank) | Q(rank=after.rank, id__gt=after.id)).first()
+    return after.rank, following
+
+
+def rebalance_category(Task, category_id, using, batch_size=1000):
+    """Rewrite the keys of a category's tasks evenly spaced, in their current order."""
+    with transaction.atomic(using=using):
+        tasks = list(
+            Task.objects.using(using)
+            .select_for_update()
+            .filter(category_id=category_id)
+            .order_by("rank", "id")
+            .only("id", "rank")
+        )
+        changed = []
+        for index, task in enumerate(tasks):
+            rank = rank_at(index)
+            if task.rank != rank:
+                task.rank = rank
+                changed.append(task)
+        Task.objects.using(using).bulk_update(changed, ["rank"], batch_size=batch_size)
+    return len(changed)
@@ -0,0 +1,175 @@
+"""
+Recurring tasks.
+
+A ``RecurrenceRule`` is a task template with a daily, weekly or monthly
+schedule, optionally ending on ``until`` or after ``count`` occurrences.
+Occurrences are never stored ahead of time: ``occurrences()`` computes the
+dates of a rule that fall in a window from the schedule alone, so a rule
+repeating forever costs one row. A ``Task`` is only created for an occurrence
+when the user acts on it (``materialize()``); it keeps the rule and date in
+(``recurrence``, ``occurrence_date``), and from then on the date is listed as
+that task instead of a computed occurrence.
+
+Expansion jumps straight to the first occurrence in the window rather than
+stepping from the start date, and its result is cached per schedule and
+window.
+"""
+import calendar
+from datetime import date, timedelta
+from functools import lru_cache
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .models import ArchivedTask, RecurrenceRule, Task
+
+# Longest window occurrences are listed for at once
+RECURRENCE_MAX_WINDOW_DAYS = 366
+# Expanded (schedule, window) pairs kept per process
+EXPANSION_CACHE_SIZE = 4096
+
+_STEP_DAYS = {"daily": 1, "weekly": 7}
+
+
+class RecurrenceError(ValueError):
+    pass
+
+
+def _add_months(day, months):
+    # The 31st of a 30-day month (or February) falls on its last day
+    month = day.month - 1 + months
+    year, month = day.year + month // 12, month % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+
+@lru_cache(maxsize=EXPANSION_CACHE_SIZE)
+def expand(frequency, interval, start_date, until, count, window_start, window_end):
+    """Dates of the schedule's occurrences between ``window_start`` and ``window_end``, inclusive."""
+    last = window_end if until is None else min(window_end, until)
+    if last < start_date or last < window_start:
+        return ()
+    dates = []
+    if frequency in _STEP_DAYS:
+        step = interval * _STEP_DAYS[frequency]
+        first = max(0, -(-(window_start - start_date).days // step))  # Rounded up
+        stop = (last - start_date).days // step + 1
+        if count is not None:
+            stop = min(stop, count)
+        dates = [start_date + timedelta(days=index * step) for index in range(first, stop)]
+    else:
+        months = (window_start.year - start_date.year) * 12 + window_start.month - start_date.month
+        # Rounded down: a date moved to the end of a short month may be the first one in the window
+        index = max(0, months // interval)
+        while count is None or index < count:
+            day = _add_months(start_date, index * interval)
+            if day > last:
+                break
+            if day >= window_start:
+                dates.append(day)
+            index += 1
+    return tuple(dates)
+
+
+def occurrences(rule, window_start, window_end):
+    return expand(
+        rule.frequency, rule.interval, rule.start_date, rule.until, rule.count, window_start, window_end
+    )
+
+
+def parse_day(value, name):
+    """``value`` as a date; raises ``RecurrenceError``."""
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise RecurrenceError(f"{name} must be a date in YYYY-MM-DD format")
+
+
+def check_window(window_start, window_end):
+    """Raise ``RecurrenceError`` unless the window can be listed."""
+    if window_end < window_start:
+        raise RecurrenceError("end must not be before start")
+    if (window_end - window_start).days >= RECURRENCE_MAX_WINDOW_DAYS:
+        raise RecurrenceError(f"Windows can span at most {RECURRENCE_MAX_WINDOW_DAYS} days")
+
+
+def window_occurrences(user, window_start, window_end):
+    """
+    All occurrences of the user's rules in the window, by date, each with the
+    id of the task created for it (None while it has not been acted on).
+    Three queries, whatever the number of rules and occurrences.
+    """
+    check_window(window_start, window_end)
+    rules = list(
+        RecurrenceRule.objects.for_user(user)
+        .filter(Q(until__isnull=True) | Q(until__gte=window_start), start_date__lte=window_end)
+        .only("id", "title", "priority", "category_id", "frequency", "interval", "start_date", "until", "count")
+    )
+    if not rules:
+        return []
+    # Materialized occurrences, including those whose task has been archived
+    created = {}
+    for model in (Task, ArchivedTask):
+        rows = model.objects.for_user(user).filter(
+            recurrence_id__in=[rule.id for rule in rules],
+            occurrence_date__range=(window_start, window_end),
+        )
+        created.update(
+            ((recurrence_id, day), task_id)
+            for task_id, recurrence_id, day in rows.values_list("id", "recurrence_id", "occurrence_date")
+        )
+    found = [
+        {
+            "recurrence": rule.id,
+            "date": day,
+            "title": rule.title,
+            "priority": rule.priority,
+            "category": rule.category_id,
+            "task": created.get((rule.id, day)),
+        }
+        for rule in rules
+        for day in occurrences(rule, window_start, window_end)
+    ]
+    found.sort(key=lambda occurrence: (occurrence["date"], occurrence["recurrence"]))
+    return found
+
+
+def materialize(rule, day):
+    """
+    The task of ``rule``'s occurrence on ``day``, created from the template
+    if it does not exist yet. Returns ``(task, created)``; raises
+    ``RecurrenceError`` when ``day`` is not an occurrence.
+    """
+    if day not in occurrences(rule, day, day):
+        raise RecurrenceError(f"{day} is not an occurrence of this recurring task")
+    using = rule._state.db
+    tasks = Task.objects.using(using).filter(recurrence=rule, occurrence_date=day)
+    task = tasks.first()
+    if task is not None:
+        return task, False
+    if ArchivedTask.objects.using(using).filter(recurrence_id=rule.id, occurrence_date=day).exists():
+        raise RecurrenceError("The task of this occurrence has been archived; restore it instead")
+    try:
+        with transaction.atomic(using=using):
+            task = Task.objects.using(using).create(
+                title=rule.title,
+                description=rule.description,
+                priority=rule.priority,
+                due_date=day,
+                category_id=rule.category_id,
+                recurrence=rule,
+                occurrence_date=day,
+                author_id=rule.author_id,
+            )
+    except IntegrityError:
+        # A concurrent request created it first
+        return tasks.get(), False
+    return task, True
+
+
+def delete_rule(rule):
+    """Delete ``rule``; the tasks created for its occurrences stay, unlinked."""
+    using = rule._state.db
+    with transaction.atomic(using=using):
+        # Task.recurrence is cleared by the ORM, the archive only stores the id
+        ArchivedTask.objects.using(using).filter(recurrence_id=rule.id).update(recurrence_id=None)
+        rule.delete()
@@ -0,0 +1,180 @@
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OutboundEmail, ReminderRun, Task
+from .sharding import GLOBAL_DB
+
+OPEN_STATUSES = ["pending", "inprogress"]
+DUE_REMINDER = "due_reminder"
+MAX_SEND_ATTEMPTS = 5
+
+
+def queue_due_reminders(start, end, batch_size=1000, stdout=None, using=GLOBAL_DB):
+    """
+    Queue one digest email per user listing their open tasks due between
+    ``start`` and ``end`` (inclusive) that are stored on the ``using`` shard.
+
+    Tasks are read in keyset-paginated batches in ``(due_date, status, id)``
+    order, which is the order of the ``tasks_due_status_idx`` index, so each
+    batch is a short index range scan and memory stays bounded. Each batch is
+    merged into the users' digests and the checkpoint is advanced in the same
+    transaction, so an interrupted run resumes without duplicating anything.
+    Digests only become sendable once the whole window has been scanned.
+    """
+    run_key = f"{DUE_REMINDER}:{start}:{end}"
+    if using != GLOBAL_DB:
+        run_key += f":{using}"  # One checkpoint per shard
+    run, _ = ReminderRun.objects.get_or_create(run_key=run_key)
+    if run.completed_at:
+        return run, 0
+
+    scanned = 0
+    while True:
+        with transaction.atomic():
+            # Locking the checkpoint keeps two concurrent runs from interleaving
+            run = ReminderRun.objects.select_for_update().get(pk=run.pk)
+            batch = _next_batch(run, start, end, batch_size, using)
+            if not batch:
+                break
+            _merge_into_digests(run, batch)
+            last = batch[-1]
+            run.last_due_date = last["due_date"]
+            run.last_status = last["status"]
+            run.last_task_id = last["id"]
+            run.save(update_fields=["last_due_date", "last_status", "last_task_id", "updated_at"])
+        scanned += len(batch)
+        if stdout is not None:
+            stdout.write(f"{scanned} tasks scanned", ending="\r")
+
+    with transaction.atomic():
+        OutboundEmail.objects.filter(run=run, status="building").update(status="pending")
+        run.completed_at = timezone.now()
+        run.save(update_fields=["completed_at", "updated_at"])
+    return run, scanned
+
+
+def _next_batch(run, start, end, batch_size, using):
+    tasks = Task.objects.using(using).filter(
+        due_date__gte=start, due_date__lte=end, status__in=OPEN_STATUSES
+    )
+    if run.last_due_date is not None:
+        due, status, task_id = run.last_due_date, run.last_status, run.last_task_id
+        tasks = tasks.filter(
+            Q(due_date__gt=due)
+            | Q(due_date=due, status__gt=status)
+            | Q(due_date=due, status=status, id__gt=task_id)
+        )
+    return list(
+        tasks.order_by("due_date", "status", "id").values(
+            "id", "title", "due_date", "status", "author_id"
+        )[:batch_size]
+    )
+
+
+def _merge_into_digests(run, batch):
+    per_user = {}
+    for task in batch:
+        per_user.setdefault(task["author_id"], []).append(
+            {"id": task["id"], "title": task["title"], "due_date": task["due_date"].isoformat()}
+        )
+
+    keys = {f"{run.run_key}:{user_id}": user_id for user_id in per_user}
+    existing = {
+        email.dedupe_key: email
+        for email in OutboundEmail.objects.select_for_update().filter(dedupe_key__in=keys)
+    }
+
+    to_update = []
+    to_create = []
+    for key, user_id in keys.items():
+        email = existing.get(key)
+        if email is None:
+            to_create.append(
+                OutboundEmail(
+                    user_id=user_id,
+                    kind=DUE_REMINDER,
+                    dedupe_key=key,
+                    run=run,
+                    payload={"tasks": per_user[user_id]},
+                    status="building",
+                )
+            )
+            continue
+        # A resumed batch may overlap what was already merged
+        seen = {task["id"] for task in email.payload["tasks"]}
+        email.payload["tasks"].extend(t for t in per_user[user_id] if t["id"] not in seen)
+        to_update.append(email)
+
+    OutboundEmail.objects.bulk_create(to_create)
+    OutboundEmail.objects.bulk_update(to_update, ["payload"])
+
+
+def render_due_reminder(email):
+    tasks = email.payload["tasks"]
+    lines = "\n".join(f"- {task['title']} (due {task['due_date']})" for task in tasks)
+    subject = f"You have {len(tasks)} task{'s' if len(tasks) != 1 else ''} due soon"
+    message = f"""Hello,
+
+The following tasks are due soon:
+
+{lines}
+
+Open Task Master to review them: {settings.FRONTEND_URL}
+
+Best regards,
+Your Application Team
+"""
+    return subject, message
+
+
+RENDERERS = {DUE_REMINDER: render_due_reminder}
+
+
+def send_queued_emails(limit=500, batch_size=50):
+    """
+    Send pending emails over one SMTP connection. Rows are claimed with
+    SKIP LOCKED so several senders can run at once without double sending.
+    Returns ``(sent, failed)``.
+    """
+    sent = failed = 0
+    last_id = 0  # Failed emails stay pending but are not retried in the same call
+    connection = get_connection()
+    with connection:
+        while sent + failed < limit:
+            with transaction.atomic():
+                emails = list(
+                    OutboundEmail.objects.select_for_update(skip_locked=True, of=("self",))
+                    .select_related("user")
+                    .filter(status="pending", id__gt=last_id)
+                    .order_by("id")[: min(batch_size, limit - sent - failed)]
+                )
+                if not emails:
+                    break
+                last_id = emails[-1].id
+                for email in emails:
+                    subject, message = RENDERERS[email.kind](email)
+                    email.attempts += 1
+                    try:
+                        EmailMessage(
+                            subject,
+                            message,
+                            settings.EMAIL_HOST_USER,
+                            [email.user.email],
+                            connection=connection,
+                        ).send()
+                    except Exception as e:
+                        email.last_error = str(e)
+                        if email.attempts >= MAX_SEND_ATTEMPTS:
+                            email.status = "failed"
+                        failed += 1
+                    else:
+                        email.status = "sent"
+                        email.sent_at = timezone.now()
+                        sent += 1
+                OutboundEmail.objects.bulk_update(
+                    emails, ["status", "attempts", "last_error", "sent_at"]
+                )
+    return sent, failed
@@ -0,0 +1,62 @@
+from rest_framework.renderers import JSONRenderer
+
+
+def to_columnar(rows, dictionary_fields=(), fields=()):
+    """
+    Turn a list of flat dicts into one array per field.
+
+    Fields listed in ``dictionary_fields`` are dictionary-encoded: the column
+    holds small integer codes and ``dictionaries`` maps each code back to its
+    value, in order of first appearance. ``fields`` names the fields of an
+    empty list, which has no row to take them from.
+    """
+    fields = list(rows[0]) if rows else list(fields)
+    columns = {}
+    dictionaries = {}
+
+    for field in fields:
+        values = [row.get(field) for row in rows]
+        if field in dictionary_fields:
+            codes = {}
+            columns[field] = [codes.setdefault(value, len(codes)) for value in values]
+            dictionaries[field] = list(codes)
+        else:
+            columns[field] = values
+
+    return {
+        "count": len(rows),
+        "fields": fields,
+        "columns": columns,
+        "dictionaries": dictionaries,
+    }
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """
+    Compact encoding for list responses, selected with ``?format=columnar``.
+
+    Key names are sent once instead of once per row, and low-cardinality
+    fields are dictionary-encoded. Paginated responses have their ``results``
+    encoded. Anything else (errors, single objects) is rendered as plain JSON.
+    """
+
+    format = "columnar"
+    dictionary_fields = ("priority", "status", "category")
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if self._is_rows(data):
+            data = self._encode(data)
+        elif isinstance(data, dict) and self._is_rows(data.get("results")):
+            # Paginated list: keep count/next/previous, encode the page
+            data = {**data, "results": self._encode(data["results"])}
+        return super().render(data, accepted_media_type, renderer_context)
+
+    def _encode(self, rows):
+        # Serializer output remembers its serializer, which knows the fields
+        child = getattr(getattr(rows, "serializer", None), "child", None)
+        fields = list(child.fields) if child is not None else ()
+        return to_columnar(rows, self.dictionary_fields, fields)
+
+    @staticmethod
+    def _is_rows(data):
+        return isinstance(data, list) and all(isinstance(row, dict) for row in data)
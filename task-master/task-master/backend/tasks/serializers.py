@@ -1,5 +1,19 @@
 from rest_framework import serializers
-from .models import User, Category, Task
+from rest_framework.validators import UniqueValidator
+from .models import ActivityEntry, User, Category, RecurrenceRule, Tag, Task
+from .hierarchy import SUBTASK_MAX_DEPTH, depth
+
+
+class SparseFieldsMixin:
+    """
+    Lets callers pass ``fields=[...]`` to serialize only some of the declared fields.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -22,18 +36,39 @@ class UserSerializer(serializers.ModelSerializer):
         }
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
 
     class Meta:
         model = Category
-        fields = ["id", "name", "description", "author"]
+        fields = ["id", "name", "description", "author", "version"]
         read_only_fields = (
             "author",
+            "version",  # Changed by every save; send it back as If-Match to edit
         )  # Make author read-only as it will be set automatically
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is not None and "name" in self.fields:
+            # Check uniqueness on the shard the category will be saved to
+            for validator in self.fields["name"].validators:
+                if isinstance(validator, UniqueValidator):
+                    validator.queryset = Category.objects.on_shard_of(request.user)
+
+
+class TagSerializer(serializers.ModelSerializer):
+    task_count = serializers.IntegerField(read_only=True, required=False)
+
+    class Meta:
+        model = Tag
+        fields = ["id", "name", "task_count"]
+
+
+class TaskSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    # Changed through task/tag and task/untag
+    tags = serializers.SlugRelatedField(many=True, read_only=True, slug_field="name")
 
-class TaskSerializer(serializers.ModelSerializer):
     class Meta:
         model = Task
         fields = [
@@ -45,4 +80,84 @@ class TaskSerializer(serializers.ModelSerializer):
             "status",
             "category",
             "author",
+            "rank",  # Read-only, changed through task/move
+            "parent",  # Set on create, changed through task/reparent
+            "tags",
+            "recurrence",  # Set by recurrence/materialize
+            "occurrence_date",
+            "version",  # Changed by every save; send it back as If-Match to edit
+        ]
+        read_only_fields = ["recurrence", "occurrence_date", "version"]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is not None and "category" in self.fields:
+            # Only the user's own categories, read from their shard
+            self.fields["category"].queryset = Category.objects.for_user(request.user)
+        if request is not None and "parent" in self.fields:
+            self.fields["parent"].queryset = Task.objects.for_user(request.user)
+
+    def validate(self, attrs):
+        task = self.instance
+        parent = attrs.get("parent")
+        if task is not None:
+            if "parent" in attrs and getattr(parent, "pk", None) != task.parent_id:
+                raise serializers.ValidationError(
+                    {"parent": "Use task/reparent to move a task along with its subtasks"}
+                )
+            if (
+                "category" in attrs
+                and attrs["category"].id != task.category_id
+                and (task.parent_id is not None or task.subtasks.exists())
+            ):
+                raise serializers.ValidationError(
+                    {"category": "Tasks with a parent or subtasks stay in their parent's category"}
+                )
+        elif parent is not None:
+            if parent.category_id != attrs["category"].id:
+                raise serializers.ValidationError(
+                    {"parent": "A subtask must be in the same category as its parent"}
+                )
+            if depth(parent.path) >= SUBTASK_MAX_DEPTH:
+                raise serializers.ValidationError(
+                    {"parent": f"Subtasks can be nested at most {SUBTASK_MAX_DEPTH} levels deep"}
+                )
+        return attrs
+
+
+class ActivityEntrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ActivityEntry
+        fields = ["id", "action", "changes", "created_at"]
+
+
+class RecurrenceRuleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RecurrenceRule
+        fields = [
+            "id",
+            "title",
+            "description",
+            "priority",
+            "category",
+            "frequency",
+            "interval",
+            "start_date",
+            "until",
+            "count",
         ]
+        extra_kwargs = {"interval": {"min_value": 1}, "count": {"min_value": 1}}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is not None:
+            self.fields["category"].queryset = Category.objects.for_user(request.user)
+
+    def validate(self, attrs):
+        start_date = attrs.get("start_date", getattr(self.instance, "start_date", None))
+        until = attrs.get("until", getattr(self.instance, "until", None))
+        if until is not None and start_date is not None and until < start_date:
+            raise serializers.ValidationError({"until": "until must not be before start_date"})
+        return attrs
@@ -0,0 +1,208 @@
+"""
+Routing of per-user data across several databases.
+
+Users, auth and the job bookkeeping tables live in the global ``default``
+database. Every row of the models in ``SHARDED_MODELS`` belongs to one
+author, and all of an author's rows live on one of ``settings.TASK_SHARDS``:
+the one named in ``User.task_shard`` (the directory, set when a user is
+moved by ``reshard_user``) or else the one picked by a consistent hash of the
+user id. With the default ``TASK_SHARDS = ["default"]`` everything stays in
+one database and this module only adds the router.
+
+Queries for sharded models must say which shard they read, normally through
+``Model.objects.for_user(user)``; reads that cannot be routed raise
+``ShardRoutingError`` instead of silently hitting the wrong database.
+"""
+import bisect
+import hashlib
+import threading
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import models, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+GLOBAL_DB = "default"
+# Models of the tasks app whose rows are stored on the author's shard
+SHARDED_MODELS = {
+    "category", "task", "archivedtask", "tag", "tasktag", "archivedtasktag", "activityentry", "recurrencerule",
+    "taskdailystat",
+}
+
+
+class ShardRoutingError(Exception):
+    pass
+
+
+class ShardMoving(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Your tasks are being moved to another server. Try again in a moment."
+    default_code = "shard_moving"
+
+
+class HashRing:
+    """Consistent hash ring: adding a shard only moves about 1/N of the keys."""
+
+    def __init__(self, nodes, replicas=100):
+        points = sorted(
+            (_hash(f"{node}#{replica}"), node) for node in nodes for replica in range(replicas)
+        )
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def get(self, key):
+        index = bisect.bisect(self._hashes, _hash(str(key))) % len(self._hashes)
+        return self._nodes[index]
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+@lru_cache(maxsize=None)
+def _ring():
+    return HashRing(settings.TASK_SHARDS)
+
+
+def sharding_enabled():
+    return settings.TASK_SHARDS != [GLOBAL_DB]
+
+
+def is_sharded(model):
+    return model._meta.app_label == "tasks" and model._meta.model_name in SHARDED_MODELS
+
+
+def hashed_shard(user_id):
+    return _ring().get(user_id) if sharding_enabled() else GLOBAL_DB
+
+
+def shard_for_user(user, write=False):
+    """Database alias holding ``user``'s rows. Raises ``ShardMoving`` for writes mid-move."""
+    if write and user.task_shard_moving:
+        raise ShardMoving()
+    return user.task_shard or hashed_shard(user.pk)
+
+
+def shard_for_user_id(user_id, write=False):
+    if not sharding_enabled():
+        return GLOBAL_DB
+    user = get_user_model().objects.only("task_shard", "task_shard_moving").get(pk=user_id)
+    return shard_for_user(user, write=write)
+
+
+class ShardedQuerySet(models.QuerySet):
+    def for_user(self, user):
+        """Rows authored by ``user``, read from their shard."""
+        return self.using(shard_for_user(user)).filter(author=user)
+
+    def on_shard_of(self, user):
+        """Everything on ``user``'s shard; callers still filter by author."""
+        return self.using(shard_for_user(user))
+
+    def create(self, **kwargs):
+        if self._db is not None or not sharding_enabled():
+            return super().create(**kwargs)
+        # Without a shard, let save() route the new row by its author
+        obj = self.model(**kwargs)
+        obj.save(force_insert=True)
+        return obj
+
+
+class ShardRouter:
+    def db_for_read(self, model, **hints):
+        if not is_sharded(model):
+            return GLOBAL_DB
+        return self._route(model, hints, write=False)
+
+    def db_for_write(self, model, **hints):
+        if not is_sharded(model):
+            return GLOBAL_DB
+        return self._route(model, hints, write=True)
+
+    def _route(self, model, hints, write):
+        if not sharding_enabled():
+            return GLOBAL_DB
+        instance = hints.get("instance")
+        if isinstance(instance, get_user_model()):
+            return shard_for_user(instance, write=write)  # e.g. user.task_set
+        if instance is not None:
+            if not write and instance._state.db:
+                return instance._state.db
+            # Writes go through the author so a user being moved cannot write
+            author = instance._state.fields_cache.get("author")
+            if author is not None:
+                return shard_for_user(author, write=write)
+            return shard_for_user_id(instance.author_id, write=write)
+        raise ShardRoutingError(
+            f"{model.__name__} queries must name a shard, e.g. "
+            f"{model.__name__}.objects.for_user(user) or .using(alias)"
+        )
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if is_sharded(type(obj1)) or is_sharded(type(obj2)):
+            return True  # author is a cross-database reference without a constraint
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if not sharding_enabled():
+            return db == GLOBAL_DB
+        sharded = app_label == "tasks" and model_name in SHARDED_MODELS
+        if db in settings.TASK_SHARDS and db != GLOBAL_DB:
+            return sharded
+        return not sharded
+
+
+# Globally unique ids for sharded rows ------------------------------------
+
+_id_blocks = {}
+_id_lock = threading.Lock()
+
+
+def next_id(model):
+    """
+    Next primary key for ``model``, unique across all shards.
+
+    Ids are handed out from blocks of ``ID_BLOCK_SIZE`` reserved in the global
+    ``id_blocks`` table (hi/lo), so only one insert in a block touches it.
+    """
+    name = model._meta.label_lower
+    with _id_lock:
+        block = _id_blocks.get(name)
+        if block is None or block[0] >= block[1]:
+            block = _id_blocks[name] = list(_reserve_ids(model, settings.ID_BLOCK_SIZE))
+        value = block[0]
+        block[0] += 1
+        return value
+
+
+def reserve_ids(model, count):
+    """Reserve ``count`` consecutive ids for bulk inserts. Returns a range."""
+    return range(*_reserve_ids(model, count))
+
+
+# Archived tasks keep their task id, so new task ids must not reuse them
+SHARED_ID_SPACES = {"tasks.task": ("tasks.archivedtask",)}
+
+
+def _reserve_ids(model, count):
+    IdBlock = apps.get_model("tasks", "IdBlock")
+    name = model._meta.label_lower
+    if not IdBlock.objects.filter(name=name).exists():
+        # First allocation: start above every id already on any shard
+        id_models = [model, *(apps.get_model(label) for label in SHARED_ID_SPACES.get(name, ()))]
+        start = 1 + max(
+            id_model.objects.using(alias).aggregate(top=models.Max("pk"))["top"] or 0
+            for id_model in id_models
+            for alias in settings.TASK_SHARDS
+        )
+        IdBlock.objects.get_or_create(name=name, defaults={"next_id": start})
+
+    with transaction.atomic(using=GLOBAL_DB):
+        block = IdBlock.objects.select_for_update().get(name=name)
+        start = block.next_id
+        block.next_id = start + count
+        block.save(update_fields=["next_id"])
+    return start, start + count
@@ -0,0 +1,32 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import ActivityEntry, ArchivedTask, Category, RecurrenceRule, Tag, Task, TaskDailyStat, User
+from .sharding import next_id, sharding_enabled
+from .suggestions import invalidate
+
+
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=Task)
+@receiver(pre_save, sender=Tag)
+@receiver(pre_save, sender=RecurrenceRule)
+@receiver(pre_save, sender=TaskDailyStat)
+def assign_global_id(sender, instance, **kwargs):
+    # Auto-increment ids would collide between shards
+    if instance.pk is None and sharding_enabled():
+        instance.pk = next_id(sender)
+
+
+@receiver(pre_delete, sender=User)
+def delete_user_rows(sender, instance, **kwargs):
+    # The author foreign keys cannot cascade across databases
+    for model in (Task, ArchivedTask, RecurrenceRule, TaskDailyStat, Category, Tag, ActivityEntry):
+        model.objects.for_user(instance).delete()
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_suggestions(sender, instance, update_fields=None, **kwargs):
+    # Rank and subtask moves save only their own fields
+    if update_fields is None or "title" in update_fields:
+        invalidate(instance.author_id, instance._state.db)
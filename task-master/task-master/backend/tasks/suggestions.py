@@ -0,0 +1,176 @@
+"""
+Typeahead suggestions for the search box.
+
+Each worker keeps, per user, a ``PrefixIndex`` of the distinct titles of
+their tasks: the titles, and the rest of each title from every later word,
+in two sorted lists. A lookup is two binary searches and a short scan from
+there, so typing never touches the database. The index is built
+from one query the first time a user asks for suggestions, and the least
+recently used indexes are dropped once they hold ``SUGGEST_INDEX_MAX_ENTRIES``
+keys in all.
+
+Every index is tagged with the user's token in ``SUGGEST_CACHE``, a cache all
+workers share (Redis by default; a system check rejects per-process and
+per-host caches). Saving or deleting a task (see ``signals``) sets a new
+token when its transaction commits, once per user and transaction, and
+drops the index of the worker that made the change. Any other worker reads
+the token at most every ``SUGGEST_TOKEN_CHECK_SECONDS`` while the user types,
+and rebuilds its index on the next lookup once the token has changed.
+Restored tasks are not saved one by one, so ``restore_tasks()`` calls
+``invalidate()`` itself.
+"""
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from .models import Task
+
+SUGGEST_DEFAULT_LIMIT = 10
+SUGGEST_MAX_LIMIT = 50
+# Caches that other workers or hosts cannot see
+UNSHARED_CACHES = (DummyCache, FileBasedCache, LocMemCache)
+
+_WORD = re.compile(r"\w+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(text):
+    return _SPACES.sub(" ", text.casefold()).lstrip()
+
+
+class PrefixIndex:
+    def __init__(self, rows):
+        self.titles = {}  # Normalized title: (title, id of its newest task)
+        for task_id, title in rows:
+            key = normalize(title).rstrip()
+            if key and (key not in self.titles or task_id > self.titles[key][1]):
+                self.titles[key] = (title, task_id)
+        self.starts = sorted(self.titles)
+        self.words = sorted(
+            (key[match.start():], key)
+            for key in self.starts
+            for match in _WORD.finditer(key)
+            if match.start()
+        )
+
+    def __len__(self):
+        return len(self.starts) + len(self.words)
+
+    def lookup(self, prefix, limit):
+        """Titles starting with ``prefix``, then titles with a later word starting with it."""
+        found = []
+        index = bisect_left(self.starts, prefix)
+        while index < len(self.starts) and len(found) < limit and self.starts[index].startswith(prefix):
+            found.append(self.starts[index])
+            index += 1
+        seen = set(found)
+        index = bisect_left(self.words, (prefix,))
+        while index < len(self.words) and len(found) < limit:
+            rest, key = self.words[index]
+            if not rest.startswith(prefix):
+                break
+            if key not in seen:
+                seen.add(key)
+                found.append(key)
+            index += 1
+        return [{"id": self.titles[key][1], "title": self.titles[key][0]} for key in found]
+
+
+_indexes = OrderedDict()  # {user_id: (token, PrefixIndex, checked_at)}, least recently used first
+_size = 0
+_lock = threading.Lock()
+
+
+def _token_key(user_id):
+    return f"suggest:{user_id}:token"
+
+
+def _store(user_id, token, index, checked_at):
+    global _size
+    with _lock:
+        previous = _indexes.pop(user_id, None)
+        if previous is not None:
+            _size -= len(previous[1])
+        _indexes[user_id] = (token, index, checked_at)
+        _size += len(index)
+        # The index just built stays even if it alone is over the limit
+        while _size > settings.SUGGEST_INDEX_MAX_ENTRIES and len(_indexes) > 1:
+            _, (_, evicted, _) = _indexes.popitem(last=False)
+            _size -= len(evicted)
+
+
+def _drop(user_id):
+    global _size
+    with _lock:
+        entry = _indexes.pop(user_id, None)
+        if entry is not None:
+            _size -= len(entry[1])
+
+
+def suggest(user, prefix, limit=SUGGEST_DEFAULT_LIMIT):
+    prefix = normalize(prefix)
+    if not prefix:
+        return []
+    now = time.monotonic()
+    with _lock:
+        entry = _indexes.get(user.pk)
+        if entry is not None and now - entry[2] < settings.SUGGEST_TOKEN_CHECK_SECONDS:
+            _indexes.move_to_end(user.pk)
+            return entry[1].lookup(prefix, limit)
+
+    cache = caches[settings.SUGGEST_CACHE]
+    token = cache.get(_token_key(user.pk))
+    with _lock:
+        entry = _indexes.get(user.pk)
+        if entry is not None and token is not None and entry[0] == token:
+            _indexes[user.pk] = (token, entry[1], now)
+            _indexes.move_to_end(user.pk)
+            return entry[1].lookup(prefix, limit)
+
+    if token is None:
+        cache.add(_token_key(user.pk), uuid.uuid4().hex, None)
+        token = cache.get(_token_key(user.pk))
+    # Read after the token, so a change committed meanwhile replaces it again
+    index = PrefixIndex(Task.objects.for_user(user).values_list("id", "title").iterator())
+    _store(user.pk, token, index, now)
+    return index.lookup(prefix, limit)
+
+
+def invalidate(user_id, using):
+    """Rebuild ``user_id``'s indexes once the current transaction on ``using`` commits."""
+    connection = transaction.get_connection(using)
+    # Deleting a category deletes its tasks one signal at a time
+    if connection.in_atomic_block and any(
+        getattr(callback, "suggest_user_id", None) == user_id for _, callback, _ in connection.run_on_commit
+    ):
+        return
+
+    def publish():
+        caches[settings.SUGGEST_CACHE].set(_token_key(user_id), uuid.uuid4().hex, None)
+        _drop(user_id)
+
+    publish.suggest_user_id = user_id
+    # A cache error must not fail a request whose change has been committed
+    transaction.on_commit(publish, using=using, robust=True)
+
+
+def check_suggest_cache(app_configs=None, **kwargs):
+    cache = caches[settings.SUGGEST_CACHE]
+    if isinstance(cache, UNSHARED_CACHES):
+        return [checks.Error(
+            f"SUGGEST_CACHE ({settings.SUGGEST_CACHE!r}) uses {type(cache).__name__}, which other workers cannot see",
+            hint="Name a cache shared by every worker, such as the Redis-backed 'shared' cache.",
+            id="tasks.E001",
+        )]
+    return []
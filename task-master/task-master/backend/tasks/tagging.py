@@ -0,0 +1,103 @@
+"""
+Tags: labels from a per-author namespace, linked to tasks through
+``task_tags`` (and ``task_tags_archive`` for archived tasks).
+
+Multi-tag filters never join once per tag. ``tagged_task_ids`` reads the link
+rows of the wanted tags off the unique (tag, task) index and groups them by
+task, so "all of" is ``HAVING COUNT(*) = n`` and "any of" a ``DISTINCT``,
+however many tags are asked for.
+"""
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Tag, Task, TaskTag
+from .sharding import reserve_ids, shard_for_user, sharding_enabled
+
+TAG_MATCHES = ("all", "any")
+TAG_NAME_MAX_LENGTH = Tag._meta.get_field("name").max_length
+# Tasks per bulk tag/untag request
+BULK_TAG_MAX_TASKS = 1000
+
+
+class TagError(ValueError):
+    pass
+
+
+def tagged_task_ids(link_model, tag_ids, match="all"):
+    """Subquery of the ids of tasks linked to all (or any) of ``tag_ids``."""
+    links = link_model.objects.filter(tag_id__in=tag_ids).values("task_id")
+    if match == "all":
+        # (tag, task) is unique, so a task has all the tags when it has as many links
+        links = links.annotate(matched=Count("tag_id")).filter(matched=len(set(tag_ids)))
+    else:
+        links = links.distinct()
+    return links.values("task_id")
+
+
+def clean_tag_names(names):
+    """Stripped, de-duplicated ``names``. Raises ``TagError``."""
+    if not isinstance(names, list) or not names or not all(isinstance(name, str) for name in names):
+        raise TagError("tags must be a non-empty list of tag names")
+    cleaned = list(dict.fromkeys(name.strip() for name in names))
+    if not all(cleaned) or any(len(name) > TAG_NAME_MAX_LENGTH for name in cleaned):
+        raise TagError(f"Tag names must be 1 to {TAG_NAME_MAX_LENGTH} characters long")
+    return cleaned
+
+
+def _assign_ids(model, objs):
+    # bulk_create skips the pre_save signal that hands out ids across shards
+    if sharding_enabled():
+        for obj, pk in zip(objs, reserve_ids(model, len(objs))):
+            obj.pk = pk
+
+
+def get_or_create_tags(user, names, using):
+    """The user's tags called ``names``, creating the missing ones."""
+    tags = Tag.objects.using(using).filter(author=user, name__in=names)
+    existing = {tag.name for tag in tags}
+    missing = [Tag(name=name, author=user) for name in names if name not in existing]
+    if missing:
+        _assign_ids(Tag, missing)
+        # A concurrent request may have created the same tag
+        Tag.objects.using(using).bulk_create(missing, ignore_conflicts=True)
+        tags = Tag.objects.using(using).filter(author=user, name__in=names)
+    return list(tags.order_by("name"))
+
+
+def tag_tasks(user, task_ids, names):
+    """
+    Add the tags ``names`` to the user's tasks ``task_ids`` with one bulk
+    insert. Returns the tags and the ids of the tasks that were found; when
+    none were, nothing is created.
+    """
+    using = shard_for_user(user, write=True)
+    with transaction.atomic(using=using):
+        task_ids = list(
+            Task.objects.using(using).filter(author=user, id__in=task_ids).values_list("id", flat=True)
+        )
+        if not task_ids:
+            return [], []
+        tags = get_or_create_tags(user, names, using)
+        existing = set(
+            TaskTag.objects.using(using)
+            .filter(task_id__in=task_ids, tag__in=tags)
+            .values_list("task_id", "tag_id")
+        )
+        links = [
+            TaskTag(task_id=task_id, tag=tag, author=user)
+            for task_id in task_ids
+            for tag in tags
+            if (task_id, tag.id) not in existing
+        ]
+        _assign_ids(TaskTag, links)
+        TaskTag.objects.using(using).bulk_create(links, ignore_conflicts=True, batch_size=1000)
+    return tags, task_ids
+
+
+def untag_tasks(user, task_ids, names):
+    """Remove the tags ``names`` from the user's tasks ``task_ids``. Returns the links removed."""
+    using = shard_for_user(user, write=True)
+    removed, _ = TaskTag.objects.using(using).filter(
+        author=user, task_id__in=task_ids, tag__name__in=names
+    ).delete()
+    return removed
@@ -1,3 +1,441 @@
-from django.test import TestCase
+import threading
+from datetime import date, timedelta
+from io import StringIO
+from unittest import skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import sharding
+from .concurrency import VersionConflict
+from .hierarchy import SUBTASK_MAX_DEPTH, HierarchyError, depth, descendants, move_subtree
+from .models import Category, Task, User
+from .recurrence import expand
+from .ranking import RANK_MAX_LENGTH, RankError, move_task, rank_at, rank_between
+from .sharding import ShardRoutingError, reserve_ids, shard_for_user
+
+
+def run_concurrently(count, target):
+    """Run ``target(index)`` in ``count`` threads released together; returns the results by index."""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(index):
+        try:
+            barrier.wait()
+            results[index] = target(index)
+        finally:
+            connections.close_all()  # Each thread opened its own connections
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class OptimisticConcurrencyTests(TransactionTestCase):
+    # Rows must be committed for the other threads' connections to see them
+    databases = "__all__"  # Including the shards, when TASK_SHARDS has any
+    def setUp(self):
+        self.user = User.objects.create_user(email="editor@example.com", password="secret-pw-1")
+        self.category = Category.objects.create(name="Work", author=self.user)
+        self.task = Task.objects.create(
+            title="Draft", priority="low", category=self.category, author=self.user
+        )
+
+    def api_client(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client
+
+    def edit_task(self, client, version, **changes):
+        return client.post(
+            "/task/edit", {"id": self.task.id, **changes}, format="json", HTTP_IF_MATCH=f'"{version}"'
+        )
+
+    def test_edit_returns_new_version(self):
+        response = self.edit_task(self.api_client(), 1, title="Final")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], '"2"')
+        self.assertEqual(response.data["version"], 2)
+
+    def test_stale_edit_conflicts_with_current_state(self):
+        client = self.api_client()
+        self.edit_task(client, 1, title="First")
+        response = self.edit_task(client, 1, title="Second")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["current"]["title"], "First")
+        self.assertEqual(response["ETag"], '"2"')
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.title, self.task.version), ("First", 2))
+
+    def test_version_in_body(self):
+        client = self.api_client()
+        response = client.post(
+            "/task/edit", {"id": self.task.id, "title": "Stale", "version": 5}, format="json"
+        )
+        self.assertEqual(response.status_code, 409)
+        response = client.post(
+            "/task/edit", {"id": self.task.id, "title": "Fresh", "version": 1}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_malformed_if_match(self):
+        response = self.api_client().post(
+            "/task/edit", {"id": self.task.id, "title": "x"}, format="json", HTTP_IF_MATCH="three"
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_edit_without_version_still_bumps_it(self):
+        response = self.api_client().post("/task/edit", {"id": self.task.id, "title": "Blind"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.edit_task(self.api_client(), 1, title="Late").status_code, 409)
+
+    def test_category_conflict(self):
+        client = self.api_client()
+        edit = lambda name: client.post(
+            "/category/edit", {"id": self.category.id, "name": name}, format="json", HTTP_IF_MATCH='"1"'
+        )
+        self.assertEqual(edit("Home").status_code, 200)
+        response = edit("Office")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["current"]["name"], "Home")
+
+    def test_concurrent_edits_of_one_version(self):
+        writers = 8
+
+        def edit(index):
+            return self.edit_task(self.api_client(), 1, title=f"Writer {index}").status_code
+
+        statuses = run_concurrently(writers, edit)
+        self.assertEqual(sorted(statuses), [200] + [409] * (writers - 1))
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.version, 2)
+        self.assertEqual(self.task.title, f"Writer {statuses.index(200)}")
+
+    def test_concurrent_saves_of_loaded_instances(self):
+        writers = 8
+
+        def save(index):
+            task = Task.objects.for_user(self.user).get(pk=self.task.pk)
+            task.priority = "high"
+            try:
+                task.save()
+            except VersionConflict:
+                return False
+            return True
+
+        # All threads may load version 1 before any of them saves
+        saved = run_concurrently(writers, save)
+        self.task.refresh_from_db()
+        self.assertGreaterEqual(saved.count(True), 1)
+        self.assertEqual(self.task.version, 1 + saved.count(True))
+        self.assertEqual(self.task.priority_rank, 2)
+
+
+class TaskAnalyticsTests(TestCase):
+    databases = "__all__"
+    def setUp(self):
+        self.user = User.objects.create_user(email="planner@example.com", password="secret-pw-1")
+        self.category = Category.objects.create(name="Home", author=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_task(self, title, parent=None):
+        response = self.client.post(
+            "/task/create",
+            {"title": title, "priority": "low", "category": self.category.id, "author": self.user.id, "parent": parent},
+            format="json",
+        )
+        return response.data["id"]
+
+    def status_counts(self):
+        today = timezone.localdate()
+        response = self.client.get(f"/analytics/tasks?start={today}&end={today}")
+        return response.data["buckets"][0]["status_counts"]
+
+    def test_delete_counts_subtasks(self):
+        root = self.create_task("Move house")
+        child = self.create_task("Pack", parent=root)
+        self.create_task("Label boxes", parent=child)
+        self.assertEqual(self.status_counts().get("pending"), 3)
+
+        response = self.client.post("/task/delete", {"id": root}, format="json")
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Task.objects.for_user(self.user).exists())
+        self.assertEqual(self.status_counts().get("pending", 0), 0)
+
+
+class ProfilingMiddlewareTests(TestCase):
+    databases = "__all__"
+    def test_profile_header_with_inactive_users_token(self):
+        user = User.objects.create_user(email="gone@example.com", password="secret-pw-1")
+        token = str(RefreshToken.for_user(user).access_token)
+        user.is_active = False
+        user.save()
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        response = client.get("/category/read", HTTP_X_PROFILE="cpu")
+        self.assertEqual(response.status_code, 401)
+        self.assertNotIn("X-Profile-Id", response)
+
+
+@skipUnless(
+    settings.TASK_SHARDS == ["shard0", "shard1"],
+    "needs two shards, e.g. DB_SQLITE_DIR=/tmp/tm DB_SHARDS=task_master_0,task_master_1",
+)
+class ShardingTests(TestCase):
+    databases = {"default", *settings.TASK_SHARDS}
+
+    def setUp(self):
+        sharding._id_blocks.clear()  # Blocks reserved by other tests were rolled back
+
+    def user_on(self, shard):
+        # Ids are hashed onto the ring, so create users until one lands on `shard`
+        for index in range(100):
+            user = User.objects.create_user(email=f"{shard}-{index}@example.com", password="secret-pw-1")
+            if shard_for_user(user) == shard:
+                return user
+        self.fail(f"No user hashed to {shard}")
+
+    def add_task(self, user, title):
+        category = Category.objects.for_user(user).filter(name=f"Inbox {user.pk}").first()
+        if category is None:
+            category = Category.objects.create(name=f"Inbox {user.pk}", author=user)
+        return Task.objects.create(title=title, priority="low", category=category, author=user)
+
+    def test_rows_are_written_to_the_authors_shard(self):
+        user = self.user_on("shard1")
+        task = self.add_task(user, "Routed")
+        self.assertEqual(task._state.db, "shard1")
+        self.assertTrue(Task.objects.using("shard1").filter(pk=task.pk).exists())
+        self.assertFalse(Task.objects.using("shard0").filter(pk=task.pk).exists())
+        self.assertEqual(list(Task.objects.for_user(user).values_list("title", flat=True)), ["Routed"])
+
+    def test_unrouted_query_raises(self):
+        with self.assertRaises(ShardRoutingError):
+            list(Task.objects.filter(title="Anywhere"))
+
+    def test_ids_are_unique_across_shards(self):
+        first, second = self.user_on("shard0"), self.user_on("shard1")
+        ids = [self.add_task(user, f"Task {index}").pk for index in range(3) for user in (first, second)]
+        reserved = reserve_ids(Task, 5)
+        ids += [self.add_task(first, "After the reservation").pk]
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertFalse(set(ids) & set(reserved))
+
+    def test_reshard_user_round_trip(self):
+        user = self.user_on("shard0")
+        task = self.add_task(user, "Travelling")
+
+        call_command("reshard_user", user_id=user.pk, to="shard1", grace=0, stdout=StringIO())
+        user.refresh_from_db()
+        self.assertEqual((user.task_shard, user.task_shard_moving), ("shard1", False))
+        self.assertFalse(Task.objects.using("shard0").filter(author=user).exists())
+        moved = Task.objects.for_user(user).get()
+        self.assertEqual((moved.pk, moved.title, moved.category_id), (task.pk, task.title, task.category_id))
+
+        call_command("reshard_user", user_id=user.pk, to="shard0", grace=0, stdout=StringIO())
+        user.refresh_from_db()
+        self.assertEqual(shard_for_user(user), "shard0")
+        self.assertEqual(list(Task.objects.for_user(user).values_list("pk", flat=True)), [task.pk])
+        self.assertFalse(Category.objects.using("shard1").filter(author=user).exists())
+
+
+class RankBetweenTests(SimpleTestCase):
+    def test_prepend(self):
+        first = rank_at(0)
+        self.assertLess(rank_between(None, first), first)
+        # A key with a fraction is preceded by its integer part
+        self.assertEqual(rank_between(None, "a0i"), "a0")
+
+    def test_nothing_sorts_before_the_smallest_key(self):
+        with self.assertRaises(RankError):
+            rank_between(None, "a0")
+
+    def test_equal_neighbours(self):
+        with self.assertRaises(RankError):
+            rank_between(rank_at(3), rank_at(3))
+
+    def test_repeated_inserts_into_one_gap(self):
+        for insert_after_low in (True, False):
+            low, high = rank_at(0), rank_at(1)
+            inserts = 0
+            while True:
+                rank = rank_between(low, high)
+                self.assertTrue(low < rank < high, (low, rank, high))
+                self.assertFalse(rank.endswith("0"))
+                if len(rank) > RANK_MAX_LENGTH:
+                    break
+                inserts += 1
+                if insert_after_low:
+                    high = rank
+                else:
+                    low = rank
+            # Each insert lengthens the key by at most one digit
+            self.assertGreaterEqual(inserts, RANK_MAX_LENGTH - len(rank_at(0)))
+
+
+class MoveTaskTests(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="sorter@example.com", password="secret-pw-1")
+        self.category = Category.objects.create(name="Chores", author=self.user)
+        self.tasks = [
+            Task.objects.create(title=title, priority="low", category=self.category, author=self.user)
+            for title in ("Dishes", "Laundry", "Vacuum")
+        ]
+
+    def titles(self):
+        tasks = Task.objects.for_user(self.user).order_by("rank", "id")
+        return list(tasks.values_list("title", flat=True))
+
+    def test_equal_neighbours_rebalance_the_category(self):
+        dishes, laundry, vacuum = self.tasks
+        Task.objects.for_user(self.user).filter(pk__in=[dishes.pk, laundry.pk]).update(rank=rank_at(0))
+        dishes.refresh_from_db()
+        move_task(vacuum, after=dishes)
+        self.assertEqual(self.titles(), ["Dishes", "Vacuum", "Laundry"])
+        ranks = list(Task.objects.for_user(self.user).order_by("rank").values_list("rank", flat=True))
+        self.assertEqual(len(set(ranks)), 3)
+
+    def test_prepend_before_the_smallest_key_rebalances(self):
+        dishes, laundry, vacuum = self.tasks
+        Task.objects.for_user(self.user).filter(pk=dishes.pk).update(rank="a0")
+        move_task(vacuum)
+        self.assertEqual(self.titles(), ["Vacuum", "Dishes", "Laundry"])
+
+
+class ExpandTests(SimpleTestCase):
+    def test_month_end_is_clamped(self):
+        self.assertEqual(
+            expand("monthly", 1, date(2024, 1, 31), None, None, date(2024, 1, 1), date(2024, 5, 31)),
+            (date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30), date(2024, 5, 31)),
+        )
+
+    def test_window_starting_mid_schedule(self):
+        self.assertEqual(
+            expand("daily", 3, date(2026, 1, 1), None, None, date(2026, 1, 5), date(2026, 1, 12)),
+            (date(2026, 1, 7), date(2026, 1, 10)),
+        )
+        # The first date in the window is one moved to the end of a short month
+        self.assertEqual(
+            expand("monthly", 1, date(2026, 1, 31), None, None, date(2026, 2, 15), date(2026, 3, 31)),
+            (date(2026, 2, 28), date(2026, 3, 31)),
+        )
+
+    def test_count_and_until(self):
+        self.assertEqual(
+            expand("daily", 1, date(2026, 1, 1), None, 5, date(2026, 1, 3), date(2026, 1, 31)),
+            (date(2026, 1, 3), date(2026, 1, 4), date(2026, 1, 5)),
+        )
+        self.assertEqual(expand("monthly", 1, date(2026, 1, 1), None, 3, date(2026, 6, 1), date(2026, 12, 31)), ())
+        self.assertEqual(
+            expand("weekly", 1, date(2026, 1, 1), date(2026, 1, 20), None, date(2026, 1, 1), date(2026, 1, 31)),
+            (date(2026, 1, 1), date(2026, 1, 8), date(2026, 1, 15)),
+        )
+        self.assertEqual(expand("weekly", 1, date(2026, 3, 1), None, None, date(2026, 1, 1), date(2026, 2, 28)), ())
+
+    def test_matches_stepping_from_the_start(self):
+        def stepped(frequency, interval, start_date, until, count, window_start, window_end):
+            dates, index = [], 0
+            while count is None or index < count:
+                if frequency == "monthly":
+                    month = start_date.month - 1 + index * interval
+                    year, month = start_date.year + month // 12, month % 12 + 1
+                    last_day = (date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)).day
+                    day = date(year, month, min(start_date.day, last_day))
+                else:
+                    day = start_date + timedelta(days=index * interval * (7 if frequency == "weekly" else 1))
+                if day > window_end or (until is not None and day > until):
+                    break
+                if day >= window_start:
+                    dates.append(day)
+                index += 1
+            return tuple(dates)
+
+        start_date = date(2025, 1, 31)
+        for frequency in ("daily", "weekly", "monthly"):
+            for interval in (1, 2, 5):
+                for count in (None, 4, 40):
+                    for until in (None, date(2026, 2, 28)):
+                        for offset in (0, 27, 200, 400):
+                            window_start = start_date + timedelta(days=offset)
+                            args = (frequency, interval, start_date, until, count, window_start,
+                                    window_start + timedelta(days=120))
+                            self.assertEqual(expand(*args), stepped(*args), args)
+
+
+class MoveSubtreeTests(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="nester@example.com", password="secret-pw-1")
+        self.category = Category.objects.create(name="Project", author=self.user)
+        # A chain as deep as subtasks may go, and a task with one subtask
+        self.chain = [self.add_task("Level 0")]
+        for level in range(1, SUBTASK_MAX_DEPTH + 1):
+            self.chain.append(self.add_task(f"Level {level}", parent=self.chain[-1]))
+        self.root = self.add_task("Root")
+        self.child = self.add_task("Child", parent=self.root)
+
+    def add_task(self, title, parent=None):
+        return Task.objects.create(
+            title=title, priority="low", category=self.category, author=self.user, parent=parent
+        )
+
+    def test_move_to_the_deepest_allowed_level(self):
+        parent = self.chain[SUBTASK_MAX_DEPTH - 2]
+        self.assertEqual(move_subtree(self.root, parent), 2)
+        self.child.refresh_from_db()
+        self.assertEqual(depth(self.child.path), SUBTASK_MAX_DEPTH)
+        self.assertTrue(self.child.path.startswith(f"{parent.path}{parent.pk}/{self.root.pk}/"))
+        self.assertEqual(list(descendants(self.root)), [self.child])
+
+    def test_move_past_the_deepest_level(self):
+        with self.assertRaises(HierarchyError):
+            move_subtree(self.root, self.chain[SUBTASK_MAX_DEPTH - 1])
+        self.root.refresh_from_db()
+        self.child.refresh_from_db()
+        self.assertEqual((self.root.parent_id, self.root.path), (None, ""))
+        self.assertEqual(self.child.path, f"{self.root.pk}/")
+
+    def test_move_under_own_subtask(self):
+        with self.assertRaises(HierarchyError):
+            move_subtree(self.chain[0], self.chain[3])
+
+
+class ColumnarRendererTests(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="columns@example.com", password="secret-pw-1")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_empty_list_has_the_same_shape(self):
+        empty = self.client.get("/task/list?format=columnar&fields=id,title,status").json()
+        self.assertEqual(empty, {
+            "count": 0,
+            "fields": ["id", "title", "status"],
+            "columns": {"id": [], "title": [], "status": []},
+            "dictionaries": {"status": []},
+        })
+        page = self.client.get("/task/list?format=columnar&fields=id,title&limit=10").json()
+        self.assertEqual(page["count"], 0)
+        self.assertEqual(page["results"]["fields"], ["id", "title"])
+
+        category = Category.objects.create(name="Errands", author=self.user)
+        Task.objects.create(title="Post office", priority="low", category=category, author=self.user)
+        rows = self.client.get("/task/list?format=columnar&fields=id,title,status").json()
+        self.assertEqual(rows["fields"], empty["fields"])
+        self.assertEqual(rows["columns"]["title"], ["Post office"])
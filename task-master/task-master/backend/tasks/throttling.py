@@ -0,0 +1,90 @@
+import logging
+import math
+import threading
+
+import redis
+from django.conf import settings
+from rest_framework.throttling import ScopedRateThrottle
+
+logger = logging.getLogger(__name__)
+
+# Refills the bucket for the time since its last update and takes a token if
+# there is one, in one atomic step. Returns whether a token was taken and the
+# tokens left, as a string since Redis would truncate a Lua number.
+TAKE_TOKEN = """
+local capacity = tonumber(ARGV[1])
+local refill_per_second = tonumber(ARGV[2])
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated_at")
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * refill_per_second)
+if tokens < 1 then
+    return {0, tostring(tokens)}
+end
+redis.call("HSET", KEYS[1], "tokens", tokens - 1, "updated_at", now)
+redis.call("EXPIRE", KEYS[1], ARGV[3])
+return {1, tostring(tokens - 1)}
+"""
+
+_script = None
+_script_lock = threading.Lock()
+
+
+def _bucket_script():
+    global _script
+    with _script_lock:
+        if _script is None:
+            _script = redis.Redis.from_url(settings.REDIS_URL).register_script(TAKE_TOKEN)
+        return _script
+
+
+class TokenBucketThrottle(ScopedRateThrottle):
+    """
+    Token bucket per (scope, user or IP), using the view's ``throttle_scope``
+    and the rates in ``DEFAULT_THROTTLE_RATES``.
+
+    A rate of ``"10/min"`` means a bucket of 10 tokens refilled at 10 per
+    minute, so short bursts are allowed but the sustained rate is capped.
+    State is a two-field hash in the Redis at ``REDIS_URL``, shared by every
+    worker and host, and each check is one script run there: constant time,
+    and atomic, so concurrent requests never take the same token twice. If
+    Redis is unreachable requests are let through rather than failed.
+    """
+
+    cache_format = "throttle:%(scope)s:%(ident)s"
+
+    def __init__(self):
+        super().__init__()
+        self._wait = None
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        refill_per_second = self.num_requests / self.duration
+        try:
+            # An untouched bucket is full again after `duration`, so let it expire
+            taken, tokens = _bucket_script()(
+                keys=[self.key], args=[self.num_requests, refill_per_second, math.ceil(self.duration)]
+            )
+        except redis.RedisError:
+            logger.warning("Could not check the %s throttle", self.scope, exc_info=True)
+            return True
+
+        if not taken:
+            self._wait = (1 - float(tokens)) / refill_per_second
+            return False
+        return True
+
+    def wait(self):
+        # Whole seconds, rounded up, for the Retry-After header
+        return math.ceil(self._wait) if self._wait is not None else None
@@ -22,11 +22,45 @@ urlpatterns = [
     path("category/read", views.CategoryListView.as_view()),
     path("category/<int:category_id>/", views.CategoryDetailView.as_view()),
     path("category/<int:category_id>/tasks/", views.CategoryTasksView.as_view()),
+    path("category/<int:category_id>/history/", views.CategoryHistoryView.as_view()),
+
+    # Tag endpoints
+    path("tag/create", views.TagCreateView.as_view()),
+    path("tag/delete", views.TagDeleteView.as_view()),
+    path("tag/list", views.TagListView.as_view()),
+
+    # Recurring task endpoints
+    path("recurrence/create", views.RecurrenceCreateView.as_view()),
+    path("recurrence/edit", views.RecurrenceEditView.as_view()),
+    path("recurrence/delete", views.RecurrenceDeleteView.as_view()),
+    path("recurrence/list", views.RecurrenceListView.as_view()),
+    path("recurrence/occurrences", views.RecurrenceOccurrencesView.as_view()),
+    path("recurrence/materialize", views.RecurrenceMaterializeView.as_view()),
 
     # Task endpoints
     path("task/create", views.TaskCreateView.as_view()),
     path("task/edit", views.TaskEditView.as_view()),
+    path("task/list", views.TaskListView.as_view()),
     path("task/delete", views.TaskDeleteView.as_view()),
+    path("task/restore", views.TaskRestoreView.as_view()),
+    path("task/move", views.TaskMoveView.as_view()),
+    path("task/reparent", views.TaskReparentView.as_view()),
+    path("task/tag", views.TaskTagView.as_view()),
+    path("task/untag", views.TaskUntagView.as_view()),
     path("task/<int:id>", views.TaskDetailView.as_view()),
+    path("task/<int:id>/subtasks", views.TaskSubtasksView.as_view()),
+    path("task/<int:id>/progress", views.TaskProgressView.as_view()),
+    path("task/<int:id>/history", views.TaskHistoryView.as_view()),
     path('tasks/search/<str:search_term>/', views.TaskSearchView.as_view()),
+    path("tasks/suggest", views.TaskSuggestView.as_view()),
+    path("calendar/token", views.CalendarTokenView.as_view()),
+    path("calendar/token/revoke", views.CalendarTokenRevokeView.as_view()),
+    path("calendar/<str:token>.ics", views.CalendarFeedView.as_view()),
+
+    # Analytics endpoints
+    path("analytics/tasks", views.TaskAnalyticsView.as_view()),
+
+    # System endpoints
+    path("system/db-pool", views.DatabasePoolStatsView.as_view()),
+    path("batch", views.BatchView.as_view()),
 ]
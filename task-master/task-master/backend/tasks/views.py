@@ -1,18 +1,85 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework_simplejwt.tokens import RefreshToken
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.utils import OpenApiParameter
 from django.contrib.auth import authenticate
 from django.core.mail import send_mail
 from django.conf import settings
 from django.utils.crypto import get_random_string
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.db.models import Count
 from django.utils import timezone
 from datetime import timedelta
-from .serializers import UserSerializer, CategorySerializer, TaskSerializer
-from .models import User, Category, Task
+import os
+from .serializers import (
+    ActivityEntrySerializer, UserSerializer, CategorySerializer, RecurrenceRuleSerializer, TagSerializer,
+    TaskSerializer,
+)
+from .models import ActivityEntry, User, Category, RecurrenceRule, Tag, Task, ArchivedTask
 from rest_framework.generics import ListAPIView
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.settings import api_settings
+from .renderers import ColumnarJSONRenderer
+from .throttling import TokenBucketThrottle
+from .fieldsets import sparse_fields, only_fields
+from .filters import filter_tasks, TaskFilterError, TASK_ORDERINGS, DEFAULT_TASK_ORDERING
+from .archive import wants_archived, with_archived, restore_tasks
+from .batch import BatchError, parse_batch, run_batch
+from .ranking import move_task
+from .activity import record_create, record_delete, record_update, snapshot
+from .concurrency import VersionConflict, etag, requested_version
+from .coalescing import coalesced
+from .suggestions import SUGGEST_DEFAULT_LIMIT, SUGGEST_MAX_LIMIT, suggest
+from .feeds import (
+    CALENDAR_FUTURE_DAYS, CALENDAR_PAST_DAYS, COMPONENTS, FeedError, feed_tasks, parse_window, stream_feed, validators,
+)
+from .analytics import AnalyticsError, count_create, count_delete, count_update, parse_range, task_stats
+from .hierarchy import HierarchyError, descendants, move_subtree, subtree_progress
+from .recurrence import RecurrenceError, delete_rule, materialize, parse_day, window_occurrences
+from .tagging import (
+    BULK_TAG_MAX_TASKS, TAG_MATCHES, TAG_NAME_MAX_LENGTH, TagError, clean_tag_names, tag_tasks, untag_tasks,
+)
+from task_manager.db.pool import pool_stats
+from task_manager.lazy import extend_schema
+
+FIELDS_PARAMETER = OpenApiParameter(
+    "fields", str, description="Comma-separated list of fields to return, e.g. id,title,status"
+)
+INCLUDE_ARCHIVED_PARAMETER = OpenApiParameter(
+    "include_archived", bool, description="Also return completed tasks moved to the archive"
+)
+IF_MATCH_PARAMETER = OpenApiParameter(
+    "If-Match", str, location=OpenApiParameter.HEADER,
+    description="ETag of the version being edited; the edit fails with 409 if it changed since",
+)
+CONFLICT_RESPONSE = {
+    "type": "object",
+    "properties": {"error": {"type": "string"}, "current": {"type": "object"}},
+}
+
+
+def _version_conflict(instance, serializer_class):
+    """409 with the row as it is now, or 404 if it was deleted in the meantime."""
+    model = type(instance)
+    try:
+        current = model.objects.using(instance._state.db).get(pk=instance.pk)
+    except model.DoesNotExist:
+        return Response(
+            {"error": f"{model._meta.verbose_name.capitalize()} not found"}, status=status.HTTP_404_NOT_FOUND
+        )
+    return Response(
+        {
+            "error": f"This {model._meta.verbose_name} was changed since you loaded it; review and retry",
+            "current": serializer_class(current).data,
+        },
+        status=status.HTTP_409_CONFLICT,
+        headers={"ETag": etag(current)},
+    )
+
 
 class RefreshTokenView(APIView):
     permission_classes = []  # No authentication required
@@ -111,6 +178,8 @@ class CreateUserView(APIView):
 )
 class LoginView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = "login"
 
     def post(self, request):
         email = request.data.get("email")
@@ -199,6 +268,8 @@ class LogoutView(APIView):
 )
 class ForgotPasswordView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = "forgot_password"
 
     def post(self, request):
         email = request.data.get("email")
@@ -287,6 +358,8 @@ class ForgotPasswordView(APIView):
 )
 class ResetPasswordView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = "reset_password"
 
     def post(self, request):
         token = request.data.get("token")
@@ -402,17 +475,21 @@ class CategoryCreateView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        serializer = CategorySerializer(data=request.data)
+        serializer = CategorySerializer(data=request.data, context={"request": request})
         if serializer.is_valid():
             # Set the author as the current logged-in user
-            serializer.save(author=request.user)
+            record_create(serializer.save(author=request.user))
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 @extend_schema(
     tags=["Category"],
-    description="Edit an existing category",
+    description=(
+        "Edit an existing category. Pass the version you loaded as If-Match (or `version`) "
+        "to fail with 409 instead of overwriting someone else's edit"
+    ),
+    parameters=[IF_MATCH_PARAMETER],
     request={
         "application/json": {
             "type": "object",
@@ -420,6 +497,7 @@ class CategoryCreateView(APIView):
                 "id": {"type": "integer"},
                 "name": {"type": "string"},
                 "description": {"type": "string", "nullable": True},
+                "version": {"type": "integer"},
             },
             "required": ["id"],
         }
@@ -427,6 +505,7 @@ class CategoryCreateView(APIView):
     responses={
         200: CategorySerializer,
         404: {"type": "object", "properties": {"error": {"type": "string"}}},
+        409: CONFLICT_RESPONSE,
     },
 )
 
@@ -434,15 +513,26 @@ class CategoryEditView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
+        try:
+            version = requested_version(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         try:
             # Only allow editing if the user is the author
-            category = Category.objects.get(
-                id=request.data.get("id"), author=request.user
+            category = Category.objects.for_user(request.user).get(id=request.data.get("id"))
+            if version is not None:
+                category.version = version  # The UPDATE only matches this version
+            before = snapshot(category)
+            serializer = CategorySerializer(
+                category, data=request.data, partial=True, context={"request": request}
             )
-            serializer = CategorySerializer(category, data=request.data, partial=True)
             if serializer.is_valid():
-                serializer.save()
-                return Response(serializer.data)
+                try:
+                    category = serializer.save()
+                except VersionConflict:
+                    return _version_conflict(category, CategorySerializer)
+                record_update(category, before)
+                return Response(serializer.data, headers={"ETag": etag(category)})
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Category.DoesNotExist:
             return Response(
@@ -454,6 +544,7 @@ class CategoryEditView(APIView):
 @extend_schema(
     tags=["Category"],
     description="Get a single category by ID",
+    parameters=[FIELDS_PARAMETER],
     responses={
         200: CategorySerializer,
         404: {"type": "object", "properties": {"error": {"type": "string"}}},
@@ -463,9 +554,14 @@ class CategoryDetailView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, category_id):
+        fields, error = sparse_fields(request, CategorySerializer.Meta.fields)
+        if error:
+            return error
         try:
-            category = Category.objects.get(id=category_id, author=request.user)
-            return Response(CategorySerializer(category).data)
+            category = only_fields(
+                Category.objects.for_user(request.user), fields, related=("author",), extra=("version",)
+            ).get(id=category_id)
+            return Response(CategorySerializer(category, fields=fields).data, headers={"ETag": etag(category)})
         except Category.DoesNotExist:
             return Response(
                 {"error": "Category not found or you don't have permission"},
@@ -476,6 +572,7 @@ class CategoryDetailView(APIView):
 @extend_schema(
     tags=["Category"],
     description="Get all tasks for a category",
+    parameters=[FIELDS_PARAMETER, INCLUDE_ARCHIVED_PARAMETER],
     responses={
         200: TaskSerializer(many=True),
         404: {"type": "object", "properties": {"error": {"type": "string"}}},
@@ -484,12 +581,25 @@ class CategoryDetailView(APIView):
 
 class CategoryTasksView(APIView):
     permission_classes = [IsAuthenticated]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer]  # Allow ?format=columnar
 
+    @coalesced
     def get(self, request, category_id):
+        fields, error = sparse_fields(request, TaskSerializer.Meta.fields)
+        if error:
+            return error
         try:
-            category = Category.objects.get(id=category_id, author=request.user)
-            tasks = Task.objects.filter(category=category, author=request.user)
-            return Response(TaskSerializer(tasks, many=True).data)
+            category = Category.objects.for_user(request.user).only("id").get(id=category_id)
+            # In the user's manual order, read from the (category, rank) index
+            tasks = only_fields(
+                Task.objects.for_user(request.user).filter(category=category).order_by("rank", "id"),
+                fields,
+                related=("tags",),
+            )
+            if wants_archived(request):
+                archived = ArchivedTask.objects.for_user(request.user).filter(category=category)
+                tasks = with_archived(tasks, only_fields(archived, fields, related=("tags",)))
+            return Response(TaskSerializer(tasks, many=True, fields=fields).data)
         except Category.DoesNotExist:
             return Response(
                 {"error": "Category not found or you don't have permission"},
@@ -499,6 +609,7 @@ class CategoryTasksView(APIView):
 @extend_schema(
     tags=["Category"],
     description="Retrieve all categories for the authenticated user",
+    parameters=[FIELDS_PARAMETER],
     responses={
         200: CategorySerializer(many=True),
         401: {"type": "object", "properties": {"detail": {"type": "string"}}},
@@ -507,12 +618,26 @@ class CategoryTasksView(APIView):
 class CategoryListView(ListAPIView):
     serializer_class = CategorySerializer  # Define the serializer
     permission_classes = [IsAuthenticated]  # Enforce authentication
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer]  # Allow ?format=columnar
+    fields = None  # Set from ?fields= in list()
+
+    @coalesced
+    def list(self, request, *args, **kwargs):
+        self.fields, error = sparse_fields(request, CategorySerializer.Meta.fields)
+        if error:
+            return error
+        return super().list(request, *args, **kwargs)
 
     def get_queryset(self):
         """
         Return only the categories belonging to the authenticated user.
         """
-        return Category.objects.filter(author=self.request.user)  # Filter by user
+        queryset = Category.objects.for_user(self.request.user)  # Filter by user
+        return only_fields(queryset, self.fields, related=("author",))
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs["fields"] = self.fields
+        return super().get_serializer(*args, **kwargs)
 
 @extend_schema(
     tags=["Category"],
@@ -535,9 +660,11 @@ class CategoryDeleteView(APIView):
     def post(self, request):
         try:
             # Only allow deletion if the user is the author
-            category = Category.objects.get(
-                id=request.data.get("id"), author=request.user
-            )
+            category = Category.objects.for_user(request.user).get(id=request.data.get("id"))
+            record_delete(category)
+            # The delete cascades to the category's tasks, which are logged as deleted too
+            for task in Task.objects.for_user(request.user).filter(category=category).iterator():
+                record_delete(task)
             category.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Category.DoesNotExist:
@@ -575,16 +702,22 @@ class TaskCreateView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        serializer = TaskSerializer(data=request.data)
+        serializer = TaskSerializer(data=request.data, context={"request": request})
         if serializer.is_valid():
-            serializer.save(author=request.user)
+            task = serializer.save(author=request.user)
+            record_create(task)
+            count_create(task)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 @extend_schema(
     tags=["Task"],
-    description="Edit an existing task",
+    description=(
+        "Edit an existing task. Pass the version you loaded as If-Match (or `version`) "
+        "to fail with 409 instead of overwriting someone else's edit"
+    ),
+    parameters=[IF_MATCH_PARAMETER],
     request={
         "application/json": {
             "type": "object",
@@ -599,6 +732,7 @@ class TaskCreateView(APIView):
                     "enum": ["pending", "inprogress", "completed"],
                 },
                 "category_id": {"type": "integer"},
+                "version": {"type": "integer"},
             },
             "required": ["id"],
         }
@@ -606,6 +740,7 @@ class TaskCreateView(APIView):
     responses={
         200: TaskSerializer,
         404: {"type": "object", "properties": {"error": {"type": "string"}}},
+        409: CONFLICT_RESPONSE,
     },
 )
 
@@ -614,20 +749,34 @@ class TaskEditView(APIView):
 
     def post(self, request):
         try:
-            task = Task.objects.get(id=request.data.get("id"))
+            version = requested_version(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            task = Task.objects.on_shard_of(request.user).get(id=request.data.get("id"))
 
             # Check if the authenticated user is the author of the task
-            if task.author != request.user:
+            if task.author_id != request.user.id:
                 return Response(
                     {"error": "You are not authorized to edit this task."},
                     status=status.HTTP_403_FORBIDDEN,
                 )
 
             # Proceed with task update
-            serializer = TaskSerializer(task, data=request.data, partial=True)
+            if version is not None:
+                task.version = version  # The UPDATE only matches this version
+            before = snapshot(task)
+            serializer = TaskSerializer(
+                task, data=request.data, partial=True, context={"request": request}
+            )
             if serializer.is_valid():
-                serializer.save()
-                return Response(serializer.data)
+                try:
+                    task = serializer.save()
+                except VersionConflict:
+                    return _version_conflict(task, TaskSerializer)
+                record_update(task, before)
+                count_update(task, before)
+                return Response(serializer.data, headers={"ETag": etag(task)})
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Task.DoesNotExist:
             return Response(
@@ -656,7 +805,12 @@ class TaskDeleteView(APIView):
 
     def post(self, request):
         try:
-            task = Task.objects.get(id=request.data.get("id"))
+            task = Task.objects.for_user(request.user).get(id=request.data.get("id"))
+            record_delete(task)
+            # The delete cascades to the subtasks, which are logged as deleted too
+            for subtask in descendants(task).iterator():
+                record_delete(subtask)
+            count_delete(task)
             task.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Task.DoesNotExist:
@@ -665,9 +819,735 @@ class TaskDeleteView(APIView):
             )
 
 
+@extend_schema(
+    tags=["Task"],
+    description="Move archived tasks back into the active task list",
+    request={
+        "application/json": {
+            "type": "object",
+            "properties": {
+                "ids": {"type": "array", "items": {"type": "integer"}},
+            },
+            "required": ["ids"],
+        }
+    },
+    responses={
+        200: {"type": "object", "properties": {"restored": {"type": "integer"}}},
+        400: {"type": "object", "properties": {"error": {"type": "string"}}},
+        404: {"type": "object", "properties": {"error": {"type": "string"}}},
+    },
+)
+class TaskRestoreView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        ids = request.data.get("ids")
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, int) for i in ids):
+            return Response(
+                {"error": "ids must be a non-empty list of task ids"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        restored = restore_tasks(ArchivedTask.objects.for_user(request.user).filter(id__in=ids))
+        if not restored:
+            return Response(
+                {"error": "No archived tasks found"}, status=status.HTTP_404_NOT_FOUND
+            )
+        return Response({"restored": restored}, status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    tags=["Task"],
+    description=(
+        "Move a task within its category: it is placed right after the task `after`, "
+        "or first when `after` is null"
+    ),
+    request={
+        "application/json": {
+            "type": "object",
+            "properties": {
+                "id": {"type": "integer"},
+                "after": {"type": "integer", "nullable": True},
+            },
+            "required": ["id"],
+        }
+    },
+    responses={
+        200: {
+            "type": "object",
+            "properties": {"id": {"type": "integer"}, "rank": {"type": "string"}},
+        },
+        400: {"type": "object", "properties": {"error": {"type": "string"}}},
+        404: {"type": "object", "properties": {"error": {"type": "string"}}},
+    },
+)
+class TaskMoveView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        task_id = request.data.get("id")
+        after_id = request.data.get("after")
+        if not isinstance(task_id, int) or not (after_id is None or isinstance(after_id, int)):
+            return Response(
+                {"error": "id must be a task id and after a task id or null"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if after_id == task_id:
+            return Response(
+                {"error": "A task cannot be moved after itself"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        tasks = Task.objects.for_user(request.user).only("id", "category_id", "rank", "author_id")
+        try:
+            task = tasks.get(id=task_id)
+            after = tasks.get(id=after_id) if after_id is not None else None
+        except Task.DoesNotExist:
+            return Response({"error": "Task not found"}, status=status.HTTP_404_NOT_FOUND)
+        if after is not None and after.category_id != task.category_id:
+            return Response(
+                {"error": "Tasks can only be moved within their category"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        rank = move_task(task, after)
+        return Response({"id": task.id, "rank": rank}, status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    tags=["Task"],
+    description=(
+        "Make a task a subtask of `parent` (in the same category), or a top-level task "
+        "when `parent` is null. Its subtasks move along with it"
+    ),
+    request={
+        "application/json": {
+            "type": "object",
+            "properties": {
+                "id": {"type": "integer"},
+                "parent": {"type": "integer", "nullable": True},
+            },
+            "required": ["id"],
+        }
+    },
+    responses={
+        200: {
+            "type": "object",
+            "properties": {
+                "id": {"type": "integer"},
+                "parent": {"type": "integer", "nullable": True},
+                "moved": {"type": "integer"},
+            },
+        },
+        400: {"type": "object", "properties": {"error": {"type": "string"}}},
+        404: {"type": "object", "properties": {"error": {"type": "string"}}},
+    },
+)
+class TaskReparentView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        task_id = request.data.get("id")
+        parent_id = request.data.get("parent")
+        if not isinstance(task_id, int) or not (parent_id is None or isinstance(parent_id, int)):
+            return Response(
+                {"error": "id must be a task id and parent a task id or null"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        tasks = Task.objects.for_user(request.user).only("id", "category_id", "parent_id", "path", "author_id")
+        try:
+            task = tasks.get(id=task_id)
+            parent = tasks.get(id=parent_id) if parent_id is not None else None
+        except Task.DoesNotExist:
+            return Response({"error": "Task not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            moved = move_subtree(task, parent)
+        except HierarchyError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"id": task.id, "parent": parent_id, "moved": moved}, status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    tags=["Task"],
+    description=(
+        "All subtasks of a task at any depth, grouped by parent and in their manual "
+        "order within each group. Rebuild the tree from `parent`"
+    ),
+    parameters=[FIELDS_PARAMETER],
+    responses={
+        200: TaskSerializer(many=True),
+        404: {"type": "object", "properties": {"error": {"type": "string"}}},
+    },
+)
+class TaskSubtasksView(APIView):
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer]  # Allow ?format=columnar
+
+    def get(self, request, id):
+        fields, error = sparse_fields(request, TaskSerializer.Meta.fields)
+        if error:
+            return error
+        try:
+            task = Task.objects.for_user(request.user).only("id", "path", "author_id").get(id=id)
+        except Task.DoesNotExist:
+            return Response({"error": "Task not found"}, status=status.HTTP_404_NOT_FOUND)
+        # One range scan of the (author, path) index
+        subtasks = only_fields(descendants(task).order_by("path", "rank", "id"), fields, related=("tags",))
+        return Response(TaskSerializer(subtasks, many=True, fields=fields).data)
+
+
+@extend_schema(
+    tags=["Task"],
+    description="Completion of a task's subtasks at any depth",
+    responses={
+        200: {
+            "type": "object",
+            "properties": {
+                "id": {"type": "integer"},
+                "total": {"type": "integer"},
+                "pending": {"type": "integer"},
+                "inprogress": {"type": "integer"},
+                "completed": {"type": "integer"},
+                "percent_complete": {"type": "number", "nullable": True},
+            },
+        },
+        404: {"type": "object", "properties": {"error": {"type": "string"}}},
+    },
+)
+class TaskProgressView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, id):
+        try:
+            task = Task.objects.for_user(request.user).only("id", "path", "author_id").get(id=id)
+        except Task.DoesNotExist:
+            return Response({"error": "Task not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"id": task.id, **subtree_progress(task)}, status=status.HTTP_200_OK)
+
+
+TAG_BULK_REQUEST = {
+    "application/json": {
+        "type": "object",
+        "properties": {
+            "ids": {"type": "array", "items": {"type": "integer"}},
+            "tags": {"type": "array", "items": {"type": "string"}},
+        },
+        "required": ["ids", "tags"],
+    }
+}
+
+
+def _bulk_tag_arguments(request):
+    """Task ids and tag names of a task/tag or task/untag request, or a 400 response."""
+    ids = request.data.get("ids")
+    if not isinstance(ids, list) or not ids or not all(isinstance(i, int) for i in ids):
+        return None, None, Response(
+            {"error": "ids must be a non-empty list of task ids"}, status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(ids) > BULK_TAG_MAX_TASKS:
+        return None, None, Response(
+            {"error": f"At most {BULK_TAG_MAX_TASKS} tasks per request"}, status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        names = clean_tag_names(request.data.get("tags"))
+    except TagError as e:
+        return None, None, Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return ids, names, None
+
+
+@extend_schema(
+    tags=["Task"],
+    description="Add tags to several tasks at once. Tags that do not exist yet are created",
+    request=TAG_BULK_REQUEST,
+    responses={
+        200: {
+            "type": "object",
+            "properties": {
+                "tags": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {"id": {"type": "integer"}, "name": {"type": "string"}},
+                    },
+                },
+                "tagged": {"type": "integer"},
+            },
+        },
+        400: {"type": "object", "properties": {"error": {"type": "string"}}},
+        404: {"type": "object", "properties": {"error": {"type": "string"}}},
+    },
+)
+class TaskTagView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        ids, names, error = _bulk_tag_arguments(request)
+        if error:
+            return error
+        tags, task_ids = tag_tasks(request.user, ids, names)
+        if not task_ids:
+            return Response({"error": "No tasks found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(
+            {"tags": TagSerializer(tags, many=True).data, "tagged": len(task_ids)},
+            status=status.HTTP_200_OK,
+        )
+
+
+@extend_schema(
+    tags=["Task"],
+    description="Remove tags from several tasks at once",
+    request=TAG_BULK_REQUEST,
+    responses={
+        200: {"type": "object", "properties": {"untagged": {"type": "integer"}}},
+        400: {"type": "object", "properties": {"error": {"type": "string"}}},
+    },
+)
+class TaskUntagView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        ids, names, error = _bulk_tag_arguments(request)
+        if error:
+            return error
+        return Response({"untagged": untag_tasks(request.user, ids, names)}, status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    tags=["Tag"],
+    description="List the authenticated user's tags with the number of live tasks carrying each",
+    responses={200: TagSerializer(many=True)},
+)
+class TagListView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        tags = Tag.objects.for_user(request.user).annotate(task_count=Count("tasks")).order_by("name")
+        return Response(TagSerializer(tags, many=True).data)
+
+
+@extend_schema(
+    tags=["Tag"],
+    description="Create a tag",
+    request={
+        "application/json": {
+            "type": "object",
+            "properties": {"name": {"type": "string"}},
+            "required": ["name"],
+        }
+    },
+    responses={
+        201: TagSerializer,
+        400: {"type": "object", "properties": {"error": {"type": "string"}}},
+    },
+)
+class TagCreateView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            (name,) = clean_tag_names([request.data.get("name")])
+        except TagError:
+            return Response(
+                {"error": f"name must be a tag name of 1 to {TAG_NAME_MAX_LENGTH} characters"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if Tag.objects.for_user(request.user).filter(name=name).exists():
+            return Response(
+                {"error": "A tag with this name already exists"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        tag = Tag.objects.create(name=name, author=request.user)
+        return Response(TagSerializer(tag).data, status=status.HTTP_201_CREATED)
+
+
+@extend_schema(
+    tags=["Tag"],
+    description="Delete a tag, removing it from every task",
+    request={
+        "application/json": {
+            "type": "object",
+            "properties": {"id": {"type": "integer"}},
+            "required": ["id"],
+        }
+    },
+    responses={
+        204: None,
+        404: {"type": "object", "properties": {"error": {"type": "string"}}},
+    },
+)
+class TagDeleteView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            tag = Tag.objects.for_user(request.user).get(id=request.data.get("id"))
+        except (Tag.DoesNotExist, ValueError, TypeError):
+            return Response({"error": "Tag not found"}, status=status.HTTP_404_NOT_FOUND)
+        tag.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@extend_schema(
+    tags=["Recurrence"],
+    description=(
+        "Create a recurring task: a template repeated daily, weekly or monthly from `start_date`, "
+        "every `interval` days, weeks or months, until `until` and/or for `count` occurrences"
+    ),
+    request=RecurrenceRuleSerializer,
+    responses={
+        201: RecurrenceRuleSerializer,
+        400: {"type": "object", "properties": {"error": {"type": "string"}}},
+    },
+)
+class RecurrenceCreateView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = RecurrenceRuleSerializer(data=request.data, context={"request": request})
+        if serializer.is_valid():
+            serializer.save(author=request.user)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@extend_schema(
+    tags=["Recurrence"],
+    description=(
+        "Edit a recurring task. Occurrences not acted on yet follow the new schedule; "
+        "tasks already created for occurrences are left as they are"
+    ),
+    request=RecurrenceRuleSerializer,
+    responses={
+        200: RecurrenceRuleSerializer,
+        404: {"type": "object", "properties": {"error": {"type": "string"}}},
+    },
+)
+class RecurrenceEditView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            rule = RecurrenceRule.objects.for_user(request.user).get(id=request.data.get("id"))
+        except (RecurrenceRule.DoesNotExist, ValueError, TypeError):
+            return Response({"error": "Recurring task not found"}, status=status.HTTP_404_NOT_FOUND)
+        serializer = RecurrenceRuleSerializer(rule, data=request.data, partial=True, context={"request": request})
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@extend_schema(
+    tags=["Recurrence"],
+    description="Delete a recurring task. Tasks already created for its occurrences are kept",
+    request={
+        "application/json": {
+            "type": "object",
+            "properties": {"id": {"type": "integer"}},
+            "required": ["id"],
+        }
+    },
+    responses={
+        204: None,
+        404: {"type": "object", "properties": {"error": {"type": "string"}}},
+    },
+)
+class RecurrenceDeleteView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            rule = RecurrenceRule.objects.for_user(request.user).get(id=request.data.get("id"))
+        except (RecurrenceRule.DoesNotExist, ValueError, TypeError):
+            return Response({"error": "Recurring task not found"}, status=status.HTTP_404_NOT_FOUND)
+        delete_rule(rule)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@extend_schema(
+    tags=["Recurrence"],
+    description="List the user's recurring tasks",
+    responses={200: RecurrenceRuleSerializer(many=True)},
+)
+class RecurrenceListView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        rules = RecurrenceRule.objects.for_user(request.user).order_by("start_date", "id")
+        return Response(RecurrenceRuleSerializer(rules, many=True).data)
+
+
+@extend_schema(
+    tags=["Recurrence"],
+    description=(
+        "Occurrences of the user's recurring tasks between `start` and `end` (inclusive, "
+        "today and 30 days later by default), by date. `task` is the id of the task created "
+        "for an occurrence, or null if it has not been acted on"
+    ),
+    parameters=[
+        OpenApiParameter("start", str, description="First day, YYYY-MM-DD"),
+        OpenApiParameter("end", str, description="Last day, YYYY-MM-DD"),
+    ],
+    responses={
+        200: {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "recurrence": {"type": "integer"},
+                    "date": {"type": "string", "format": "date"},
+                    "title": {"type": "string"},
+                    "priority": {"type": "string"},
+                    "category": {"type": "integer"},
+                    "task": {"type": "integer", "nullable": True},
+                },
+            },
+        },
+        400: {"type": "object", "properties": {"error": {"type": "string"}}},
+    },
+)
+class RecurrenceOccurrencesView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            start = parse_day(request.query_params.get("start", timezone.localdate().isoformat()), "start")
+            end = parse_day(request.query_params.get("end", (start + timedelta(days=30)).isoformat()), "end")
+            occurrences = window_occurrences(request.user, start, end)
+        except RecurrenceError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(occurrences)
+
+
+@extend_schema(
+    tags=["Recurrence"],
+    description=(
+        "Create the task of one occurrence of a recurring task from its template, to edit, "
+        "complete or tag it like any other task. Returns the existing task if there is one"
+    ),
+    request={
+        "application/json": {
+            "type": "object",
+            "properties": {
+                "recurrence": {"type": "integer"},
+                "date": {"type": "string", "format": "date"},
+            },
+            "required": ["recurrence", "date"],
+        }
+    },
+    responses={
+        200: TaskSerializer,
+        201: TaskSerializer,
+        400: {"type": "object", "properties": {"error": {"type": "string"}}},
+        404: {"type": "object", "properties": {"error": {"type": "string"}}},
+    },
+)
+class RecurrenceMaterializeView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            rule = RecurrenceRule.objects.for_user(request.user).get(id=request.data.get("recurrence"))
+        except (RecurrenceRule.DoesNotExist, ValueError, TypeError):
+            return Response({"error": "Recurring task not found"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            task, created = materialize(rule, parse_day(request.data.get("date"), "date"))
+        except RecurrenceError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if created:
+            record_create(task)
+            count_create(task)
+        return Response(
+            TaskSerializer(task).data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+
+@extend_schema(
+    tags=["Analytics"],
+    description=(
+        "Tasks created and completed per day, week or month between `start` and `end` "
+        "(inclusive, the last 30 days by default), with the number of tasks in each status "
+        "at the end of every bucket. Read from daily rollups, so any range is fast"
+    ),
+    parameters=[
+        OpenApiParameter("start", str, description="First day, YYYY-MM-DD"),
+        OpenApiParameter("end", str, description="Last day, YYYY-MM-DD"),
+        OpenApiParameter("interval", str, enum=["day", "week", "month"], description="Bucket size"),
+        OpenApiParameter("category", int, description="Only count this category's tasks"),
+    ],
+    responses={
+        200: {
+            "type": "object",
+            "properties": {
+                "interval": {"type": "string"},
+                "totals": {
+                    "type": "object",
+                    "properties": {"created": {"type": "integer"}, "completed": {"type": "integer"}},
+                },
+                "buckets": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "date": {"type": "string", "format": "date"},
+                            "created": {"type": "integer"},
+                            "completed": {"type": "integer"},
+                            "status_counts": {
+                                "type": "object", "additionalProperties": {"type": "integer"},
+                            },
+                            "completion_rate": {"type": "number", "nullable": True},
+                        },
+                    },
+                },
+            },
+        },
+        400: {"type": "object", "properties": {"error": {"type": "string"}}},
+    },
+)
+class TaskAnalyticsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        category = request.query_params.get("category")
+        if category is not None and not category.isdigit():
+            return Response({"error": "category must be a category id"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            start, end = parse_range(request.query_params)
+            stats = task_stats(
+                request.user, start, end,
+                interval=request.query_params.get("interval", "day"),
+                category_id=int(category) if category is not None else None,
+            )
+        except AnalyticsError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(stats)
+
+
+class ActivityPagination(CursorPagination):
+    ordering = "-id"  # Newest first; a cursor stays valid while new entries are added
+    page_size = 50
+    page_size_query_param = "limit"
+    max_page_size = 200
+
+
+class ActivityHistoryView(ListAPIView):
+    serializer_class = ActivityEntrySerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = ActivityPagination
+    object_type = None
+    lookup_url_kwarg = None
+
+    def get_queryset(self):
+        # Read from the (author, object_type, object_id, id) index; entries
+        # outlive the object, so deleted ones keep their history
+        return ActivityEntry.objects.for_user(self.request.user).filter(
+            object_type=self.object_type, object_id=self.kwargs[self.lookup_url_kwarg]
+        )
+
+
+@extend_schema(
+    tags=["Task"],
+    description=(
+        "Change history of a task, newest first: each entry lists the fields that changed "
+        "as [old, new]. Follow `next` for older entries"
+    ),
+)
+class TaskHistoryView(ActivityHistoryView):
+    object_type = "task"
+    lookup_url_kwarg = "id"
+
+
+@extend_schema(
+    tags=["Category"],
+    description="Change history of a category, newest first. Follow `next` for older entries",
+)
+class CategoryHistoryView(ActivityHistoryView):
+    object_type = "category"
+    lookup_url_kwarg = "category_id"
+
+
+class TaskListPagination(LimitOffsetPagination):
+    default_limit = None  # Unpaginated unless the client sends ?limit=
+    max_limit = 500
+
+
+@extend_schema(
+    tags=["Task"],
+    description="List the authenticated user's tasks, filtered and sorted in the database",
+    parameters=[
+        OpenApiParameter("status", str, description="Comma-separated statuses, e.g. pending,inprogress"),
+        OpenApiParameter("priority", str, description="Comma-separated priorities, e.g. high,medium"),
+        OpenApiParameter("category", int, description="Category id"),
+        OpenApiParameter("due_after", str, description="Only tasks due on or after this date (YYYY-MM-DD)"),
+        OpenApiParameter("due_before", str, description="Only tasks due on or before this date (YYYY-MM-DD)"),
+        OpenApiParameter("tags", str, description="Comma-separated tag ids, e.g. 3,7"),
+        OpenApiParameter("tags_match", str, enum=list(TAG_MATCHES), description="Tasks with all (default) or any of the tags"),
+        OpenApiParameter("ordering", str, enum=list(TASK_ORDERINGS), description="Sort order, defaults to due_date"),
+        FIELDS_PARAMETER,
+        INCLUDE_ARCHIVED_PARAMETER,
+    ],
+    responses={
+        200: TaskSerializer(many=True),
+        400: {"type": "object", "properties": {"error": {"type": "string"}}},
+    },
+)
+class TaskListView(ListAPIView):
+    serializer_class = TaskSerializer
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer]  # Allow ?format=columnar
+    pagination_class = TaskListPagination
+    fields = None  # Set from ?fields= in list()
+
+    def list(self, request, *args, **kwargs):
+        self.fields, error = sparse_fields(request, TaskSerializer.Meta.fields)
+        if error:
+            return error
+        try:
+            return super().list(request, *args, **kwargs)
+        except TaskFilterError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    def get_queryset(self):
+        params = self.request.query_params
+        queryset = filter_tasks(Task.objects.for_user(self.request.user), params)
+        if not wants_archived(self.request):
+            return only_fields(queryset, self.fields, related=("tags",))
+
+        # The two tables are merged row by row, so both must load the sort columns
+        ordering = params.get("ordering") or DEFAULT_TASK_ORDERING
+        sort_columns = [column.lstrip("-") for column in TASK_ORDERINGS[ordering]]
+        archived = filter_tasks(ArchivedTask.objects.for_user(self.request.user), params)
+        return with_archived(
+            only_fields(queryset, self.fields, related=("tags",), extra=sort_columns),
+            only_fields(archived, self.fields, related=("tags",), extra=sort_columns),
+            ordering=ordering,
+        )
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs["fields"] = self.fields
+        return super().get_serializer(*args, **kwargs)
+
+
+# Fields returned by TaskDetailView, mapped to the model fields they are read from
+TASK_DETAIL_FIELDS = {
+    "id": "id",
+    "title": "title",
+    "description": "description",
+    "due_date": "due_date",
+    "priority": "priority",
+    "status": "status",
+    "category_id": "category",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+    "version": "version",
+}
+
+
 @extend_schema(
     tags=["Task"],
     description="Retrieve a single task by ID (user-specific)",
+    parameters=[FIELDS_PARAMETER, INCLUDE_ARCHIVED_PARAMETER],
     request=None,  # No request body is needed
     responses={
         200: {
@@ -682,6 +1562,7 @@ class TaskDeleteView(APIView):
                 "category_id": {"type": "integer"},
                 "created_at": {"type": "string", "format": "date-time"},
                 "updated_at": {"type": "string", "format": "date-time"},
+                "version": {"type": "integer"},
             },
         },
         404: {"type": "object", "properties": {"error": {"type": "string"}}},
@@ -693,16 +1574,35 @@ class TaskDetailView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, id):
+        fields, error = sparse_fields(request, TASK_DETAIL_FIELDS)
+        if error:
+            return error
         try:
-            task = Task.objects.get(id=id)
+            model_fields = None
+            if fields is not None:
+                model_fields = [TASK_DETAIL_FIELDS[name] for name in fields]
+            try:
+                task = only_fields(
+                    Task.objects.on_shard_of(request.user), model_fields, extra=("author", "version")
+                ).get(id=id)
+            except Task.DoesNotExist:
+                if not wants_archived(request):
+                    raise
+                task = only_fields(
+                    ArchivedTask.objects.on_shard_of(request.user), model_fields, extra=("author", "version")
+                ).get(id=id)
             
             # Check if the task belongs to the authenticated user
-            if task.author != request.user:
+            if task.author_id != request.user.id:
                 return Response(
                     {"error": "You do not have permission to view this task"},
                     status=status.HTTP_403_FORBIDDEN
                 )
             
+            if fields is not None:
+                task_data = {name: getattr(task, name) for name in fields}
+                return Response(task_data, status=status.HTTP_200_OK, headers={"ETag": etag(task)})
+
             task_data = {
                 "id": task.id,
                 "title": task.title,
@@ -713,11 +1613,12 @@ class TaskDetailView(APIView):
                 "category_id": task.category_id,  # assuming this is an integer field referring to a category
                 "created_at": task.created_at,
                 "updated_at": task.updated_at,
+                "version": task.version,
             }
 
-            return Response(task_data, status=status.HTTP_200_OK)
+            return Response(task_data, status=status.HTTP_200_OK, headers={"ETag": etag(task)})
         
-        except Task.DoesNotExist:
+        except (Task.DoesNotExist, ArchivedTask.DoesNotExist):
             return Response(
                 {"error": "Task not found"}, status=status.HTTP_404_NOT_FOUND
             )
@@ -736,7 +1637,9 @@ class TaskDetailView(APIView):
                 "type": "string",
                 "description": "Search term to filter tasks by title (case-insensitive)"
             }
-        }
+        },
+        FIELDS_PARAMETER,
+        INCLUDE_ARCHIVED_PARAMETER,
     ],
     responses={
         200: {
@@ -763,13 +1666,23 @@ class TaskDetailView(APIView):
 
 class TaskSearchView(APIView):
     permission_classes = [IsAuthenticated]  # Ensure the user is authenticated
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = "task_search"
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer]  # Allow ?format=columnar
 
     def get(self, request, search_term):
+        fields, error = sparse_fields(request, TaskSerializer.Meta.fields)
+        if error:
+            return error
+
         # Filter tasks by the logged-in user and search term
-        tasks = Task.objects.filter(
-            author=request.user,  # Only return tasks for the authenticated user
+        tasks = Task.objects.for_user(request.user).filter(  # Only return tasks for the authenticated user
             title__icontains=search_term  # Search in the 'title' field
         )
+        tasks = only_fields(tasks, fields, related=("tags",))  # Only read the columns that were asked for
+        if wants_archived(request):
+            archived = ArchivedTask.objects.for_user(request.user).filter(title__icontains=search_term)
+            tasks = with_archived(tasks, only_fields(archived, fields, related=("tags",)))
 
         # If you want to search in other fields like 'description' or 'category', you can expand the filter
         # tasks = Task.objects.filter(
@@ -780,5 +1693,242 @@ class TaskSearchView(APIView):
         #     description__icontains=search_term
         # )
 
-        serializer = TaskSerializer(tasks, many=True)  # Serialize the filtered tasks
+        serializer = TaskSerializer(tasks, many=True, fields=fields)  # Serialize the filtered tasks
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    tags=["Task"],
+    description=(
+        "Typeahead for the search box: titles of the user's tasks that start with `q`, then "
+        "titles with a later word starting with it, case-insensitive. Answered from an index "
+        "held in memory, without a database query"
+    ),
+    parameters=[
+        OpenApiParameter("q", str, required=True, description="What has been typed so far"),
+        OpenApiParameter("limit", int, description=f"Most titles returned, {SUGGEST_MAX_LIMIT} at most"),
+    ],
+    responses={
+        200: {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "integer", "description": "Newest task with this title"},
+                    "title": {"type": "string"},
+                },
+            },
+        },
+        400: {"type": "object", "properties": {"error": {"type": "string"}}},
+    },
+)
+class TaskSuggestView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        limit = request.query_params.get("limit", str(SUGGEST_DEFAULT_LIMIT))
+        if not limit.isdigit() or not 1 <= int(limit) <= SUGGEST_MAX_LIMIT:
+            return Response(
+                {"error": f"limit must be between 1 and {SUGGEST_MAX_LIMIT}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(suggest(request.user, request.query_params.get("q", ""), int(limit)))
+
+
+@extend_schema(
+    tags=["System"],
+    description="Database connection pool statistics for the worker serving the request (staff only)",
+    responses={
+        200: {
+            "type": "object",
+            "properties": {
+                "mode": {"type": "string", "enum": ["none", "persistent", "pool"]},
+                "pid": {"type": "integer"},
+                "pools": {"type": "object", "additionalProperties": {"type": "object"}},
+            },
+        },
+        403: {"type": "object", "properties": {"detail": {"type": "string"}}},
+    },
+)
+class DatabasePoolStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        # Pools are per process, so this only describes the worker that answered
+        return Response(
+            {
+                "mode": settings.DB_CONNECTION_MODE,
+                "pid": os.getpid(),
+                "pools": pool_stats(),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+@extend_schema(
+    tags=["System"],
+    description="Run several API requests in one round trip. Each item is resolved against "
+    "the API routes and runs as the authenticated user; with atomic=true all of them share "
+    "one transaction that is rolled back if any returns an error.",
+    request={
+        "application/json": {
+            "type": "object",
+            "properties": {
+                "requests": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "method": {"type": "string", "enum": ["GET", "POST", "PUT", "PATCH", "DELETE"]},
+                            "path": {"type": "string", "example": "/task/12"},
+                            "body": {"type": "object"},
+                        },
+                        "required": ["path"],
+                    },
+                },
+                "atomic": {"type": "boolean"},
+            },
+            "required": ["requests"],
+        }
+    },
+    responses={
+        200: {
+            "type": "object",
+            "properties": {
+                "responses": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {"status": {"type": "integer"}, "body": {}},
+                    },
+                },
+            },
+        },
+        400: {"type": "object", "properties": {"error": {"type": "string"}}},
+        413: {"type": "object", "properties": {"error": {"type": "string"}}},
+    },
+)
+class BatchView(APIView):
+    permission_classes = [IsAuthenticated]
+    batchable = False
+
+    def post(self, request):
+        if len(request.body) > settings.BATCH_MAX_BODY_BYTES:
+            return Response(
+                {"error": f"Batch body is larger than {settings.BATCH_MAX_BODY_BYTES} bytes"},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+        try:
+            sub_requests, atomic = parse_batch(request.data)
+        except BatchError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"responses": run_batch(request, sub_requests, atomic=atomic)})
+
+
+def _calendar_url(request, user):
+    if not user.calendar_token:
+        return None
+    return request.build_absolute_uri(f"/calendar/{user.calendar_token}.ics")
+
+
+@extend_schema(
+    tags=["Calendar"],
+    description=(
+        "GET returns the URL of the user's calendar feed (null until one is created). POST creates "
+        "a new one, and the previous URL stops working"
+    ),
+    request=None,
+    responses={200: {"type": "object", "properties": {"url": {"type": "string", "nullable": True}}}},
+)
+class CalendarTokenView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({"url": _calendar_url(request, request.user)})
+
+    def post(self, request):
+        user = request.user
+        user.calendar_token = get_random_string(64)
+        user.save(update_fields=["calendar_token", "updated_at"])
+        return Response({"url": _calendar_url(request, user)})
+
+
+@extend_schema(
+    tags=["Calendar"],
+    description="Turn off the user's calendar feed",
+    request=None,
+    responses={204: None},
+)
+class CalendarTokenRevokeView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        user = request.user
+        user.calendar_token = None
+        user.save(update_fields=["calendar_token", "updated_at"])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@extend_schema(
+    tags=["Calendar"],
+    description=(
+        "iCalendar feed of the tasks due in a window, for calendar apps to subscribe to. "
+        "Authenticated by the token in the URL (see /calendar/token). Repeated polls with "
+        "If-None-Match or If-Modified-Since get 304 while nothing has changed"
+    ),
+    auth=[],
+    parameters=[
+        OpenApiParameter("start", str, description=f"First day, YYYY-MM-DD ({CALENDAR_PAST_DAYS} days ago by default)"),
+        OpenApiParameter("end", str, description=f"Last day, YYYY-MM-DD ({CALENDAR_FUTURE_DAYS} days ahead by default)"),
+        OpenApiParameter(
+            "component", str, enum=list(COMPONENTS),
+            description="VEVENT (all-day events, the default) or VTODO (to-dos)",
+        ),
+    ],
+    responses={
+        (200, "text/calendar"): {"type": "string"},
+        304: None,
+        400: {"type": "object", "properties": {"error": {"type": "string"}}},
+        404: {"type": "object", "properties": {"error": {"type": "string"}}},
+    },
+)
+class CalendarFeedView(APIView):
+    authentication_classes = []  # The token in the URL is the credential
+    permission_classes = [AllowAny]
+    batchable = False
+
+    def perform_content_negotiation(self, request, force=False):
+        # Calendar apps ask for text/calendar, which errors are not rendered as
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, token):
+        try:
+            user = User.objects.get(calendar_token=token, is_active=True)
+        except User.DoesNotExist:
+            return Response({"error": "Calendar not found"}, status=status.HTTP_404_NOT_FOUND)
+        component = request.query_params.get("component", "VEVENT").upper()
+        if component not in COMPONENTS:
+            return Response(
+                {"error": f"component must be one of: {', '.join(COMPONENTS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            start, end = parse_window(request.query_params)
+        except FeedError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        tasks = feed_tasks(user, start, end)
+        feed_etag, last_modified = validators(tasks, start, end, component)
+        headers = {"ETag": feed_etag, "Cache-Control": "private, no-cache"}
+        if last_modified is not None:
+            headers["Last-Modified"] = http_date(last_modified)
+        not_modified = get_conditional_response(request, etag=feed_etag, last_modified=last_modified)
+        if not_modified is not None:
+            for name, value in headers.items():
+                not_modified[name] = value
+            return not_modified
+        return StreamingHttpResponse(
+            stream_feed(tasks, component, request.get_host()),
+            content_type="text/calendar; charset=utf-8",
+            headers={**headers, "Content-Disposition": 'inline; filename="tasks.ics"'},
+        )
@@ -1,11 +1,28 @@
-import React, { useState } from "react";
+import React, { useEffect, useState } from "react";
 import { Link, useNavigate } from "react-router-dom";
+import api from "../api/api";
 
 const Navbar = () => {
     const [searchTerm, setSearchTerm] = useState("");
     const [menuOpen, setMenuOpen] = useState(false);
+    const [suggestions, setSuggestions] = useState([]);
     const navigate = useNavigate();
 
+    // Typeahead titles, answered from the server's in-memory index
+    useEffect(() => {
+        if (!searchTerm.trim()) {
+            setSuggestions([]);
+            return;
+        }
+        let current = true; // Ignore answers to earlier keystrokes
+        api.get("/tasks/suggest", { params: { q: searchTerm } })
+            .then((response) => current && setSuggestions(response.data))
+            .catch(() => current && setSuggestions([]));
+        return () => {
+            current = false;
+        };
+    }, [searchTerm]);
+
     const handleSearchChange = (e) => {
         setSearchTerm(e.target.value);
     };
@@ -24,6 +41,11 @@ const Navbar = () => {
 
     return (
         <nav className="bg-black text-white px-4 py-2 shadow-md">
+            <datalist id="task-suggestions">
+                {suggestions.map((suggestion) => (
+                    <option key={suggestion.id} value={suggestion.title} />
+                ))}
+            </datalist>
             <div className="max-w-7xl mx-auto flex justify-between items-center">
                 <div className="flex items-center gap-10">
                     {/* Logo and Home Link */}
@@ -75,6 +97,7 @@ const Navbar = () => {
                             type="text"
                             value={searchTerm}
                             onChange={handleSearchChange}
+                            list="task-suggestions"
                             placeholder="Search Tasks..."
                             className="px-4 py-2 rounded-lg bg-gray-100 text-gray-900 focus:outline-none"
                         />
@@ -156,6 +179,7 @@ const Navbar = () => {
                             type="text"
                             value={searchTerm}
                             onChange={handleSearchChange}
+                            list="task-suggestions"
                             placeholder="Search Tasks..."
                             className="px-4 py-2 rounded-lg bg-gray-100 text-gray-900 focus:outline-none"
                         />
@@ -26,61 +26,59 @@ const EditTaskPage = () => {
     const [errors, setErrors] = useState({});
     const [updating, setUpdating] = useState(false);
 
-    // Fetch categories for the task form
+    // Fetch categories and the task in one round trip
     useEffect(() => {
-        const fetchCategories = async () => {
+        const fetchFormData = async () => {
             try {
                 const token = localStorage.getItem("accessToken");
-                const response = await api.get("/category/read", {
-                    headers: {
-                        Authorization: `Bearer ${token}`,
+                const response = await api.post(
+                    "/batch",
+                    {
+                        requests: [
+                            { method: "GET", path: "/category/read" },
+                            { method: "GET", path: `/task/${taskId}` },
+                        ],
                     },
-                });
-
-                setCategories(response.data);
-            } catch (error) {
-                setErrors(error.response?.data?.detail || "Failed to fetch categories.");
-                toast.error(error.response?.data?.detail || "Failed to load categories.", {
-                    position: "bottom-right",
-                });
-            }
-        };
-
-        fetchCategories();
-    }, []);
-
-    // Fetch task data by taskId
-    useEffect(() => {
-        const fetchTask = async () => {
-            try {
-                const token = localStorage.getItem("accessToken");
-
-                const response = await api.get(
-                    `/task/${taskId}`,
                     {
                         headers: {
                             Authorization: `Bearer ${token}`,
                         },
                     }
-
                 );
-
-                setTaskInput({
-                    title: response.data.title,
-                    description: response.data.description,
-                    dueDate: response.data.due_date,
-                    priority: response.data.priority,
-                    status: response.data.status,
-                    category: response.data.category_id,
-                }); // Set the fetched task data
+                const [categoriesResponse, taskResponse] = response.data.responses;
+
+                if (categoriesResponse.status === 200) {
+                    setCategories(categoriesResponse.body);
+                } else {
+                    setErrors(categoriesResponse.body?.detail || "Failed to fetch categories.");
+                    toast.error(categoriesResponse.body?.detail || "Failed to load categories.", {
+                        position: "bottom-right",
+                    });
+                }
+
+                if (taskResponse.status === 200) {
+                    const task = taskResponse.body;
+                    setTaskInput({
+                        title: task.title,
+                        description: task.description,
+                        dueDate: task.due_date,
+                        priority: task.priority,
+                        status: task.status,
+                        category: task.category_id,
+                    }); // Set the fetched task data
+                } else {
+                    toast.error("Failed to fetch task data.", {
+                        position: "bottom-right",
+                    });
+                }
             } catch (error) {
-                toast.error("Failed to fetch task data.", {
+                toast.error("Failed to load the task form.", {
                     position: "bottom-right",
                 });
             }
         };
 
-        fetchTask();
+        fetchFormData();
     }, [taskId]);
 
     const handleInputChange = (e) => {